@@ -0,0 +1,65 @@
+"""Microbenchmark for Typst escaping of large judgments.
+
+Usage: python benchmarks/bench_escape.py [megabytes] [repeats]
+"""
+
+import random
+import re
+import sys
+import time
+
+from hudoc.utils import clean_text_for_typst, clean_texts_for_typst
+
+
+def per_character_escape(text):
+    """The previous generator-based escaper, kept as the baseline."""
+    text = re.sub(r"(\n\s*\n)+", r"\n\n", text)
+    escapes = {c: "\\" + c for c in '\\#*_~^`"$<>'}
+    return "".join(escapes.get(c, c) for c in text)
+
+
+def synthetic_text(megabytes, seed=0):
+    rng = random.Random(seed)
+    words = ["article", "§ 6", "applicant's", "<i>", "$100", "#12", "a_b", "\n\n \n"]
+    out, size = [], 0
+    while size < megabytes * 1e6:
+        word = rng.choice(words)
+        out.append(word)
+        size += len(word) + 1
+    return " ".join(out)
+
+
+def best_of(repeats, fn, *args):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    text = synthetic_text(megabytes)
+
+    old_time, old = best_of(repeats, per_character_escape, text)
+    new_time, new = best_of(repeats, clean_text_for_typst, text)
+    assert old == new, "escaper outputs differ"
+    print(f"Single {megabytes} MB document:")
+    print(f"  per-character: {old_time * 1000:8.1f} ms")
+    print(f"  replace:       {new_time * 1000:8.1f} ms ({old_time / new_time:.1f}x)")
+
+    docs = [text[i : i + 2000] for i in range(0, len(text), 2000)]
+    loop_time, looped = best_of(
+        repeats, lambda: [clean_text_for_typst(d) for d in docs]
+    )
+    batch_time, batched = best_of(repeats, clean_texts_for_typst, docs)
+    assert looped == batched, "batch output differs"
+    print(f"Batch of {len(docs)} small documents:")
+    print(f"  one by one:    {loop_time * 1000:8.1f} ms")
+    print(f"  batch:         {batch_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
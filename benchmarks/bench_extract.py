@@ -0,0 +1,57 @@
+"""Compare the HTML-to-text extractors on a synthetic judgment.
+
+Usage: python benchmarks/bench_extract.py [paragraphs] [repeats]
+"""
+
+import random
+import sys
+import time
+
+from hudoc.core.extract import EXTRACTORS
+
+
+def synthetic_judgment(paragraphs, seed=0):
+    """Build converted-document HTML shaped like a long HUDOC judgment."""
+    rng = random.Random(seed)
+    words = "the court applicant article convention government violation".split()
+    parts = ["<html><head><style>p { margin: 0 }</style></head><body>"]
+    for i in range(paragraphs):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(20, 80)))
+        if i % 50 == 0:
+            parts.append(f"<h2>Section {i // 50}</h2>")
+        if i % 7 == 0:
+            parts.append(f"<ul><li><p>{i}. {sentence}</p></li></ul>")
+        else:
+            parts.append(
+                f'<p class="s"><span>{i}.</span> {sentence} &amp; '
+                f"<b>{rng.choice(words)}</b>&nbsp;&#167;{i}</p>"
+            )
+    parts.append("<script>var x = 1;</script></body></html>")
+    return "".join(parts)
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    html = synthetic_judgment(paragraphs)
+    print(f"Document: {len(html) / 1e6:.2f} MB, {paragraphs} paragraphs")
+
+    outputs = {}
+    timings = {}
+    for name, extractor in EXTRACTORS.items():
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            outputs[name] = extractor(html)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"{name:>8}: {best * 1000:8.1f} ms")
+
+    if len(set(outputs.values())) != 1:
+        print("ERROR: extractor outputs differ")
+        sys.exit(1)
+    print(f"Speedup stream vs bs4: {timings['bs4'] / timings['stream']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Memory of parsed feed items: RssItem records versus the former dicts.
+
+Parses a synthetic feed and measures, with tracemalloc, the memory retained
+by the list of parsed items and the peak while parsing.
+
+Usage: python benchmarks/bench_items.py [items]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from hudoc.core import parser
+
+
+def write_feed(path, items):
+    """Write an ECHR-shaped feed with ``items`` items, dated a few per day."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<rss version="2.0"><channel>')
+        for n in range(items):
+            doc_id = f"001-{n:06d}"
+            date = format_datetime(start - timedelta(days=n // 20))
+            f.write(
+                f"<item><title>CASE OF APPLICANT {n} v. STATE</title>"
+                f"<description>{n}/20 - Chamber Judgment</description>"
+                f"<pubDate>{date}</pubDate>"
+                "<link>http://hudoc.echr.coe.int/eng#"
+                f"%7B%22itemid%22%3A%5B%22{doc_id}%22%5D%7D</link></item>"
+            )
+        f.write("</channel></rss>")
+
+
+def parse_as_dicts(path):
+    """Parse into the per-item dicts the parser used to build."""
+    parse_item = parser._parse_item
+
+    def dict_item(elem, id_key):
+        item = parse_item(elem, id_key)
+        return None if item is None else item.to_dict()
+
+    parser._parse_item = dict_item
+    try:
+        return parser.parse_rss_file(path)
+    finally:
+        parser._parse_item = parse_item
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.xml")
+        write_feed(path, count)
+        print(f"Feed: {os.path.getsize(path) / 2**20:.1f} MiB, {count} items")
+        for name, parse in (
+            ("dict", parse_as_dicts),
+            ("RssItem", parser.parse_rss_file),
+        ):
+            result, retained, peak, elapsed = measure(lambda: parse(path))
+            del result
+            print(
+                f"{name:>8}: retained {retained / 2**20:7.1f} MiB "
+                f"({retained / count:4.0f} B/item), "
+                f"peak {peak / 2**20:7.1f} MiB, parse {elapsed:.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
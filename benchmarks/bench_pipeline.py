@@ -0,0 +1,164 @@
+"""End-to-end download benchmark against the local mock HUDOC server.
+
+Runs the full pipeline (feed parsing, fetching, conversion triggers,
+extraction, writing) for each combination of thread count and output mode
+and reports docs/sec, per-document latency percentiles, peak RSS and
+requests per document. Each run is a separate process so peak RSS is its own.
+
+Usage: python benchmarks/bench_pipeline.py --threads 4,16 --modes plain,evid
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, fields
+
+from mock_hudoc import MockConfig, MockHudoc
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_pipeline(spec):
+    """Run one configuration in this process and return its measurements."""
+    from hudoc.core import async_engine, downloader, processor
+    from hudoc.core.constants import SUBSITE_CONFIG
+    from hudoc.core.conversion import ConversionLatency
+    from hudoc.core.session import configure_rate_limit
+
+    subsite = spec["subsite"]
+    config = SUBSITE_CONFIG[subsite]
+    # Plain HTTP so the requests go through the mock proxy
+    config["base_url"] = config["base_url"].replace("https://", "http://")
+    configure_rate_limit(spec["rate"])
+
+    latencies = []
+    download_steps = downloader.download_steps
+
+    def timed_steps(*args, **kwargs):
+        started = time.perf_counter()
+        result = yield from download_steps(*args, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    # Both engines import download_steps into their own module
+    processor.download_steps = timed_steps
+    async_engine.download_steps = timed_steps
+    rss_url = f"http://hudoc.{subsite}.coe.int/app/transform/rss"
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        processor.process_rss_url(
+            rss_url,
+            output_dir,
+            limit=0,
+            threads=spec["threads"],
+            conversion_delay=spec["conversion_delay"],
+            evid=spec["mode"] == "evid",
+            engine=spec["engine"],
+            latency=ConversionLatency(),
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed": elapsed,
+        "documents": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_isolated(spec, proxy_url):
+    env = dict(os.environ, HTTP_PROXY=proxy_url, http_proxy=proxy_url)
+    env.pop("NO_PROXY", None)
+    env.pop("no_proxy", None)
+    result = subprocess.run(
+        [sys.executable, __file__, "--run", json.dumps(spec)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", default="1,4,16")
+    parser.add_argument("--modes", default="plain,evid")
+    parser.add_argument("--engine", default="thread")
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--conversion-delay", type=float, default=2.0)
+    defaults = MockConfig()
+    for f in fields(MockConfig):
+        parser.add_argument(
+            f"--{f.name.replace('_', '-')}",
+            type=type(getattr(defaults, f.name)),
+            default=getattr(defaults, f.name),
+        )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.run:
+        print(json.dumps(run_pipeline(json.loads(args.run))))
+        return
+
+    mock_config = MockConfig(
+        **{f.name: getattr(args, f.name) for f in fields(MockConfig)}
+    )
+    mock = MockHudoc(mock_config).start()
+    print(f"Mock server: {json.dumps(asdict(mock_config))}")
+    header = (
+        f"{'threads':>7} {'mode':>5} {'docs':>5} {'docs/s':>8} {'p50 s':>7} "
+        f"{'p95 s':>7} {'p99 s':>7} {'RSS MB':>7} {'req/doc':>7} {'MB in':>7}"
+    )
+    print(header)
+    try:
+        for threads in [int(t) for t in args.threads.split(",")]:
+            for mode in args.modes.split(","):
+                mock.reset()
+                spec = {
+                    "subsite": mock_config.subsite,
+                    "threads": threads,
+                    "mode": mode,
+                    "engine": args.engine,
+                    "rate": args.rate,
+                    "conversion_delay": args.conversion_delay,
+                }
+                result = run_isolated(spec, mock.proxy_url)
+                requests, bytes_sent = mock.counters()
+                documents = result["documents"]
+                if not documents:
+                    sys.exit(
+                        f"No documents were measured with {threads} threads, "
+                        f"mode {mode}, engine {args.engine}"
+                    )
+                print(
+                    f"{threads:>7} {mode:>5} {result['documents']:>5} "
+                    f"{result['documents'] / result['elapsed']:>8.1f} "
+                    f"{result['p50']:>7.3f} {result['p95']:>7.3f} "
+                    f"{result['p99']:>7.3f} {result['peak_rss_mb']:>7.1f} "
+                    f"{sum(requests.values()) / documents:>7.2f} "
+                    f"{bytes_sent / 1e6:>7.1f}"
+                )
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Local stand-in for the HUDOC feed, conversion trigger and document endpoints.
+
+The server answers plain-HTTP proxy requests, so hudoc can be pointed at it
+with ``HTTP_PROXY`` while keeping the real host names (subsite detection
+relies on them). Only ``http://`` URLs go through the proxy; the benchmark
+switches the document base URLs accordingly.
+
+Usage: python benchmarks/mock_hudoc.py [port] [items]
+"""
+
+import math
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_extract import synthetic_judgment
+
+
+def parse_distribution(spec):
+    """Parse a latency distribution in seconds into a sampling function.
+
+    Forms: ``fixed:S``, ``uniform:A,B``, ``lognormal:MEDIAN,SIGMA``.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu, sigma = math.log(values[0]), values[1]
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+@dataclass
+class MockConfig:
+    subsite: str = "echr"
+    items: int = 200
+    # Paragraphs per synthetic document
+    paragraphs: int = 200
+    latency: str = "lognormal:0.02,0.5"
+    # Probability a document needs a conversion trigger before it is served
+    not_ready: float = 0.2
+    conversion: str = "uniform:0.1,0.5"
+    # Probability of answering a document request with 503 / 429
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+    seed: int = 0
+
+
+@dataclass
+class _State:
+    ready: dict = field(default_factory=dict)  # doc_id -> ready time or None
+    requests: dict = field(default_factory=dict)
+    bytes_sent: int = 0
+
+
+class MockHudoc:
+    """Threaded mock server with request counters."""
+
+    def __init__(self, config, port=0):
+        self.config = config
+        self._latency = parse_distribution(config.latency)
+        self._conversion = parse_distribution(config.conversion)
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._state = _State()
+        self._bodies = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def proxy_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def doc_ids(self):
+        return [f"001-{n:06d}" for n in range(self.config.items)]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        """Forget conversion state and counters between benchmark runs."""
+        with self._lock:
+            self._state = _State()
+
+    def counters(self):
+        with self._lock:
+            return dict(self._state.requests), self._state.bytes_sent
+
+    def feed(self):
+        sub = self.config.subsite
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        items = []
+        for n, doc_id in enumerate(self.doc_ids()):
+            link = f'http://hudoc.{sub}.coe.int/eng#{{"itemid":["{doc_id}"]}}'
+            date = format_datetime(now - timedelta(days=n))
+            items.append(
+                f"<item><title>Case {doc_id}</title>"
+                f"<description>Synthetic case {n}</description>"
+                f"<pubDate>{date}</pubDate><link>{link}</link></item>"
+            )
+        return f"<rss version=\"2.0\"><channel>{''.join(items)}</channel></rss>"
+
+    def _body(self, doc_id):
+        body = self._bodies.get(doc_id)
+        if body is None:
+            seed = int(doc_id.rsplit("-", 1)[1])
+            body = synthetic_judgment(self.config.paragraphs, seed=seed)
+            self._bodies[doc_id] = body
+        return body
+
+    def _document(self, doc_id):
+        """Status, headers and body for a conversion endpoint request."""
+        config = self.config
+        with self._lock:
+            roll = self._rng.random()
+            if roll < config.throttle_rate:
+                return 429, {"Retry-After": str(config.retry_after)}, ""
+            if roll < config.throttle_rate + config.error_rate:
+                return 503, {}, ""
+            state = self._state.ready
+            if doc_id not in state:
+                ready = self._rng.random() >= config.not_ready
+                state[doc_id] = 0.0 if ready else None
+            ready_at = state[doc_id]
+        if ready_at is None or ready_at > time.monotonic():
+            return 200, {}, "<html><body></body></html>"
+        return 200, {}, self._body(doc_id)
+
+    def _trigger(self):
+        # The trigger URL carries the document only in its fragment, which
+        # is not sent: start converting every document still waiting
+        now = time.monotonic()
+        with self._lock:
+            for doc_id, ready_at in self._state.ready.items():
+                if ready_at is None:
+                    self._state.ready[doc_id] = now + self._conversion(self._rng)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                with mock._lock:
+                    delay = mock._latency(mock._rng)
+                time.sleep(delay)
+                if url.path.endswith("/app/transform/rss"):
+                    kind = "rss"
+                    status, headers, body = 200, {}, mock.feed()
+                elif url.path.endswith("/app/conversion/docx/html/body"):
+                    kind = "document"
+                    status, headers, body = mock._document(query["id"][0])
+                else:
+                    kind = "trigger"
+                    mock._trigger()
+                    status, headers, body = 200, {}, "<html>HUDOC</html>"
+                payload = body.encode("utf-8")
+                with mock._lock:
+                    requests = mock._state.requests
+                    requests[kind] = requests.get(kind, 0) + 1
+                    mock._state.bytes_sent += len(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    mock = MockHudoc(MockConfig(items=items), port).start()
+    print(f"Mock HUDOC listening as HTTP proxy on {mock.proxy_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,156 @@
+import inspect
 import logging
 import os
 import sys
+from contextlib import nullcontext
 from pathlib import Path
 from treeparse import cli, command, argument, option
-from .core.processor import process_rss, process_rss_url
+
+# Only lightweight modules are imported here, so `hudoc --help` and
+# `hudoc list` start quickly; the download pipeline (requests, bs4, yaml,
+# pydantic) is imported by the callbacks that use it
 from .core.parser import parse_rss_file
-from .core.constants import VALID_SUBSITES, SUBSITE_CONFIG
+from .core.cache import DocumentCache
+from .core.metrics import METRIC_FORMATS, export_metrics
+from .core.progress import PROGRESS_MODES, report_progress
+from .core.constants import (
+    ARCHIVE_COMPRESSIONS,
+    ARCHIVE_FORMATS,
+    DEFAULT_EXTRACTOR,
+    DEFAULT_MAX_DOCUMENT_MB,
+    DEFAULT_PAGE_WORKERS,
+    OUTPUT_FORMATS,
+    STATE_DIR,
+    SUBSITE_CONFIG,
+    VALID_ENGINES,
+    VALID_EXTRACTORS,
+    VALID_SUBSITES,
+)
+from .core.conversion import ConversionLatency
+from .core.throttle import DEFAULT_RATE
 
 isfile = os.path.isfile
 
 
-def download_callback(rss_file, output_dir="data", limit=3, threads=10, plain=False):
+def _open_cache(cache_dir, offline):
+    """Build the document cache requested on the command line, if any."""
+    if offline and not cache_dir:
+        logging.error("--offline requires --cache-dir")
+        sys.exit(1)
+    return DocumentCache(cache_dir, offline=offline) if cache_dir else None
+
+
+def _configure(
+    extractor, rate, max_document_size=DEFAULT_MAX_DOCUMENT_MB, cpu_workers=0
+):
+    """Apply the extractor, rate, size limit and CPU options of a download command."""
+    from .core.cpu import configure_cpu_workers
+    from .core.extract import set_extractor
+    from .core.session import configure_rate_limit
+    from .utils import set_max_document_size
+
+    set_extractor(extractor)
+    configure_rate_limit(rate)
+    set_max_document_size(max_document_size)
+    configure_cpu_workers(cpu_workers)
+
+
+def _open_store(output_dir, output_format, archive_format, compression):
+    """Open the archive or database requested on the command line.
+
+    Files are written directly and need no store.
+    """
+    if output_format == "archive":
+        from .core.archive import Archive
+
+        return Archive(output_dir, archive_format, compression)
+    if output_format == "sqlite":
+        from .core.database import DocumentDatabase
+
+        return DocumentDatabase(output_dir)
+    return nullcontext()
+
+
+def _open_versions(output_dir, dedup, recheck):
+    """Load the content index of the output directory when --dedup is given."""
+    if recheck and not dedup:
+        logging.error("--recheck requires --dedup")
+        sys.exit(1)
+    if not dedup:
+        return None
+    from .core.versions import ContentIndex
+
+    return ContentIndex(
+        Path(output_dir) / STATE_DIR / "content_index.jsonl", recheck=recheck
+    )
+
+
+def _load_latency(output_dir):
+    """Conversion latency observed by earlier runs into the same output directory."""
+    return ConversionLatency.load(
+        Path(output_dir) / STATE_DIR / "conversion_latency.json"
+    )
+
+
+def download_callback(
+    rss_file,
+    output_dir="data",
+    limit=3,
+    threads=10,
+    plain=False,
+    engine="thread",
+    cache_dir="",
+    offline=False,
+    extractor=DEFAULT_EXTRACTOR,
+    rate=DEFAULT_RATE,
+    max_document_size=DEFAULT_MAX_DOCUMENT_MB,
+    cpu_workers=0,
+    metrics_file="",
+    metrics_format="prometheus",
+    metrics_interval=30.0,
+    progress="auto",
+    progress_interval=10.0,
+    output_format="files",
+    archive_format="tar",
+    compression="gzip",
+    dedup=False,
+    recheck=False,
+):
     """Callback for download command."""
+    from .core.processor import process_rss
+
     if not Path(rss_file).is_file():
         logging.error(f"RSS file '{rss_file}' does not exist or is not a file.")
         sys.exit(1)
-    try:
-        logging.info(f"Starting download from {rss_file}")
-        process_rss(
-            rss_file=rss_file,
-            output_dir=output_dir,
-            limit=limit,
-            threads=threads,
-            conversion_delay=2.0,
-            evid=not plain,
-        )
-        logging.info("Document download completed")
-    except Exception as e:
-        logging.error(f"An error occurred: {str(e)}")
-        sys.exit(1)
+    cache = _open_cache(cache_dir, offline)
+    versions = _open_versions(output_dir, dedup, recheck)
+    _configure(extractor, rate, max_document_size, cpu_workers)
+    with (
+        export_metrics(metrics_file, metrics_format, metrics_interval),
+        report_progress(progress, progress_interval, limit),
+    ):
+        try:
+            logging.info(f"Starting download from {rss_file}")
+            with _open_store(
+                output_dir, output_format, archive_format, compression
+            ) as store:
+                process_rss(
+                    rss_file=rss_file,
+                    output_dir=output_dir,
+                    limit=limit,
+                    threads=threads,
+                    conversion_delay=2.0,
+                    evid=not plain,
+                    engine=engine,
+                    cache=cache,
+                    latency=_load_latency(output_dir),
+                    store=store,
+                    versions=versions,
+                )
+            logging.info("Document download completed")
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            sys.exit(1)
 
 
 def list_callback(rss_file):
@@ -50,23 +172,329 @@ def list_callback(rss_file):
         print(f"Number of items: {len(items)}")
 
 
-def latest_callback(subsite, output_dir, limit, threads, plain):
-    """Callback for latest command."""
-    url = SUBSITE_CONFIG[subsite]["rss_url"]
-    logging.info(f"Fetching latest from {subsite}")
+def extract_callback(archive, doc_id, output_dir=".", subsite=""):
+    """Callback for extract command."""
+    import zipfile
+
+    from .core.archive import extract_document
+
+    if not isfile(archive):
+        logging.error(f"Archive '{archive}' does not exist or is not a file.")
+        sys.exit(1)
+    try:
+        written = extract_document(archive, doc_id, output_dir, subsite)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        logging.error(f"Failed to extract {doc_id} from {archive}: {str(e)}")
+        sys.exit(1)
+    if written is None:
+        logging.error(f"Document {doc_id} is not in {archive}")
+        sys.exit(1)
+    for path in written:
+        print(path)
+
+
+def search_callback(query, output_dir="data", limit=10, subsite=""):
+    """Callback for search command."""
+    import sqlite3
+
+    from .core.database import database_path, search
+
+    path = database_path(output_dir)
+    if not path.is_file():
+        logging.error(
+            f"No document database at {path}; download with --output-format sqlite"
+        )
+        sys.exit(1)
     try:
-        process_rss_url(
-            url=url,
-            output_dir=output_dir,
-            limit=limit,
-            threads=threads,
-            conversion_delay=2.0,
-            evid=not plain,
+        results = search(path, query, limit, subsite)
+    except sqlite3.Error as e:
+        logging.error(f"Search failed: {str(e)}")
+        sys.exit(1)
+    if not results:
+        print("No matching documents")
+    for rank, result in enumerate(results, 1):
+        date = f" ({result['verdict_date']})" if result["verdict_date"] else ""
+        print(
+            f"{rank}. [{result['subsite']}] {result['doc_id']}{date} {result['title']}"
+        )
+        print(f"   {' '.join(result['snippet'].split())}")
+        print(f"   {result['url']}")
+
+
+def _parse_subsites(subsite):
+    """Split a --subsite value: one subsite, a comma-separated list or 'all'."""
+    if subsite == "all":
+        return list(VALID_SUBSITES)
+    subsites = list(dict.fromkeys(s.strip() for s in subsite.split(",") if s.strip()))
+    unknown = [s for s in subsites if s not in VALID_SUBSITES]
+    if unknown or not subsites:
+        logging.error(
+            f"Unknown subsite(s): {', '.join(unknown) or subsite}. "
+            f"Choose from {', '.join(VALID_SUBSITES)} or 'all'."
         )
-        logging.info("Download completed")
-    except Exception as e:
-        logging.error(f"An error occurred: {str(e)}")
         sys.exit(1)
+    return subsites
+
+
+def _check_multi_engine(subsites, engine):
+    if len(subsites) > 1 and engine != "thread":
+        logging.warning("Several subsites are always downloaded with the thread engine")
+
+
+def latest_callback(
+    subsite,
+    output_dir,
+    limit,
+    threads,
+    plain,
+    engine="thread",
+    cache_dir="",
+    offline=False,
+    extractor=DEFAULT_EXTRACTOR,
+    rate=DEFAULT_RATE,
+    max_document_size=DEFAULT_MAX_DOCUMENT_MB,
+    cpu_workers=0,
+    per_host=0,
+    metrics_file="",
+    metrics_format="prometheus",
+    metrics_interval=30.0,
+    progress="auto",
+    progress_interval=10.0,
+    output_format="files",
+    archive_format="tar",
+    compression="gzip",
+    dedup=False,
+    recheck=False,
+):
+    """Callback for latest command."""
+    from .core.processor import process_rss_url, process_subsites_latest
+
+    subsites = _parse_subsites(subsite)
+    _check_multi_engine(subsites, engine)
+    cache = _open_cache(cache_dir, offline)
+    versions = _open_versions(output_dir, dedup, recheck)
+    _configure(extractor, rate, max_document_size, cpu_workers)
+    logging.info(f"Fetching latest from {', '.join(subsites)}")
+    with (
+        export_metrics(metrics_file, metrics_format, metrics_interval),
+        report_progress(progress, progress_interval, limit * len(subsites)),
+    ):
+        try:
+            with _open_store(
+                output_dir, output_format, archive_format, compression
+            ) as store:
+                if len(subsites) > 1:
+                    process_subsites_latest(
+                        subsites,
+                        output_dir=output_dir,
+                        limit=limit,
+                        threads=threads,
+                        conversion_delay=2.0,
+                        evid=not plain,
+                        cache=cache,
+                        latency=_load_latency(output_dir),
+                        per_host=per_host,
+                        store=store,
+                        versions=versions,
+                    )
+                else:
+                    process_rss_url(
+                        url=SUBSITE_CONFIG[subsites[0]]["rss_url"],
+                        output_dir=output_dir,
+                        limit=limit,
+                        threads=threads,
+                        conversion_delay=2.0,
+                        evid=not plain,
+                        engine=engine,
+                        cache=cache,
+                        latency=_load_latency(output_dir),
+                        store=store,
+                        versions=versions,
+                    )
+            logging.info("Download completed")
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            sys.exit(1)
+
+
+def harvest_callback(
+    subsite,
+    output_dir="data",
+    limit=0,
+    threads=10,
+    plain=False,
+    engine="thread",
+    cache_dir="",
+    offline=False,
+    extractor=DEFAULT_EXTRACTOR,
+    rate=DEFAULT_RATE,
+    max_document_size=DEFAULT_MAX_DOCUMENT_MB,
+    cpu_workers=0,
+    until_id="",
+    since="",
+    stop_at_saved=False,
+    page_workers=DEFAULT_PAGE_WORKERS,
+    per_host=0,
+    metrics_file="",
+    metrics_format="prometheus",
+    metrics_interval=30.0,
+    progress="auto",
+    progress_interval=10.0,
+    output_format="files",
+    archive_format="tar",
+    compression="gzip",
+    dedup=False,
+    recheck=False,
+):
+    """Callback for harvest command."""
+    from .core.processor import process_harvest, process_subsites_harvest
+
+    subsites = _parse_subsites(subsite)
+    _check_multi_engine(subsites, engine)
+    cache = _open_cache(cache_dir, offline)
+    versions = _open_versions(output_dir, dedup, recheck)
+    _configure(extractor, rate, max_document_size, cpu_workers)
+    logging.info(f"Harvesting the feeds of {', '.join(subsites)}")
+    with (
+        export_metrics(metrics_file, metrics_format, metrics_interval),
+        report_progress(progress, progress_interval, limit * len(subsites)),
+    ):
+        try:
+            with _open_store(
+                output_dir, output_format, archive_format, compression
+            ) as store:
+                if len(subsites) > 1:
+                    process_subsites_harvest(
+                        subsites,
+                        output_dir=output_dir,
+                        limit=limit,
+                        threads=threads,
+                        conversion_delay=2.0,
+                        evid=not plain,
+                        cache=cache,
+                        latency=_load_latency(output_dir),
+                        per_host=per_host,
+                        until_id=until_id,
+                        since=since,
+                        stop_at_saved=stop_at_saved,
+                        page_workers=page_workers,
+                        store=store,
+                        versions=versions,
+                    )
+                else:
+                    process_harvest(
+                        subsite=subsites[0],
+                        output_dir=output_dir,
+                        limit=limit,
+                        threads=threads,
+                        conversion_delay=2.0,
+                        evid=not plain,
+                        engine=engine,
+                        cache=cache,
+                        latency=_load_latency(output_dir),
+                        until_id=until_id,
+                        since=since,
+                        stop_at_saved=stop_at_saved,
+                        page_workers=page_workers,
+                        store=store,
+                        versions=versions,
+                    )
+            logging.info("Harvest completed")
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            sys.exit(1)
+
+
+def sync_callback(
+    subsite,
+    output_dir="data",
+    threads=10,
+    plain=False,
+    cache_dir="",
+    offline=False,
+    extractor=DEFAULT_EXTRACTOR,
+    rate=DEFAULT_RATE,
+    max_document_size=DEFAULT_MAX_DOCUMENT_MB,
+    cpu_workers=0,
+    since="",
+    page_workers=DEFAULT_PAGE_WORKERS,
+    per_host=0,
+    metrics_file="",
+    metrics_format="prometheus",
+    metrics_interval=30.0,
+    progress="auto",
+    progress_interval=10.0,
+    output_format="files",
+    archive_format="tar",
+    compression="gzip",
+    dedup=False,
+    recheck=False,
+):
+    """Callback for sync command."""
+    from .core.processor import process_sync
+    from .core.sync import SyncState
+
+    subsites = _parse_subsites(subsite)
+    cache = _open_cache(cache_dir, offline)
+    versions = _open_versions(output_dir, dedup, recheck)
+    _configure(extractor, rate, max_document_size, cpu_workers)
+    logging.info(f"Syncing {', '.join(subsites)}")
+    with (
+        export_metrics(metrics_file, metrics_format, metrics_interval),
+        report_progress(progress, progress_interval, 0),
+    ):
+        try:
+            with _open_store(
+                output_dir, output_format, archive_format, compression
+            ) as store:
+                process_sync(
+                    subsites,
+                    output_dir=output_dir,
+                    state=SyncState.load(
+                        Path(output_dir) / STATE_DIR / "sync_state.json"
+                    ),
+                    threads=threads,
+                    conversion_delay=2.0,
+                    evid=not plain,
+                    cache=cache,
+                    latency=_load_latency(output_dir),
+                    per_host=per_host,
+                    since=since,
+                    page_workers=page_workers,
+                    store=store,
+                    versions=versions,
+                )
+            logging.info("Sync completed")
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            sys.exit(1)
+
+
+def _with_profile(callback):
+    """Accept the global --profile options and run ``callback`` under the profiler."""
+
+    def run(*args, profile="", profile_top=30, **kwargs):
+        if not profile:
+            return callback(*args, **kwargs)
+        from .core.profiling import profile_run
+
+        with profile_run(profile, profile_top):
+            return callback(*args, **kwargs)
+
+    # treeparse binds options to the callback by its signature
+    signature = inspect.signature(callback)
+    run.__signature__ = signature.replace(
+        parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("profile", inspect.Parameter.KEYWORD_ONLY, default=""),
+            inspect.Parameter(
+                "profile_top", inspect.Parameter.KEYWORD_ONLY, default=30
+            ),
+        ]
+    )
+    run.__name__ = callback.__name__
+    run.__doc__ = callback.__doc__
+    return run
 
 
 app = cli(
@@ -76,56 +504,237 @@ app = cli(
     show_types=True,
     show_defaults=True,
     line_connect=True,
-)
-
-download_cmd = command(
-    name="download",
-    help="Download documents from HUDOC subsites using RSS file.",
-    callback=download_callback,
-    arguments=[
-        argument(
-            name="rss_file",
-            arg_type=str,
-            help="Path to the RSS file",
-            sort_key=0,
-        ),
-    ],
     options=[
         option(
-            flags=["--output-dir", "-o"],
-            default="data",
-            help="Directory to save text files (default: data)",
+            flags=["--profile"],
+            default="",
             arg_type=str,
+            help="Profile the command: cProfile stats to this file and a report to FILE.txt (default: off)",
             sort_key=0,
         ),
         option(
-            flags=["--limit", "-l"],
-            default=3,
-            help="Number of documents to download (0 for all) (default: 3)",
+            flags=["--profile-top"],
+            default=30,
             arg_type=int,
+            help="Entries per section of the profile report (default: 30)",
             sort_key=1,
         ),
+    ],
+)
+
+
+def _sorted(*groups):
+    """Options of a command in the given order, numbered for the help output."""
+    options = [opt for group in groups for opt in group]
+    for sort_key, opt in enumerate(options):
+        opt.sort_key = sort_key
+    return options
+
+
+def _subsite_option():
+    return option(
+        flags=["--subsite", "-s"],
+        default="echr",
+        arg_type=str,
+        help="HUDOC subsite, comma-separated subsites or 'all' (default: echr)",
+    )
+
+
+def _download_options(engine=True):
+    """Options of the commands that download documents, up to the feed options."""
+    threads_help = "Number of parallel downloads (default: 10)"
+    if engine:
+        threads_help = "Number of parallel downloads (threads, or in-flight documents with --engine async) (default: 10)"
+    options = [
         option(
             flags=["--threads", "-n"],
             default=10,
-            help="Number of threads for parallel downloading (default: 10)",
             arg_type=int,
-            sort_key=2,
+            help=threads_help,
         ),
         option(
             flags=["--plain", "-p"],
             default=False,
+            arg_type=bool,
             help="Save output in plain text format (default: evid format for labelling).",
+        ),
+    ]
+    if engine:
+        options.append(
+            option(
+                flags=["--engine", "-e"],
+                default="thread",
+                arg_type=str,
+                choices=VALID_ENGINES,
+                help="Download engine: one thread per document or asyncio (default: thread)",
+            )
+        )
+    return options + [
+        option(
+            flags=["--cache-dir", "-c"],
+            default="",
+            arg_type=str,
+            help="Directory for caching converted documents (default: no cache)",
+        ),
+        option(
+            flags=["--offline"],
+            default=False,
             arg_type=bool,
-            sort_key=3,
+            help="Serve documents from the cache only, without network access (default: False)",
+        ),
+        option(
+            flags=["--extractor", "-x"],
+            default=DEFAULT_EXTRACTOR,
+            arg_type=str,
+            choices=VALID_EXTRACTORS,
+            help="HTML-to-text extractor (default: stream)",
+        ),
+        option(
+            flags=["--rate", "-r"],
+            default=DEFAULT_RATE,
+            arg_type=float,
+            help="Maximum requests per second to each HUDOC host, 0 for no limit (default: 10)",
+        ),
+        option(
+            flags=["--max-document-size"],
+            default=DEFAULT_MAX_DOCUMENT_MB,
+            arg_type=float,
+            help="Largest document body to download in MB, 0 for no limit (default: 64)",
+        ),
+        option(
+            flags=["--cpu-workers"],
+            default=0,
+            arg_type=int,
+            help="Processes for HTML extraction and evid rendering, 0 to do it in the download threads (default: 0)",
+        ),
+    ]
+
+
+def _per_host_option():
+    return option(
+        flags=["--per-host"],
+        default=0,
+        arg_type=int,
+        help="With several subsites, documents in flight per subsite (default: 0, twice the fair share)",
+    )
+
+
+def _page_workers_option():
+    return option(
+        flags=["--page-workers"],
+        default=DEFAULT_PAGE_WORKERS,
+        arg_type=int,
+        help="Number of feed pages fetched concurrently (default: 4)",
+    )
+
+
+def _run_options():
+    """Reporting and output options of the commands that download documents."""
+    return [
+        option(
+            flags=["--metrics-file"],
+            default="",
+            arg_type=str,
+            help="Write run metrics to this file (default: none)",
+        ),
+        option(
+            flags=["--metrics-format"],
+            default="prometheus",
+            arg_type=str,
+            choices=METRIC_FORMATS,
+            help="Metrics file format (default: prometheus)",
+        ),
+        option(
+            flags=["--metrics-interval"],
+            default=30.0,
+            arg_type=float,
+            help="Seconds between metrics file updates, 0 for the end of the run only (default: 30)",
+        ),
+        option(
+            flags=["--progress"],
+            default="auto",
+            arg_type=str,
+            choices=PROGRESS_MODES,
+            help="Progress display: a bar on a terminal, log lines, JSON lines on stdout, or off; auto picks bar or log (default: auto)",
+        ),
+        option(
+            flags=["--progress-interval"],
+            default=10.0,
+            arg_type=float,
+            help="Seconds between progress log or JSON lines, 0 for the end of the run only (default: 10)",
+        ),
+        option(
+            flags=["--output-format"],
+            default="files",
+            arg_type=str,
+            choices=OUTPUT_FORMATS,
+            help="Save one file or directory per document, one archive, or a SQLite database for `hudoc search`, in the output directory (default: files)",
+        ),
+        option(
+            flags=["--archive-format"],
+            default="tar",
+            arg_type=str,
+            choices=ARCHIVE_FORMATS,
+            help="Archive type with --output-format archive (default: tar)",
+        ),
+        option(
+            flags=["--compression"],
+            default="gzip",
+            arg_type=str,
+            choices=ARCHIVE_COMPRESSIONS,
+            help="Archive compression with --output-format archive (default: gzip)",
+        ),
+        option(
+            flags=["--dedup"],
+            default=False,
+            arg_type=bool,
+            help="Record content hashes in the output directory: skip unchanged texts, save duplicates as references and revisions as new versions (default: False)",
+        ),
+        option(
+            flags=["--recheck"],
+            default=False,
+            arg_type=bool,
+            help="With --dedup, download saved documents again to look for revisions (default: False)",
+        ),
+    ]
+
+
+download_cmd = command(
+    name="download",
+    help="Download documents from HUDOC subsites using RSS file.",
+    callback=_with_profile(download_callback),
+    arguments=[
+        argument(
+            name="rss_file",
+            arg_type=str,
+            help="Path to the RSS file",
+            sort_key=0,
         ),
     ],
+    options=_sorted(
+        [
+            option(
+                flags=["--output-dir", "-o"],
+                default="data",
+                help="Directory to save text files (default: data)",
+                arg_type=str,
+            ),
+            option(
+                flags=["--limit", "-l"],
+                default=3,
+                help="Number of documents to download (0 for all) (default: 3)",
+                arg_type=int,
+            ),
+        ],
+        _download_options(),
+        _run_options(),
+    ),
 )
 
 list_cmd = command(
     name="list",
     help="Display stats about the RSS file.",
-    callback=list_callback,
+    callback=_with_profile(list_callback),
     arguments=[
         argument(
             name="rss_file",
@@ -139,50 +748,185 @@ list_cmd = command(
 latest_cmd = command(
     name="latest",
     help="Fetch and download the latest documents from a HUDOC subsite.",
-    callback=latest_callback,
+    callback=_with_profile(latest_callback),
+    options=_sorted(
+        [
+            _subsite_option(),
+            option(
+                flags=["--output-dir", "-o"],
+                default="data",
+                arg_type=str,
+                help="Directory to save files (default: data)",
+            ),
+            option(
+                flags=["--limit", "-l"],
+                default=3,
+                arg_type=int,
+                help="Number of documents to download (0 for all, default: 3)",
+            ),
+        ],
+        _download_options(),
+        [_per_host_option()],
+        _run_options(),
+    ),
+)
+
+harvest_cmd = command(
+    name="harvest",
+    help="Walk the whole paginated feed of a HUDOC subsite and download its documents.",
+    callback=_with_profile(harvest_callback),
+    options=_sorted(
+        [
+            _subsite_option(),
+            option(
+                flags=["--output-dir", "-o"],
+                default="data",
+                arg_type=str,
+                help="Directory to save files (default: data)",
+            ),
+            option(
+                flags=["--limit", "-l"],
+                default=0,
+                arg_type=int,
+                help="Number of documents to download (0 for all, default: 0)",
+            ),
+        ],
+        _download_options(),
+        [
+            option(
+                flags=["--until-id", "-u"],
+                default="",
+                arg_type=str,
+                help="Stop at this document ID (default: walk the whole feed)",
+            ),
+            option(
+                flags=["--since"],
+                default="",
+                arg_type=str,
+                help="Stop at the first document dated before YYYY-MM-DD (default: no date limit)",
+            ),
+            option(
+                flags=["--stop-at-saved"],
+                default=False,
+                arg_type=bool,
+                help="Stop at the first document already saved in the output directory (default: False)",
+            ),
+            _page_workers_option(),
+            _per_host_option(),
+        ],
+        _run_options(),
+    ),
+)
+
+extract_cmd = command(
+    name="extract",
+    help="Extract one document from an archive written with --output-format archive.",
+    callback=_with_profile(extract_callback),
+    arguments=[
+        argument(
+            name="archive",
+            arg_type=str,
+            help="Path to the archive, e.g. data/hudoc.tar.gz",
+            sort_key=0,
+        ),
+        argument(
+            name="doc_id",
+            arg_type=str,
+            help="Document ID",
+            sort_key=1,
+        ),
+    ],
     options=[
+        option(
+            flags=["--output-dir", "-o"],
+            default=".",
+            arg_type=str,
+            help="Directory to write the document's files to (default: .)",
+            sort_key=0,
+        ),
         option(
             flags=["--subsite", "-s"],
-            default="echr",
+            default="",
+            arg_type=str,
+            help="Subsite of the document, if the ID is not unique in the archive (default: any)",
+            sort_key=1,
+        ),
+    ],
+)
+
+search_cmd = command(
+    name="search",
+    help="Full-text search of documents saved with --output-format sqlite.",
+    callback=_with_profile(search_callback),
+    arguments=[
+        argument(
+            name="query",
             arg_type=str,
-            choices=VALID_SUBSITES,
-            help="HUDOC subsite to fetch from (default: echr)",
+            help="Search terms, with FTS5 syntax, e.g. '\"freedom of expression\" AND journalist'",
             sort_key=0,
         ),
+    ],
+    options=[
         option(
             flags=["--output-dir", "-o"],
             default="data",
             arg_type=str,
-            help="Directory to save files (default: data)",
-            sort_key=1,
+            help="Output directory of the downloads holding hudoc.db (default: data)",
+            sort_key=0,
         ),
         option(
             flags=["--limit", "-l"],
-            default=3,
-            arg_type=int,
-            help="Number of documents to download (0 for all, default: 3)",
-            sort_key=2,
-        ),
-        option(
-            flags=["--threads", "-n"],
             default=10,
             arg_type=int,
-            help="Number of download threads (default: 10)",
-            sort_key=3,
+            help="Number of results (default: 10)",
+            sort_key=1,
         ),
         option(
-            flags=["--plain", "-p"],
-            default=False,
-            arg_type=bool,
-            help="Save in plain text format (default: evid format)",
-            sort_key=4,
+            flags=["--subsite", "-s"],
+            default="",
+            arg_type=str,
+            help="Only search documents of this subsite (default: all)",
+            sort_key=2,
         ),
     ],
 )
 
+sync_cmd = command(
+    name="sync",
+    help="Download the documents published since the last sync of each subsite.",
+    callback=_with_profile(sync_callback),
+    options=_sorted(
+        [
+            _subsite_option(),
+            option(
+                flags=["--output-dir", "-o"],
+                default="data",
+                arg_type=str,
+                help="Directory to save files (default: data)",
+            ),
+        ],
+        _download_options(engine=False),
+        [
+            option(
+                flags=["--since"],
+                default="",
+                arg_type=str,
+                help="On the first sync of a subsite, stop at the first document dated before YYYY-MM-DD (default: the whole feed)",
+            ),
+            _page_workers_option(),
+            _per_host_option(),
+        ],
+        _run_options(),
+    ),
+)
+
 app.commands.append(download_cmd)
 app.commands.append(list_cmd)
 app.commands.append(latest_cmd)
+app.commands.append(harvest_cmd)
+app.commands.append(sync_cmd)
+app.commands.append(extract_cmd)
+app.commands.append(search_cmd)
 
 
 def main():
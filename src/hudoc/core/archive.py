@@ -0,0 +1,369 @@
+import gzip
+import io
+import json
+import logging
+import lzma
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from ..utils import document_files
+from .constants import ARCHIVE_NAME
+from .metrics import metrics
+
+# Rendered documents waiting for the writer; workers block while it is full
+QUEUE_SIZE = 256
+_EXTENSIONS = {"none": "", "gzip": ".gz", "lzma": ".xz"}
+_ZIP_COMPRESSION = {
+    "none": zipfile.ZIP_STORED,
+    "gzip": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA,
+}
+# End-of-archive marker of a tar file
+_TAR_END = b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+def archive_path(output_dir, fmt="tar", compression="gzip"):
+    """Path of the archive in ``output_dir``, e.g. data/hudoc.tar.gz."""
+    if fmt == "zip":
+        return Path(output_dir) / f"{ARCHIVE_NAME}.zip"
+    return Path(output_dir) / f"{ARCHIVE_NAME}.{fmt}{_EXTENSIONS[compression]}"
+
+
+def archive_format(path):
+    """Format and compression of an archive, from its file name."""
+    name = Path(path).name
+    if name.endswith(".zip"):
+        return "zip", "none"
+    compression = "none"
+    for candidate, extension in _EXTENSIONS.items():
+        if extension and name.endswith(extension):
+            compression = candidate
+            name = name[: -len(extension)]
+    fmt = name.rpartition(".")[2]
+    if fmt not in ("tar", "jsonl"):
+        raise ValueError(f"Not a hudoc archive: {path}")
+    return fmt, compression
+
+
+def _compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data, mtime=0)
+    if compression == "lzma":
+        return lzma.compress(data)
+    return data
+
+
+def _decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "lzma":
+        return lzma.decompress(data)
+    return data
+
+
+def _tar_blocks(files):
+    """Tar headers and data of ``files``, without the end-of-archive marker."""
+    out = io.BytesIO()
+    mtime = int(time.time())
+    for name, content in files:
+        data = content.encode("utf-8")
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        info.mode = 0o644
+        out.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        out.write(data)
+        out.write(b"\0" * (-len(data) % tarfile.BLOCKSIZE))
+    return out.getvalue()
+
+
+def _zip_member(name, version):
+    """Zip member name of a file: later versions go into a ``v<N>`` directory.
+
+    Zip members cannot be overwritten, and a second member with the same
+    name would hide the first one.
+    """
+    if not version or version == 1:
+        return name
+    parent, _, base = name.rpartition("/")
+    return f"{parent}/v{version}/{base}" if parent else f"v{version}/{base}"
+
+
+def _index_path(path):
+    return Path(f"{path}.idx")
+
+
+def _iter_index(index_path):
+    """Yield the index entries with the size of the complete lines so far.
+
+    A last line without a newline is the partial write of an interrupted
+    run and is ignored.
+    """
+    size = 0
+    try:
+        with open(index_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                size += len(line)
+                yield json.loads(line), size
+    except FileNotFoundError:
+        return
+
+
+def _load_index(index_path):
+    """Latest index entry of every (subsite, doc_id), and the index size."""
+    entries = {}
+    size = 0
+    for entry, size in _iter_index(index_path):
+        entries[(entry["subsite"], entry["doc_id"])] = entry
+    return entries, size
+
+
+class Archive:
+    """Documents appended to a single tar, zip or JSONL file by one writer thread.
+
+    Workers hand rendered documents to ``add``; the writer thread appends
+    them to the archive and records each in an index next to it
+    (``<archive>.idx``, one JSON line per document), so one document can be
+    read back without scanning the archive. In tar and JSONL archives every
+    document is compressed as its own gzip or xz member: the file as a whole
+    is still a valid .tar.gz or .jsonl.xz, and the index offset of a
+    document is where its member starts.
+
+    An existing archive is appended to; anything after the last indexed
+    document, such as the tar end marker or the write of an interrupted
+    run, is cut off first. A zip file only becomes readable when it is
+    closed, so one left by an interrupted run cannot be appended to and is
+    rejected with ValueError, as is an index listing documents the archive
+    does not hold (e.g. after the archive alone was moved away).
+    """
+
+    def __init__(self, output_dir, fmt="tar", compression="gzip"):
+        self.fmt = fmt
+        self.compression = compression
+        self.path = archive_path(output_dir, fmt, compression)
+        self.index_path = _index_path(self.path)
+        self.entries, index_size = _load_index(self.index_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "zip":
+            self._file = self._open_zip()
+        else:
+            self._file = self._open_stream()
+        self._index = open(self.index_path, "ab")
+        self._index.truncate(index_size)
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._writer = threading.Thread(
+            target=self._write_loop, name="hudoc-archive", daemon=True
+        )
+        self._writer.start()
+
+    def _trailer(self):
+        return _compress(_TAR_END, self.compression) if self.fmt == "tar" else b""
+
+    def _stale_index(self):
+        return ValueError(
+            f"{self.index_path} lists documents that are not in {self.path}; "
+            "move both away to start a new archive"
+        )
+
+    def _open_zip(self):
+        exists = self.path.exists() and self.path.stat().st_size
+        if exists and not zipfile.is_zipfile(self.path):
+            # Without its central directory, appending would start a new zip
+            # behind the old members and lose them
+            raise ValueError(
+                f"{self.path} is not a complete zip file, probably left by an "
+                "interrupted run; repair it (e.g. zip -FF) or move it and "
+                f"{self.index_path} away to start a new one"
+            )
+        if self.entries and not exists:
+            raise self._stale_index()
+        archive = zipfile.ZipFile(
+            self.path, "a", compression=_ZIP_COMPRESSION[self.compression]
+        )
+        names = set(archive.namelist())
+        for entry in self.entries.values():
+            if not names.issuperset(entry.get("members", entry["names"])):
+                archive.close()
+                raise self._stale_index()
+        return archive
+
+    def _open_stream(self):
+        end = max(
+            (entry["offset"] + entry["length"] for entry in self.entries.values()),
+            default=0,
+        )
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if size < end:
+            raise self._stale_index()
+        if size > end and not self.entries and size != len(self._trailer()):
+            raise ValueError(
+                f"{self.path} has no index at {self.index_path}; "
+                "move the archive away to start a new one"
+            )
+        f = open(self.path, "r+b" if size else "wb")
+        f.truncate(end)
+        f.seek(end)
+        return f
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def contains(self, doc_id, subsite):
+        """Whether the document was written to the archive, in this or an earlier run."""
+        return (subsite, doc_id) in self.entries
+
+    def add(self, doc_id, subsite, files, version=None):
+        """Queue a document, given as (path, content) pairs, for the writer."""
+        self._queue.put((doc_id, subsite, files, version))
+
+    def save(self, text, item, subsite, evid=False, revision=None):
+        """Render a downloaded document as ``save_text`` would and queue it.
+
+        A new ``revision`` of a document is appended like any other; the
+        earlier versions stay in the archive and its index.
+        """
+        files = document_files(
+            text,
+            item["doc_id"],
+            item["title"],
+            item["description"],
+            subsite,
+            verdict_date=item.get("verdict_date"),
+            evid=evid,
+        )
+        self.add(item["doc_id"], subsite, files, revision and revision.version)
+
+    def _write(self, doc_id, subsite, files, version):
+        entry = {"doc_id": doc_id, "subsite": subsite, "names": [n for n, _ in files]}
+        if version is not None:
+            entry["version"] = version
+        if self.fmt == "zip":
+            members = [_zip_member(name, version) for name, _ in files]
+            for member, (_, content) in zip(members, files):
+                self._file.writestr(member, content)
+            if members != entry["names"]:
+                entry["members"] = members
+        else:
+            if self.fmt == "tar":
+                data = _tar_blocks(files)
+            else:
+                record = {"doc_id": doc_id, "subsite": subsite, "files": dict(files)}
+                data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            data = _compress(data, self.compression)
+            entry["offset"] = self._file.tell()
+            entry["length"] = len(data)
+            self._file.write(data)
+            self._file.flush()
+        self._index.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._index.flush()
+        self.entries[(subsite, doc_id)] = entry
+
+    def _write_document(self, doc_id, subsite, files, version):
+        started = time.perf_counter()
+        try:
+            self._write(doc_id, subsite, files, version)
+        except Exception as e:
+            # Keep draining the queue so workers never block on a dead writer
+            logging.error(f"Failed to write {doc_id} to {self.path}: {str(e)}")
+            metrics.inc("failures", subsite)
+            return
+        metrics.observe("write_seconds", subsite, time.perf_counter() - started)
+        metrics.inc("documents", subsite)
+        logging.info(f"Saved {doc_id} to {self.path}")
+
+    def _write_loop(self):
+        while True:
+            document = self._queue.get()
+            try:
+                if document is None:
+                    return
+                self._write_document(*document)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until the writer has written every queued document."""
+        self._queue.join()
+
+    def close(self):
+        """Write the queued documents and finish the archive."""
+        self._queue.put(None)
+        self._writer.join()
+        try:
+            if self.fmt == "tar":
+                self._file.write(self._trailer())
+            self._file.close()
+        finally:
+            self._index.close()
+
+
+def _find_entry(path, doc_id, subsite, version):
+    entry = None
+    for candidate, _ in _iter_index(_index_path(path)):
+        if candidate["doc_id"] != doc_id:
+            continue
+        if subsite and candidate["subsite"] != subsite:
+            continue
+        if version and candidate.get("version", 1) != version:
+            continue
+        entry = candidate
+    return entry
+
+
+def read_document(path, doc_id, subsite="", version=0):
+    """Files of one document in an archive, as (path, content) pairs.
+
+    The document is located through the index, so only its own member is
+    read and decompressed. ``version`` selects an earlier version of a
+    revised document; the default is the latest. Returns None if the
+    document is not indexed.
+    """
+    fmt, compression = archive_format(path)
+    entry = _find_entry(path, doc_id, subsite, version)
+    if entry is None:
+        return None
+    if fmt == "zip":
+        members = entry.get("members", entry["names"])
+        with zipfile.ZipFile(path) as archive:
+            return [
+                (name, archive.read(member).decode("utf-8"))
+                for name, member in zip(entry["names"], members)
+            ]
+    with open(path, "rb") as f:
+        f.seek(entry["offset"])
+        data = _decompress(f.read(entry["length"]), compression)
+    if fmt == "jsonl":
+        return list(json.loads(data)["files"].items())
+    with tarfile.open(fileobj=io.BytesIO(data)) as members:
+        return [
+            (member.name, members.extractfile(member).read().decode("utf-8"))
+            for member in members
+        ]
+
+
+def extract_document(path, doc_id, output_dir, subsite="", version=0):
+    """Write one document of an archive into ``output_dir``.
+
+    Returns the written paths, or None if the document is not in the archive.
+    """
+    files = read_document(path, doc_id, subsite, version)
+    if files is None:
+        return None
+    written = []
+    for name, content in files:
+        if Path(name).is_absolute() or ".." in Path(name).parts:
+            raise ValueError(f"Unsafe path in archive: {name}")
+        target = Path(output_dir) / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding="utf-8")
+        written.append(target)
+    return written
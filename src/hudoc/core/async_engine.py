@@ -0,0 +1,134 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .downloader import download_steps, record_failure
+from .scheduler import advance
+from .session import configure_pool
+
+# Upper bound on threads used for blocking HTTP calls, extraction and writes.
+# Documents waiting for conversion hold no thread, so in-flight documents can
+# far exceed this number.
+MAX_IO_WORKERS = 32
+
+
+async def run_steps_async(pool, steps):
+    """Drive a step generator: steps run on ``pool``, waits on the event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        done, value = await loop.run_in_executor(pool, advance, steps)
+        if done:
+            return value
+        await asyncio.sleep(value)
+
+
+async def download_document_async(
+    pool,
+    item,
+    hudoc_type,
+    output_dir,
+    conversion_delay,
+    evid=False,
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    await run_steps_async(
+        pool,
+        download_steps(
+            item,
+            hudoc_type,
+            output_dir,
+            conversion_delay,
+            evid,
+            cache,
+            latency,
+            store,
+            versions,
+        ),
+    )
+
+
+async def _run(
+    subsite,
+    items,
+    output_dir,
+    concurrency,
+    conversion_delay,
+    evid,
+    cache,
+    latency,
+    store,
+    versions,
+):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    io_workers = min(concurrency, MAX_IO_WORKERS)
+    configure_pool(io_workers)
+
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+
+        async def download(item):
+            try:
+                await download_document_async(
+                    pool,
+                    item,
+                    subsite,
+                    output_dir,
+                    conversion_delay,
+                    evid=evid,
+                    cache=cache,
+                    latency=latency,
+                    store=store,
+                    versions=versions,
+                )
+            except Exception as e:
+                record_failure(item, subsite, e)
+            finally:
+                semaphore.release()
+
+        # Items may be a lazy feed stream: read it off the event loop so
+        # downloads already started keep running while the feed is parsed.
+        # The next item is only read once a slot is free, and finished
+        # tasks drop out of the set, so memory follows the concurrency.
+        iterator = iter(items)
+        tasks = set()
+        while True:
+            await semaphore.acquire()
+            item = await loop.run_in_executor(None, next, iterator, None)
+            if item is None:
+                semaphore.release()
+                break
+            task = asyncio.create_task(download(item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+
+def run_async_downloads(
+    subsite,
+    items,
+    output_dir,
+    concurrency,
+    conversion_delay,
+    evid,
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    """Download items on one event loop with up to ``concurrency`` in flight."""
+    asyncio.run(
+        _run(
+            subsite,
+            items,
+            output_dir,
+            concurrency,
+            conversion_delay,
+            evid,
+            cache,
+            latency,
+            store,
+            versions,
+        )
+    )
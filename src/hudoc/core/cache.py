@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+# Cached bodies younger than this are served without contacting the server
+CACHE_TTL = 7 * 24 * 3600
+# Entries older than this are evicted regardless of cache size
+CACHE_MAX_AGE = 90 * 24 * 3600
+CACHE_MAX_BYTES = 2 * 1024**3
+
+
+class DocumentCache:
+    """On-disk cache of converted document bodies.
+
+    Entries are keyed by the conversion URL, which encodes the subsite host,
+    library and document ID. Each entry is a body file plus a JSON sidecar
+    with the ETag/Last-Modified validators used for conditional revalidation.
+    """
+
+    def __init__(
+        self,
+        directory,
+        offline=False,
+        ttl=CACHE_TTL,
+        max_age=CACHE_MAX_AGE,
+        max_bytes=CACHE_MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.offline = offline
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    def _paths(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = self.directory / digest[:2] / digest
+        return base.with_suffix(".html"), base.with_suffix(".json")
+
+    def get(self, url):
+        """Return ``(body, meta)`` for a cached URL, or ``None``."""
+        body_path, meta_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_text(encoding="utf-8")
+        except (OSError, ValueError):
+            return None
+        return body, meta
+
+    def is_fresh(self, meta):
+        return time.time() - meta.get("stored_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(meta):
+        """Request headers for revalidating a cached entry."""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """Store a body and its validators, replacing any previous entry."""
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+            "size": len(body.encode("utf-8")),
+        }
+        try:
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(body_path, body)
+            _write_atomic(meta_path, json.dumps(meta))
+        except OSError as e:
+            logging.warning(f"Failed to cache {url}: {str(e)}")
+
+    def touch(self, url):
+        """Mark a cached entry as revalidated now."""
+        cached = self.get(url)
+        if cached is None:
+            return
+        _, meta = cached
+        meta["stored_at"] = time.time()
+        try:
+            _write_atomic(self._paths(url)[1], json.dumps(meta))
+        except OSError as e:
+            logging.warning(f"Failed to update cache entry for {url}: {str(e)}")
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until under ``max_bytes``."""
+        now = time.time()
+        entries = []
+        for meta_path in self.directory.glob("*/*.json"):
+            body_path = meta_path.with_suffix(".html")
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                meta = {}
+            stored_at = meta.get("stored_at", 0)
+            if now - stored_at > self.max_age:
+                _remove(body_path, meta_path)
+                continue
+            entries.append((stored_at, meta.get("size", 0), body_path, meta_path))
+
+        total = sum(size for _, size, _, _ in entries)
+        removed = 0
+        for _, size, body_path, meta_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(body_path, meta_path)
+            total -= size
+            removed += 1
+        if removed:
+            logging.info(f"Evicted {removed} entries from cache {self.directory}")
+
+
+def _write_atomic(path, content):
+    partial = f"{path}.part"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(partial, path)
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
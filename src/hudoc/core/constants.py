@@ -13,15 +13,49 @@ VALID_SUBSITES = [
     "echr",
 ]
 
+# Download engines: one blocking thread per document, or coroutines on one loop
+VALID_ENGINES = ["thread", "async"]
+
+# HTML-to-text extractors (see core.extract)
+VALID_EXTRACTORS = ["stream", "bs4"]
+DEFAULT_EXTRACTOR = "stream"
+
+# Encoding of converted HUDOC documents, used when a response declares none
+DOCUMENT_ENCODING = "utf-8"
+# Largest document body read before a download is abandoned
+DEFAULT_MAX_DOCUMENT_MB = 64
+
+# Feed pages fetched ahead of the page being consumed when harvesting
+DEFAULT_PAGE_WORKERS = 4
+
+# Hidden directory in the output directory for state kept between runs
+STATE_DIR = ".hudoc"
+
+# Output backends: one file or directory per document, a single archive
+# (see core.archive) or a SQLite database with full-text search (see
+# core.database)
+OUTPUT_FORMATS = ["files", "archive", "sqlite"]
+ARCHIVE_FORMATS = ["tar", "zip", "jsonl"]
+ARCHIVE_COMPRESSIONS = ["none", "gzip", "lzma"]
+# Archive file name in the output directory, before the format's extension
+ARCHIVE_NAME = "hudoc"
+# Database file name in the output directory
+DATABASE_NAME = "hudoc.db"
+
 
 # Mapping of subsites to their library codes and document ID keys
-def _rss_url(sub):
+def _rss_url(sub, start=1):
     return (
         f"https://hudoc.{sub}.coe.int/app/transform/rss"
-        f"?library={sub}eng&query=contentsitename%3A{sub.upper()}&sort=&start=1"
+        f"?library={sub}eng&query=contentsitename%3A{sub.upper()}&sort=&start={start}"
     )
 
 
+def rss_page_url(sub, start):
+    """URL of the feed page of a subsite starting at item ``start`` (1-based)."""
+    return _rss_url(sub, start)
+
+
 SUBSITE_CONFIG = {
     "echr": {
         "library": "ECHR",
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+# The first poll comes a little before the expected conversion time, so the
+# estimate can also move down; later polls back off multiplicatively
+PROBE_FACTOR = 0.8
+BACKOFF_FACTOR = 2.0
+MIN_POLL_DELAY = 0.25
+MAX_POLL_DELAY = 60.0
+# Weight of a new observation in the moving average
+SMOOTHING = 0.2
+
+
+class ConversionLatency:
+    """Per-library estimate of how long HUDOC takes to convert a document.
+
+    Estimates are exponential moving averages of the time between triggering
+    a conversion and the document becoming available. They can be persisted
+    to a JSON file so later runs start from what earlier runs observed.
+    """
+
+    def __init__(self, path=None, estimates=None):
+        self.path = Path(path) if path else None
+        self._estimates = dict(estimates or {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Load persisted estimates, starting empty if the file is unusable."""
+        try:
+            estimates = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            estimates = {}
+        if not isinstance(estimates, dict):
+            estimates = {}
+        return cls(path, estimates)
+
+    def estimate(self, library, default):
+        with self._lock:
+            return self._estimates.get(library, default)
+
+    def delay(self, library, attempt, default):
+        """Seconds to wait before poll number ``attempt`` (0-based)."""
+        delay = self.estimate(library, default) * PROBE_FACTOR
+        delay *= BACKOFF_FACTOR**attempt
+        return min(max(delay, MIN_POLL_DELAY), MAX_POLL_DELAY)
+
+    def observe(self, library, seconds):
+        """Record the time a conversion took until the document was ready."""
+        with self._lock:
+            previous = self._estimates.get(library)
+            if previous is None:
+                self._estimates[library] = seconds
+            else:
+                self._estimates[library] = (
+                    1 - SMOOTHING
+                ) * previous + SMOOTHING * seconds
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            content = json.dumps(self._estimates, indent=2, sort_keys=True)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial = f"{self.path}.part"
+            with open(partial, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(partial, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to save conversion latency: {str(e)}")
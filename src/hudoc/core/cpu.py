@@ -0,0 +1,61 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Processes for the CPU-bound stage of a download (HTML extraction and evid
+# rendering); with none, that work runs in the download threads
+_workers = 0
+_pool = None
+_lock = threading.Lock()
+
+
+def configure_cpu_workers(workers):
+    """Set the number of processes for extraction and rendering (0 for none)."""
+    global _workers
+    workers = max(0, int(workers))
+    with _lock:
+        if workers != _workers:
+            _shutdown()
+            _workers = workers
+
+
+def cpu_workers():
+    return _workers
+
+
+def run_cpu(fn, *args):
+    """Run ``fn(*args)`` in the process pool, or in this thread without one.
+
+    ``fn`` and its arguments must be picklable. The calling thread waits
+    for the result without holding the GIL, so download threads keep
+    fetching while other documents are extracted.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args).result()
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _workers and _pool is None:
+            # Spawned, not forked: a fork would copy the locks of the running
+            # download threads in whatever state they are in
+            _pool = ProcessPoolExecutor(
+                _workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def close_cpu_pool():
+    """Stop the worker processes; they are started again when next needed."""
+    with _lock:
+        _shutdown()
+
+
+def _shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,249 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ..utils import document_link
+from .constants import DATABASE_NAME
+from .metrics import metrics
+
+# Documents written per transaction, and the longest a document waits for
+# its batch to fill
+BATCH_SIZE = 200
+BATCH_SECONDS = 1.0
+# Downloaded documents waiting for the writer; workers block while it is full
+QUEUE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    subsite TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    verdict_date TEXT,
+    url TEXT,
+    text TEXT NOT NULL,
+    sha256 TEXT,
+    version INTEGER,
+    duplicate_of TEXT,
+    PRIMARY KEY (subsite, doc_id)
+);
+CREATE TABLE IF NOT EXISTS document_versions (
+    subsite TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    sha256 TEXT,
+    text TEXT NOT NULL,
+    PRIMARY KEY (subsite, doc_id, version)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, description, text, content='documents', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, title, description, text)
+    VALUES (new.rowid, new.title, new.description, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, title, description, text)
+    VALUES ('delete', old.rowid, old.title, old.description, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, title, description, text)
+    VALUES ('delete', old.rowid, old.title, old.description, old.text);
+    INSERT INTO documents_fts(rowid, title, description, text)
+    VALUES (new.rowid, new.title, new.description, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_keep_version AFTER UPDATE OF text ON documents
+WHEN old.text IS NOT new.text BEGIN
+    INSERT OR REPLACE INTO document_versions (subsite, doc_id, version, sha256, text)
+    VALUES (old.subsite, old.doc_id, COALESCE(old.version, 0), old.sha256, old.text);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO documents (
+    subsite, doc_id, title, description, verdict_date, url, text,
+    sha256, version, duplicate_of
+)
+VALUES (
+    :subsite, :doc_id, :title, :description, :verdict_date, :url, :text,
+    :sha256, :version, :duplicate_of
+)
+ON CONFLICT (subsite, doc_id) DO UPDATE SET
+    title = excluded.title,
+    description = excluded.description,
+    verdict_date = excluded.verdict_date,
+    url = excluded.url,
+    text = excluded.text,
+    sha256 = excluded.sha256,
+    version = excluded.version,
+    duplicate_of = excluded.duplicate_of
+"""
+
+# Column weights of bm25 for title, description and text
+_RANK_WEIGHTS = (5.0, 2.0, 1.0)
+
+
+def database_path(output_dir):
+    return Path(output_dir) / DATABASE_NAME
+
+
+def _connect(path):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class DocumentDatabase:
+    """Documents saved into a SQLite database with a full-text index.
+
+    Workers hand downloaded documents to ``save``; a writer thread inserts
+    them in batches of up to ``BATCH_SIZE`` per transaction. The database
+    runs in WAL mode, so ``hudoc search`` can query it during a download.
+    """
+
+    def __init__(self, output_dir):
+        self.path = database_path(output_dir)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = _connect(self.path)
+        try:
+            connection.executescript(_SCHEMA)
+            rows = connection.execute("SELECT subsite, doc_id FROM documents")
+            self._saved = set(rows)
+        finally:
+            connection.close()
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._writer = threading.Thread(
+            target=self._write_loop, name="hudoc-database", daemon=True
+        )
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def contains(self, doc_id, subsite):
+        """Whether the document was saved to the database, in this or an earlier run."""
+        return (subsite, doc_id) in self._saved
+
+    def save(self, text, item, subsite, evid=False, revision=None):
+        """Queue a downloaded document for the writer.
+
+        The text is stored as extracted; ``evid`` only applies to files.
+        When the text of a saved document changes, the previous text is
+        kept in ``document_versions``.
+        """
+        duplicate_of = revision and revision.duplicate_of
+        self._queue.put(
+            {
+                "subsite": subsite,
+                "doc_id": item["doc_id"],
+                "title": item["title"],
+                "description": item["description"],
+                "verdict_date": item.get("verdict_date"),
+                "url": document_link(item["doc_id"], subsite),
+                "text": text,
+                "sha256": revision and revision.digest,
+                "version": revision and revision.version,
+                "duplicate_of": "/".join(duplicate_of) if duplicate_of else None,
+            }
+        )
+
+    def _next_batch(self):
+        """Wait for a document, then collect more until the batch is full or due.
+
+        Returns the batch and whether the database is being closed.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < BATCH_SIZE:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is None:
+                return batch, True
+            batch.append(row)
+            if deadline is None:
+                deadline = time.monotonic() + BATCH_SECONDS
+        return batch, False
+
+    def _write_batch(self, connection, batch):
+        started = time.perf_counter()
+        try:
+            with connection:
+                connection.executemany(_UPSERT, batch)
+        except sqlite3.Error as e:
+            logging.error(
+                f"Failed to write {len(batch)} documents to {self.path}: {str(e)}"
+            )
+            for row in batch:
+                metrics.inc("failures", row["subsite"])
+            return
+        elapsed = (time.perf_counter() - started) / len(batch)
+        for row in batch:
+            self._saved.add((row["subsite"], row["doc_id"]))
+            metrics.observe("write_seconds", row["subsite"], elapsed)
+            metrics.inc("documents", row["subsite"])
+        logging.info(f"Saved {len(batch)} documents to {self.path}")
+
+    def _write_loop(self):
+        # SQLite connections stay in the thread that created them
+        connection = _connect(self.path)
+        try:
+            while True:
+                batch, closing = self._next_batch()
+                if batch:
+                    self._write_batch(connection, batch)
+                for _ in range(len(batch) + closing):
+                    self._queue.task_done()
+                if closing:
+                    return
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Wait until the writer has committed every queued document."""
+        self._queue.join()
+
+    def close(self):
+        """Write the queued documents and close the database."""
+        self._queue.put(None)
+        self._writer.join()
+
+
+def search(path, query, limit=10, subsite=""):
+    """Full-text search of a document database, best matches first.
+
+    ``query`` uses the FTS5 query syntax, e.g. ``"freedom of expression"
+    AND journalist``. Returns dicts with the document's metadata and a
+    snippet of the text around the matches.
+    """
+    where = "documents_fts MATCH :query"
+    if subsite:
+        where += " AND d.subsite = :subsite"
+    sql = f"""
+        SELECT d.subsite, d.doc_id, d.title, d.verdict_date, d.url,
+               snippet(documents_fts, 2, '[', ']', '...', 16) AS snippet
+        FROM documents_fts JOIN documents AS d ON d.rowid = documents_fts.rowid
+        WHERE {where}
+        ORDER BY bm25(documents_fts, {", ".join(map(str, _RANK_WEIGHTS))})
+        LIMIT :limit
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(
+            sql, {"query": query, "subsite": subsite, "limit": limit}
+        )
+        return [dict(row) for row in rows]
+    finally:
+        connection.close()
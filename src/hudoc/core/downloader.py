@@ -1,26 +1,121 @@
 import logging
+import time
 
-from ..utils import get_document_text, save_text
+from ..utils import document_text_steps, get_document_text, is_saved, save_text
 from .constants import SUBSITE_CONFIG
+from .metrics import metrics
+from .versions import duplicate_note
 
 
-def download_document(item, hudoc_type, output_dir, conversion_delay, evid=False):
-    config = SUBSITE_CONFIG[hudoc_type]
-    base_url = config["base_url"]
-    library = config["library"]
+def _is_stored(doc_id, hudoc_type, output_dir, evid, store):
+    if store is not None:
+        return store.contains(doc_id, hudoc_type)
+    return is_saved(doc_id, hudoc_type, output_dir, None, evid)
+
+
+def _save_document(text, item, hudoc_type, output_dir, evid, store=None, versions=None):
+    """Save a document into ``output_dir``, or hand it to ``store`` if given.
+
+    With a content index (``versions``), a document saved before with the
+    same text is left alone, a revised one is saved as a new version, and
+    one with the same text as another document is saved as a reference.
+    """
     doc_id = item["doc_id"]
-    rss_link = item.get("rss_link")
-    text = get_document_text(doc_id, base_url, library, rss_link, conversion_delay)
-    if text:
-        save_text(
-            text,
-            doc_id,
-            item["title"],
-            item["description"],
-            output_dir,
-            hudoc_type,
-            verdict_date=item.get("verdict_date"),
-            evid=evid,
-        )
-    else:
+    if not text:
         logging.warning(f"No content retrieved for {doc_id}")
+        metrics.inc("failures", hudoc_type)
+        return
+    revision = None
+    if versions is not None:
+        revision = versions.record(hudoc_type, doc_id, text)
+        if revision.status == "unchanged" and _is_stored(
+            doc_id, hudoc_type, output_dir, evid, store
+        ):
+            logging.info(f"Content of {doc_id} is unchanged")
+            metrics.inc("unchanged", hudoc_type)
+            return
+        if revision.status == "changed":
+            logging.info(
+                f"Content of {doc_id} changed; saving version {revision.version}"
+            )
+            metrics.inc("revisions", hudoc_type)
+        if revision.duplicate_of:
+            logging.info(f"Content of {doc_id} duplicates {revision.duplicate_of[1]}")
+            metrics.inc("duplicates", hudoc_type)
+            text = duplicate_note(revision.duplicate_of)
+    if store is not None:
+        store.save(text, item, hudoc_type, evid, revision)
+        return
+    started = time.perf_counter()
+    save_text(
+        text,
+        doc_id,
+        item["title"],
+        item["description"],
+        output_dir,
+        hudoc_type,
+        verdict_date=item.get("verdict_date"),
+        evid=evid,
+        previous_version=(
+            revision.version - 1 if revision and revision.status == "changed" else 0
+        ),
+    )
+    metrics.observe("write_seconds", hudoc_type, time.perf_counter() - started)
+    metrics.inc("documents", hudoc_type)
+
+
+def record_failure(item, hudoc_type, error):
+    """Log and count a download that raised, so the run can go on."""
+    logging.error(f"Failed to download {item['doc_id']}: {str(error)}")
+    metrics.inc("failures", hudoc_type)
+
+
+def download_document(
+    item,
+    hudoc_type,
+    output_dir,
+    conversion_delay,
+    evid=False,
+    cache=None,
+    store=None,
+    versions=None,
+):
+    config = SUBSITE_CONFIG[hudoc_type]
+    text = get_document_text(
+        item["doc_id"],
+        config["base_url"],
+        config["library"],
+        item.get("rss_link"),
+        conversion_delay,
+        cache,
+    )
+    _save_document(text, item, hudoc_type, output_dir, evid, store, versions)
+
+
+def download_steps(
+    item,
+    hudoc_type,
+    output_dir,
+    conversion_delay,
+    evid=False,
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    """Generator form of ``download_document`` that yields conversion waits."""
+    config = SUBSITE_CONFIG[hudoc_type]
+    metrics.add("in_flight", hudoc_type, 1)
+    try:
+        text = yield from document_text_steps(
+            item["doc_id"],
+            config["base_url"],
+            config["library"],
+            item.get("rss_link"),
+            conversion_delay,
+            cache,
+            latency,
+        )
+        _save_document(text, item, hudoc_type, output_dir, evid, store, versions)
+    finally:
+        metrics.add("in_flight", hudoc_type, -1)
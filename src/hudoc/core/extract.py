@@ -0,0 +1,245 @@
+import time
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+from bs4.dammit import EntitySubstitution
+
+from .constants import DEFAULT_EXTRACTOR
+from .cpu import cpu_workers, run_cpu
+
+# Elements whose text becomes a paragraph of the extracted document
+TEXT_TAGS = ("p", "li", "h1", "h2", "h3")
+
+# Tags without content; a later explicit end tag for one of these is ignored
+_EMPTY_ELEMENT_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+# Tags whose strings BeautifulSoup stores as script/style/template/ruby
+# strings, which get_text() leaves out
+_STRING_CONTAINERS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+
+
+def extract_text_bs4(html):
+    """Extract paragraph text by building a BeautifulSoup tree."""
+    soup = BeautifulSoup(html, "html.parser")
+    for script in soup(["script", "style"]):
+        script.extract()
+
+    # Extract text from top-level text containers, avoiding nested duplicates
+    text_elements = soup.find_all(list(TEXT_TAGS))
+    seen_texts = set()
+    text_lines = []
+    for element in text_elements:
+        text = element.get_text(separator=" ", strip=True)
+        if text and text not in seen_texts:
+            seen_texts.add(text)
+            text_lines.append(text)
+
+    # Join paragraphs with double newlines for readability
+    return "\n\n".join(text_lines)
+
+
+class _TextCollector(HTMLParser):
+    """Single-pass event handler reproducing ``extract_text_bs4``.
+
+    Instead of building a tree, each open text element gets a slot (in
+    start-tag order, like ``find_all``) that collects the stripped strings
+    seen while it is open. Tag matching, string merging and entity handling
+    follow BeautifulSoup's html.parser tree builder so the output is
+    identical.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.slots = []
+        self._stack = []  # (tag name, slot or None)
+        self._open_counts = {}
+        self._open_slots = []
+        self._containers = 0
+        self._data = []
+        self._closed_empty = []
+
+    def _flush(self, include=None):
+        if not self._data:
+            return
+        text = "".join(self._data)
+        self._data = []
+        if include is None:
+            include = not self._containers
+        if include and self._open_slots:
+            text = text.strip()
+            if text:
+                for slot in self._open_slots:
+                    slot.append(text)
+
+    def _push(self, tag):
+        slot = None
+        if tag in TEXT_TAGS:
+            slot = []
+            self.slots.append(slot)
+            self._open_slots.append(slot)
+        if tag in _STRING_CONTAINERS:
+            self._containers += 1
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        self._stack.append((tag, slot))
+
+    def _pop_to(self, tag):
+        if not self._open_counts.get(tag):
+            return
+        while self._stack:
+            name, slot = self._stack.pop()
+            self._open_counts[name] -= 1
+            if slot is not None:
+                self._open_slots.pop()
+            if name in _STRING_CONTAINERS:
+                self._containers -= 1
+            if name == tag:
+                return
+
+    def handle_starttag(self, tag, attrs, empty_element=True):
+        self._flush()
+        self._push(tag)
+        if empty_element and tag in _EMPTY_ELEMENT_TAGS:
+            self._pop_to(tag)
+            self._closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, empty_element=False)
+        self._flush()
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_empty:
+            # Redundant end tag of an empty element; it does not end the string
+            self._closed_empty.remove(tag)
+            return
+        self._flush()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        dereferenced, _, extra_data = (
+            BeautifulSoupHTMLParser._dereference_numeric_character_reference(name)
+        )
+        self._data.append(dereferenced)
+        self._data.append(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._data.append(character if character is not None else f"&{name}")
+
+    def _skip(self, data):
+        # Comments, declarations and processing instructions end the current
+        # string and are not part of the text themselves
+        self._flush()
+        self._data.append(data)
+        self._flush(include=False)
+
+    def handle_comment(self, data):
+        self._skip(data)
+
+    def handle_decl(self, decl):
+        self._skip(decl)
+
+    def handle_pi(self, data):
+        self._skip(data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self._flush()
+            self._data.append(data[len("CDATA[") :])
+            self._flush(include=True)
+        else:
+            self._skip(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _join_slots(slots):
+    seen_texts = set()
+    text_lines = []
+    for slot in slots:
+        text = " ".join(slot)
+        if text and text not in seen_texts:
+            seen_texts.add(text)
+            text_lines.append(text)
+    return "\n\n".join(text_lines)
+
+
+def extract_text_stream(html):
+    """Extract paragraph text in one pass over the parser events."""
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    return _join_slots(collector.slots)
+
+
+EXTRACTORS = {
+    "stream": extract_text_stream,
+    "bs4": extract_text_bs4,
+}
+
+_extractor = EXTRACTORS[DEFAULT_EXTRACTOR]
+
+
+def set_extractor(name):
+    """Select the HTML-to-text extractor used by ``extract_text``."""
+    global _extractor
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor: {name}")
+    _extractor = EXTRACTORS[name]
+
+
+def extract_text(html):
+    """Extract paragraph text from converted document HTML."""
+    return _extractor(html)
+
+
+def _timed_extract(extract, html):
+    started = time.thread_time()
+    text = extract(html)
+    return text, time.thread_time() - started
+
+
+class TextExtractor:
+    """Extract paragraph text from HTML fed in pieces, e.g. while downloading.
+
+    The stream extractor parses each piece as it arrives, so the whole body
+    is never held in memory; other extractors collect the pieces and run at
+    ``close``, in the CPU process pool if one is configured (see
+    ``core.cpu``). ``cpu_seconds`` is the CPU time spent extracting.
+    """
+
+    def __init__(self):
+        self._extract = _extractor
+        self._collector = None
+        if _extractor is extract_text_stream and not cpu_workers():
+            self._collector = _TextCollector()
+        self._pieces = []
+        self.cpu_seconds = 0.0
+
+    def feed(self, html):
+        started = time.thread_time()
+        if self._collector is not None:
+            self._collector.feed(html)
+        else:
+            self._pieces.append(html)
+        self.cpu_seconds += time.thread_time() - started
+
+    def close(self):
+        """Finish extraction and return the text."""
+        if self._collector is None:
+            text, seconds = run_cpu(
+                _timed_extract, self._extract, "".join(self._pieces)
+            )
+            self.cpu_seconds += seconds
+            return text
+        started = time.thread_time()
+        self._collector.close()
+        text = _join_slots(self._collector.slots)
+        self.cpu_seconds += time.thread_time() - started
+        return text
@@ -0,0 +1,154 @@
+import io
+import logging
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from ..utils import is_saved, saved_entries
+from .constants import DEFAULT_PAGE_WORKERS, rss_page_url
+from .parser import parse_rss_page
+
+# Attempts at fetching one feed page, and the pause before the first retry
+# (doubled for each later one)
+PAGE_ATTEMPTS = 3
+PAGE_RETRY_DELAY = 2.0
+
+
+class HarvestError(Exception):
+    """A feed page could not be fetched, so the harvest is incomplete."""
+
+
+def _fetch_page(subsite, start):
+    """Items of the feed page starting at item ``start``, and its item count.
+
+    The count includes malformed items that were dropped, so it tells a
+    full page from the last one; it is 0 past the end of the feed. A failed
+    request or a malformed page is retried; raises
+    ``HarvestError`` once every attempt has failed, so a transient error is
+    never mistaken for the end of the feed.
+    """
+    import requests
+
+    from .session import get_session
+
+    url = rss_page_url(subsite, start)
+    for attempt in range(PAGE_ATTEMPTS):
+        if attempt:
+            time.sleep(PAGE_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            with get_session(url).get(url, timeout=30) as resp:
+                resp.raise_for_status()
+                return parse_rss_page(io.BytesIO(resp.content), subsite)
+        except (requests.RequestException, ET.ParseError) as e:
+            logging.warning(
+                f"Attempt {attempt + 1} failed for {subsite} feed page at item "
+                f"{start}: {str(e)}"
+            )
+    raise HarvestError(
+        f"Failed to fetch the {subsite} feed page at item {start} "
+        f"after {PAGE_ATTEMPTS} attempts"
+    )
+
+
+def iter_feed_pages(subsite, workers=DEFAULT_PAGE_WORKERS, page_size=0):
+    """Yield the item lists of successive feed pages of a subsite.
+
+    The first page sets the page size (unless ``page_size`` is given); later
+    pages are fetched ``workers`` at a time ahead of the consumer and yielded
+    in order. Only those pages are held in memory. The walk ends at an empty
+    or short page, counting malformed items that were dropped; a page that cannot be fetched raises ``HarvestError``.
+    """
+    first, count = _fetch_page(subsite, 1)
+    if not count:
+        return
+    yield first
+    page_size = page_size or count
+    if count < page_size:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        next_start = 1 + page_size
+        try:
+            while True:
+                while len(pending) < max(1, workers):
+                    future = pool.submit(_fetch_page, subsite, next_start)
+                    pending.append((next_start, future))
+                    next_start += page_size
+                start, future = pending.popleft()
+                items, count = future.result()
+                if not count:
+                    logging.info(
+                        f"Reached the end of the {subsite} feed at item {start}"
+                    )
+                    return
+                yield items
+                if count < page_size:
+                    return
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def harvest_items(subsite, stop=None, workers=DEFAULT_PAGE_WORKERS, page_size=0):
+    """Stream the items of a subsite's whole feed, newest first.
+
+    Stops before the first item for which ``stop(item)`` is true. Items
+    repeated across a page boundary (when documents are published during the
+    walk) are yielded once.
+    """
+    previous_ids = set()
+    for page in iter_feed_pages(subsite, workers, page_size):
+        page_ids = set()
+        for item in page:
+            doc_id = item["doc_id"]
+            if doc_id in previous_ids:
+                continue
+            if stop is not None and stop(item):
+                logging.info(f"Harvest of {subsite} reached known boundary at {doc_id}")
+                return
+            page_ids.add(doc_id)
+            yield item
+        previous_ids = page_ids
+
+
+@contextmanager
+def open_harvest(subsite, stop=None, workers=DEFAULT_PAGE_WORKERS):
+    """Harvest a subsite feed for pipelined processing, like ``open_rss_url``.
+
+    Yields ``(subsite, items)`` and stops fetching pages on exit. Reading
+    ``items`` raises ``HarvestError`` if a page cannot be fetched.
+    """
+    items = harvest_items(subsite, stop, workers)
+    try:
+        yield subsite, items
+    finally:
+        items.close()
+
+
+def harvest_boundary(
+    subsite, output_dir, evid, until_id="", since="", stop_at_saved=False, store=None
+):
+    """Build the ``stop`` predicate for ``harvest_items``.
+
+    The boundary is the document ``until_id``, the first document dated
+    before ``since`` (YYYY-MM-DD), or, with ``stop_at_saved``, the first
+    document already saved in ``output_dir`` or ``store``.
+    """
+    entries = saved_entries(output_dir) if stop_at_saved and store is None else None
+
+    def reached(item):
+        if until_id and item["doc_id"] == until_id:
+            return True
+        verdict_date = item.get("verdict_date")
+        if since and verdict_date and verdict_date < since:
+            return True
+        if not stop_at_saved:
+            return False
+        if store is not None:
+            return store.contains(item["doc_id"], subsite)
+        return is_saved(item["doc_id"], subsite, output_dir, entries, evid)
+
+    return reached
@@ -0,0 +1,59 @@
+import json
+import sys
+import urllib.parse
+from dataclasses import dataclass
+
+_FIELDS = ("doc_id", "title", "description", "verdict_date", "rss_link")
+
+
+@dataclass(frozen=True, slots=True)
+class RssItem:
+    """One feed item, kept compact for catalog-scale feeds.
+
+    The link is stored as an interned prefix shared by every item of the
+    feed (e.g. ``http://hudoc.echr.coe.int/eng#``) plus the raw fragment;
+    the fragment's JSON is only decoded on request. Items also support the
+    read-only mapping access (``item["doc_id"]``, ``item.get(...)``) of the
+    dicts they replace.
+    """
+
+    doc_id: str
+    title: str
+    description: str
+    verdict_date: str | None
+    link_prefix: str
+    link_fragment: str
+
+    @classmethod
+    def from_link(cls, doc_id, title, description, verdict_date, link):
+        prefix, sep, fragment = link.partition("#")
+        return cls(
+            doc_id,
+            title,
+            description,
+            sys.intern(verdict_date) if verdict_date else verdict_date,
+            sys.intern(prefix + sep),
+            fragment,
+        )
+
+    @property
+    def rss_link(self):
+        return self.link_prefix + self.link_fragment
+
+    def link_data(self):
+        """Decode the JSON in the link fragment."""
+        return json.loads(urllib.parse.unquote(self.link_fragment))
+
+    def __getitem__(self, key):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in _FIELDS else default
+
+    def keys(self):
+        return _FIELDS
+
+    def to_dict(self):
+        return {key: self[key] for key in _FIELDS}
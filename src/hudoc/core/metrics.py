@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from contextlib import contextmanager
+
+# Counters, exported with a _total suffix
+COUNTERS = {
+    "rss_items": "Items parsed from feeds",
+    "rss_parse_seconds": "Time spent parsing feeds",
+    "bytes_downloaded": "Bytes of converted document HTML downloaded",
+    "conversion_triggers": "Conversion triggers sent",
+    "retries": "Document fetch attempts after the first",
+    "skipped": "Documents skipped because they were already saved",
+    "failures": "Documents that could not be retrieved",
+    "documents": "Documents saved",
+    "unchanged": "Documents downloaded again whose text had not changed",
+    "revisions": "Documents saved as a new version of a changed text",
+    "duplicates": "Documents saved as a reference to another with the same text",
+}
+# Gauges, for what is going on right now
+GAUGES = {
+    "in_flight": "Documents being downloaded",
+    "waiting_conversion": "Documents waiting for a triggered conversion",
+    "feeds_reading": "Feeds still being read",
+}
+HISTOGRAMS = {
+    "fetch_seconds": "Latency of document fetches",
+    "conversion_wait_seconds": "Time waited for a conversion before the next attempt",
+    "extract_cpu_seconds": "CPU time spent extracting text from a document",
+    "write_seconds": "Time spent writing a document",
+}
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_FORMATS = ["prometheus", "json"]
+PREFIX = "hudoc_"
+
+
+def subsite_label(url):
+    """Subsite of a HUDOC URL for labelling, e.g. 'echr', or the host name."""
+    host = urllib.parse.urlsplit(url).hostname or ""
+    parts = host.split(".")
+    return parts[1] if len(parts) >= 3 and parts[0] == "hudoc" else host
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms labelled by subsite."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def inc(self, name, subsite, amount=1):
+        if name not in COUNTERS:
+            raise KeyError(f"Unknown counter: {name}")
+        key = (name, subsite)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add(self, name, subsite, amount):
+        """Move a gauge up or down by ``amount``."""
+        if name not in GAUGES:
+            raise KeyError(f"Unknown gauge: {name}")
+        key = (name, subsite)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, subsite, value):
+        if name not in HISTOGRAMS:
+            raise KeyError(f"Unknown histogram: {name}")
+        key = (name, subsite)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def value(self, name, subsite):
+        """Value of a counter or gauge, or the observation count of a histogram."""
+        with self._lock:
+            if name in HISTOGRAMS:
+                return self._histograms.get((name, subsite), {}).get("count", 0)
+            if name in GAUGES:
+                return self._gauges.get((name, subsite), 0)
+            return self._counters.get((name, subsite), 0)
+
+    def total(self, name):
+        """Sum of a counter or gauge over all subsites."""
+        values = self._gauges if name in GAUGES else self._counters
+        with self._lock:
+            return sum(v for (n, _), v in values.items() if n == name)
+
+    def to_json(self):
+        with self._lock:
+            counters = {}
+            for (name, subsite), value in sorted(self._counters.items()):
+                counters.setdefault(name, {})[subsite] = value
+            gauges = {}
+            for (name, subsite), value in sorted(self._gauges.items()):
+                gauges.setdefault(name, {})[subsite] = value
+            histograms = {}
+            for (name, subsite), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(name, {})[subsite] = {
+                    "buckets": dict(zip(map(str, BUCKETS), histogram["buckets"])),
+                    "sum": histogram["sum"],
+                    "count": histogram["count"],
+                }
+        return json.dumps(
+            {"counters": counters, "gauges": gauges, "histograms": histograms},
+            indent=2,
+            sort_keys=True,
+        )
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, dict(h, buckets=list(h["buckets"])))
+                for key, h in self._histograms.items()
+            )
+        described = set()
+        for (name, subsite), value in counters:
+            metric = f"{PREFIX}{name}_total"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {COUNTERS[name]}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f'{metric}{{subsite="{subsite}"}} {value}')
+        for (name, subsite), value in gauges:
+            metric = f"{PREFIX}{name}"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {GAUGES[name]}")
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f'{metric}{{subsite="{subsite}"}} {value}')
+        for (name, subsite), histogram in histograms:
+            metric = f"{PREFIX}{name}"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {HISTOGRAMS[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+            bounds = [*map(str, BUCKETS), "+Inf"]
+            counts = [*histogram["buckets"], histogram["count"]]
+            for bound, count in zip(bounds, counts):
+                lines.append(
+                    f'{metric}_bucket{{subsite="{subsite}",le="{bound}"}} {count}'
+                )
+            label = f'{{subsite="{subsite}"}}'
+            lines.append(f"{metric}_sum{label} {histogram['sum']}")
+            lines.append(f"{metric}_count{label} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt="prometheus"):
+        """Write the metrics atomically, e.g. for the node exporter textfile collector."""
+        content = self.to_json() if fmt == "json" else self.to_prometheus()
+        partial = f"{path}.part"
+        try:
+            with open(partial, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(partial, path)
+        except OSError as e:
+            logging.warning(f"Failed to write metrics to {path}: {str(e)}")
+
+
+# Shared by all workers of a run
+metrics = Metrics()
+
+
+@contextmanager
+def export_metrics(path, fmt="prometheus", interval=0.0):
+    """Write ``metrics`` to ``path`` every ``interval`` seconds and on exit.
+
+    Does nothing without a path; an interval of 0 writes only on exit.
+    """
+    if not path:
+        yield
+        return
+    stop = threading.Event()
+
+    def write_periodically():
+        while not stop.wait(interval):
+            metrics.write(path, fmt)
+
+    writer = None
+    if interval > 0:
+        writer = threading.Thread(
+            target=write_periodically, name="hudoc-metrics", daemon=True
+        )
+        writer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if writer is not None:
+            writer.join()
+        metrics.write(path, fmt)
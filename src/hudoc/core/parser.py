@@ -1,84 +1,165 @@
+import itertools
 import json
 import logging
+import re
+import tempfile
+import threading
+import time
 import urllib.parse
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from email.utils import parsedate_to_datetime
-import requests
+from json.decoder import scanstring
+
 from .constants import SUBSITE_CONFIG, VALID_SUBSITES
+from .items import RssItem
+from .metrics import metrics
 
+# Feed bodies up to this size are spooled in memory, larger ones on disk
+SPOOL_SIZE = 8 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+
+def _text(elem, tag, default=None):
+    child = elem.find(tag)
+    return child.text if child is not None else default
+
+
+def detect_subsite(link):
+    """Extract the subsite from an item URL, e.g. 'echr' from 'hudoc.echr.coe.int'."""
+    parsed_url = urllib.parse.urlparse(link)
+    host_parts = parsed_url.hostname.split(".")
+    if len(host_parts) >= 3 and host_parts[1] in VALID_SUBSITES:
+        return host_parts[1]
+    raise ValueError(f"Invalid or unrecognized subsite in URL: {link}")
+
+
+def _link_id(fragment, id_key):
+    """First id under ``id_key`` in a decoded link fragment.
+
+    The usual ``{"itemid":["001-..."]}`` shape is scanned for the id
+    without decoding the whole JSON, which ``RssItem.link_data`` does on
+    request; anything else goes through a full decode, so malformed links
+    fail as before.
+    """
+    match = re.search(rf'"{re.escape(id_key)}"\s*:\s*\[\s*"', fragment)
+    if match is None or not (fragment.startswith("{") and fragment.endswith("}")):
+        return json.loads(fragment).get(id_key, [None])[0]
+    return scanstring(fragment, match.end())[0]
+
+
+def _parse_item(item, id_key):
+    """Build an ``RssItem`` from an <item> element, or None if it is unusable."""
+    link = _text(item, "link")
+    if not link:
+        logging.warning("Item has no link; skipping")
+        return None
+
+    title = _text(item, "title", "Untitled")
+    description = _text(item, "description", "No description")
+
+    pub_date_text = _text(item, "pubDate")
+    verdict_date = None
+    if pub_date_text:
+        try:
+            pub_date = parsedate_to_datetime(pub_date_text)
+            verdict_date = pub_date.strftime("%Y-%m-%d")
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Failed to parse pubDate: {str(e)}")
 
-def parse_rss_file(rss_file):
-    """Parse RSS file and detect subsite from URLs."""
     try:
-        tree = ET.parse(rss_file)
-        root = tree.getroot()
-        items = root.findall(".//item")
-        if not items:
-            logging.warning("No items found in RSS file")
-            return None, []  # subsite, items
-
-        # Detect subsite from the first item's link
-        link_elem = items[0].find("link")
-        first_link = link_elem.text if link_elem is not None else None
-        if first_link:
-            # Extract subsite from URL, e.g., 'echr' from 'hudoc.echr.coe.int'
-            parsed_url = urllib.parse.urlparse(first_link)
-            host_parts = parsed_url.hostname.split(".")
-            if len(host_parts) >= 3 and host_parts[1] in VALID_SUBSITES:
-                subsite = host_parts[1]  # e.g., 'echr'
-            else:
-                raise ValueError(
-                    f"Invalid or unrecognized subsite in URL: {first_link}"
-                )
-            id_key = SUBSITE_CONFIG[subsite]["id_key"]
-        else:
-            raise ValueError("First item has no link to detect subsite")
-
-        parsed_items = []
-        for item in items:
-            link_elem = item.find("link")
-            link = link_elem.text if link_elem is not None else None
-            if not link:
-                logging.warning("Item has no link; skipping")
-                continue
+        fragment = link.split("#")[1]
+        fragment = urllib.parse.unquote(fragment)
+        doc_id = _link_id(fragment, id_key)  # Use detected id_key
+    except (IndexError, json.JSONDecodeError, KeyError, ValueError) as e:
+        logging.warning(f"Failed to parse item from link {link}: {str(e)}")
+        return None
+    if not doc_id:
+        return None
+    return RssItem.from_link(doc_id, title, description, verdict_date, link)
 
-            title_elem = item.find("title")
-            title = title_elem.text if title_elem is not None else "Untitled"
-
-            description_elem = item.find("description")
-            description = (
-                description_elem.text
-                if description_elem is not None
-                else "No description"
-            )
-
-            pub_date_elem = item.find("pubDate")
-            verdict_date = None
-            if pub_date_elem is not None and pub_date_elem.text:
-                try:
-                    pub_date = parsedate_to_datetime(pub_date_elem.text)
-                    verdict_date = pub_date.strftime("%Y-%m-%d")
-                except (ValueError, TypeError) as e:
-                    logging.warning(f"Failed to parse pubDate: {str(e)}")
 
-            try:
-                fragment = link.split("#")[1]
-                fragment = urllib.parse.unquote(fragment)
-                data = json.loads(fragment)
-                doc_id = data.get(id_key, [None])[0]  # Use detected id_key
-                if doc_id:
-                    parsed_items.append(
-                        {
-                            "doc_id": doc_id,
-                            "title": title,
-                            "description": description,
-                            "verdict_date": verdict_date,
-                            "rss_link": link,
-                        }
-                    )
-            except (IndexError, json.JSONDecodeError, KeyError, ValueError) as e:
-                logging.warning(f"Failed to parse item from link {link}: {str(e)}")
+def _iter_item_elements(source):
+    """Yield <item> elements as they close, discarding each once consumed."""
+    open_elements = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if elem.tag == "item":
+            yield elem
+            elem.clear()
+            if open_elements:
+                open_elements[-1].remove(elem)
+
+
+def stream_rss_items(source, limit=0):
+    """Start streaming items from an RSS file object or path.
+
+    Returns ``(subsite, items)`` where ``items`` is a generator that stops
+    reading the source once ``limit`` items (0 for all) have been yielded.
+    The subsite is detected from the first item, so ``(None, empty)`` means
+    the feed has no items.
+    """
+    elements = _iter_item_elements(source)
+    first = next(elements, None)
+    if first is None:
+        return None, iter(())
+
+    first_link = _text(first, "link")
+    if not first_link:
+        raise ValueError("First item has no link to detect subsite")
+    subsite = detect_subsite(first_link)
+    id_key = SUBSITE_CONFIG[subsite]["id_key"]
+
+    def items():
+        # Parse time excludes the time the consumer spends between items
+        count = 0
+        started = time.perf_counter()
+        for elem in itertools.chain([first], elements):
+            item = _parse_item(elem, id_key)
+            if item is None:
                 continue
+            metrics.inc("rss_parse_seconds", subsite, time.perf_counter() - started)
+            metrics.inc("rss_items", subsite)
+            yield item
+            started = time.perf_counter()
+            count += 1
+            if limit and count >= limit:
+                break
+        elements.close()
+
+    return subsite, items()
+
+
+def parse_rss_page(source, subsite):
+    """Parse one feed page of a known subsite.
+
+    Returns the usable items and the number of <item> elements on the page,
+    which also counts the items that were dropped as malformed.
+    """
+    id_key = SUBSITE_CONFIG[subsite]["id_key"]
+    items = []
+    count = 0
+    for elem in _iter_item_elements(source):
+        count += 1
+        item = _parse_item(elem, id_key)
+        if item is not None:
+            items.append(item)
+    metrics.inc("rss_items", subsite, len(items))
+    return items, count
+
+
+def parse_rss_file(rss_file, limit=0):
+    """Parse RSS file and detect subsite from URLs."""
+    try:
+        with open(rss_file, "rb") as f:
+            subsite, items = stream_rss_items(f, limit)
+            if subsite is None:
+                logging.warning("No items found in RSS file")
+                return None, []  # subsite, items
+            parsed_items = list(items)
 
         logging.info(
             f"Parsed {len(parsed_items)} items from RSS file for subsite {subsite}"
@@ -95,77 +176,22 @@ def parse_rss_file(rss_file):
         return None, []
 
 
-def parse_rss_url(url):
+def parse_rss_url(url, limit=0):
     """Fetch RSS from a URL and detect subsite from item links."""
-    try:
-        resp = requests.get(url, timeout=30)
-        resp.raise_for_status()
-        root = ET.fromstring(resp.content)
-        items = root.findall(".//item")
-        if not items:
-            logging.warning("No items found in RSS feed")
-            return None, []
-
-        link_elem = items[0].find("link")
-        first_link = link_elem.text if link_elem is not None else None
-        if first_link:
-            parsed_url = urllib.parse.urlparse(first_link)
-            host_parts = parsed_url.hostname.split(".")
-            if len(host_parts) >= 3 and host_parts[1] in VALID_SUBSITES:
-                subsite = host_parts[1]
-            else:
-                raise ValueError(
-                    f"Invalid or unrecognized subsite in URL: {first_link}"
-                )
-            id_key = SUBSITE_CONFIG[subsite]["id_key"]
-        else:
-            raise ValueError("First item has no link to detect subsite")
-
-        parsed_items = []
-        for item in items:
-            link_elem = item.find("link")
-            link = link_elem.text if link_elem is not None else None
-            if not link:
-                logging.warning("Item has no link; skipping")
-                continue
+    # Imported here so reading local feed files does not load requests
+    import requests
 
-            title_elem = item.find("title")
-            title = title_elem.text if title_elem is not None else "Untitled"
-
-            description_elem = item.find("description")
-            description = (
-                description_elem.text
-                if description_elem is not None
-                else "No description"
-            )
-
-            pub_date_elem = item.find("pubDate")
-            verdict_date = None
-            if pub_date_elem is not None and pub_date_elem.text:
-                try:
-                    pub_date = parsedate_to_datetime(pub_date_elem.text)
-                    verdict_date = pub_date.strftime("%Y-%m-%d")
-                except (ValueError, TypeError) as e:
-                    logging.warning(f"Failed to parse pubDate: {str(e)}")
+    from .session import get_session
 
-            try:
-                fragment = link.split("#")[1]
-                fragment = urllib.parse.unquote(fragment)
-                data = json.loads(fragment)
-                doc_id = data.get(id_key, [None])[0]
-                if doc_id:
-                    parsed_items.append(
-                        {
-                            "doc_id": doc_id,
-                            "title": title,
-                            "description": description,
-                            "verdict_date": verdict_date,
-                            "rss_link": link,
-                        }
-                    )
-            except (IndexError, json.JSONDecodeError, KeyError, ValueError) as e:
-                logging.warning(f"Failed to parse item from link {link}: {str(e)}")
-                continue
+    try:
+        with get_session(url).get(url, timeout=30, stream=True) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            subsite, items = stream_rss_items(resp.raw, limit)
+            if subsite is None:
+                logging.warning("No items found in RSS feed")
+                return None, []
+            parsed_items = list(items)
 
         logging.info(
             f"Parsed {len(parsed_items)} items from RSS feed for subsite {subsite}"
@@ -180,3 +206,147 @@ def parse_rss_url(url):
     except Exception as e:
         logging.error(f"Error fetching RSS from {url}: {str(e)}")
         return None, []
+
+
+class _FeedSpool:
+    """File object over a response body that a thread copies off the socket.
+
+    The copy runs ahead of the parser into a temporary file, so a consumer
+    that stops reading items while its downloads catch up never leaves the
+    connection idle, yet items are parsed as soon as their bytes arrive. A
+    failed transfer is raised from ``read`` once the bytes before it are
+    consumed; ``close`` stops the copy, e.g. at the item limit.
+    """
+
+    def __init__(self, resp):
+        self._file = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        self._written = 0
+        self._position = 0
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        threading.Thread(
+            target=self._copy, args=(resp,), name="hudoc-feed", daemon=True
+        ).start()
+
+    def _copy(self, resp):
+        error = None
+        try:
+            for chunk in resp.iter_content(_CHUNK_SIZE):
+                with self._condition:
+                    if self._closed:
+                        return
+                    self._file.seek(self._written)
+                    self._file.write(chunk)
+                    self._written += len(chunk)
+                    self._condition.notify_all()
+        except Exception as e:
+            error = e
+        finally:
+            with self._condition:
+                self._error = error
+                self._done = True
+                self._condition.notify_all()
+
+    def read(self, size=-1):
+        with self._condition:
+            while not self._done and (size < 0 or self._position >= self._written):
+                self._condition.wait()
+            available = self._written - self._position
+            if not available and self._error is not None:
+                raise self._error
+            self._file.seek(self._position)
+            data = self._file.read(available if size < 0 else min(size, available))
+            self._position += len(data)
+            return data
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _guard_stream(items, message):
+    """Stop a lazy item stream on malformed XML instead of raising mid-run."""
+    try:
+        yield from items
+    except ET.ParseError as e:
+        logging.error(f"{message}: {str(e)}")
+
+
+@contextmanager
+def open_rss_file(rss_file, limit=0):
+    """Open an RSS file for pipelined processing.
+
+    Yields ``(subsite, items)`` where ``items`` is read lazily from the file
+    while the caller consumes it. ``subsite`` is None if the feed has no
+    items or cannot be parsed.
+    """
+    subsite, items = None, iter(())
+    try:
+        f = open(rss_file, "rb")
+    except FileNotFoundError:
+        logging.error(f"RSS file not found: {rss_file}")
+        yield subsite, items
+        return
+    with f:
+        try:
+            subsite, items = stream_rss_items(f, limit)
+            if subsite is None:
+                logging.warning("No items found in RSS file")
+            items = _guard_stream(items, "Failed to parse RSS file")
+        except ET.ParseError as e:
+            logging.error(f"Failed to parse RSS file: {str(e)}")
+        except Exception as e:
+            logging.error(f"Error parsing RSS file: {str(e)}")
+        yield subsite, items
+
+
+@contextmanager
+def open_rss_url(url, limit=0):
+    """Stream an RSS feed from a URL for pipelined processing.
+
+    Like ``open_rss_file``, items are parsed from the response body while
+    the caller consumes them. The body is spooled off the socket as it
+    arrives (see ``_FeedSpool``), so a caller that pauses cannot stall the
+    connection into a server timeout; a transfer that fails midway raises
+    from ``items`` instead of ending the feed early.
+    """
+    import requests
+
+    from .session import get_session
+
+    subsite, items = None, iter(())
+    try:
+        resp = get_session(url).get(url, timeout=30, stream=True)
+    except requests.RequestException as e:
+        logging.error(f"Failed to fetch RSS from {url}: {str(e)}")
+        yield subsite, items
+        return
+    with resp:
+        try:
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            logging.error(f"Failed to fetch RSS from {url}: {str(e)}")
+            yield subsite, items
+            return
+        with _FeedSpool(resp) as body:
+            try:
+                subsite, items = stream_rss_items(body, limit)
+                if subsite is None:
+                    logging.warning("No items found in RSS feed")
+                items = _guard_stream(items, f"Failed to parse RSS from {url}")
+            except requests.RequestException as e:
+                logging.error(f"Failed to fetch RSS from {url}: {str(e)}")
+            except ET.ParseError as e:
+                logging.error(f"Failed to parse RSS from {url}: {str(e)}")
+            except Exception as e:
+                logging.error(f"Error fetching RSS from {url}: {str(e)}")
+            yield subsite, items
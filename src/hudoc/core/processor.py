@@ -1,57 +1,498 @@
+import itertools
 import logging
-from concurrent.futures import ThreadPoolExecutor
-
-from .downloader import download_document
-from .parser import parse_rss_file, parse_rss_url
-
-
-def _run_downloads(subsite, items, output_dir, limit, threads, conversion_delay, evid):
-    num_items = len(items)
-    if limit == 0:
-        limit = num_items
-    else:
-        limit = min(limit, num_items)
-    items = items[:limit]
-    logging.info(f"Processing {limit} of {num_items} items for subsite {subsite}")
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [
-            executor.submit(
-                download_document,
-                item,
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..utils import is_saved, saved_entries
+from .async_engine import run_async_downloads
+from .constants import SUBSITE_CONFIG
+from .cpu import close_cpu_pool
+from .downloader import download_steps, record_failure
+from .metrics import metrics
+from .harvest import (
+    DEFAULT_PAGE_WORKERS,
+    HarvestError,
+    harvest_boundary,
+    open_harvest,
+)
+from .parser import open_rss_file, open_rss_url
+from .scheduler import IN_FLIGHT_PER_WORKER, DelayQueue, run_window
+from .session import configure_pool
+
+
+def _pending_items(subsite, items, output_dir, limit, evid, store=None, versions=None):
+    """Lazily apply the limit and drop documents already saved in output_dir.
+
+    With a ``store``, documents already in the store are dropped instead.
+    Nothing is dropped when a content index rechecks saved documents.
+    """
+    recheck = versions is not None and versions.recheck
+    entries = saved_entries(output_dir) if store is None and not recheck else None
+    read = skipped = 0
+    metrics.add("feeds_reading", subsite, 1)
+    try:
+        for item in itertools.islice(items, limit or None):
+            read += 1
+            if recheck:
+                yield item
+                continue
+            if (
+                store.contains(item["doc_id"], subsite)
+                if store is not None
+                else is_saved(item["doc_id"], subsite, output_dir, entries, evid)
+            ):
+                skipped += 1
+                metrics.inc("skipped", subsite)
+                continue
+            yield item
+    finally:
+        metrics.add("feeds_reading", subsite, -1)
+    if not read:
+        logging.error("No items to process")
+    elif skipped:
+        logging.info(f"Skipped {skipped} documents already saved")
+
+
+def _run_downloads(
+    subsite,
+    items,
+    output_dir,
+    limit,
+    threads,
+    conversion_delay,
+    evid,
+    engine="thread",
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    """Download items as they are produced; ``items`` may be a lazy feed stream.
+
+    Documents waiting for conversion are parked in a delay queue instead of
+    holding a worker, so workers stay busy with documents that are ready. At
+    most ``IN_FLIGHT_PER_WORKER`` documents per worker are in flight; the
+    feed is read further as they finish, and a failed document is logged
+    without stopping the others.
+    """
+    logging.info(
+        f"Processing {limit or 'all'} items for subsite {subsite} ({engine} engine)"
+    )
+    items = _pending_items(subsite, items, output_dir, limit, evid, store, versions)
+    try:
+        if engine == "async":
+            run_async_downloads(
                 subsite,
+                items,
                 output_dir,
+                threads,
                 conversion_delay,
-                evid=evid,
+                evid,
+                cache,
+                latency,
+                store,
+                versions,
+            )
+            return
+        configure_pool(threads)
+        with (
+            ThreadPoolExecutor(max_workers=threads) as executor,
+            DelayQueue(executor) as delays,
+        ):
+            jobs = (
+                (
+                    item,
+                    download_steps(
+                        item,
+                        subsite,
+                        output_dir,
+                        conversion_delay,
+                        evid=evid,
+                        cache=cache,
+                        latency=latency,
+                        store=store,
+                        versions=versions,
+                    ),
+                )
+                for item in items
             )
-            for item in items
-        ]
-        for future in futures:
-            future.result()
+            window = threads * IN_FLIGHT_PER_WORKER
+            for item, future in run_window(executor, delays, jobs, window):
+                if future.exception() is not None:
+                    record_failure(item, subsite, future.exception())
+    finally:
+        close_cpu_pool()
+        if cache is not None and not cache.offline:
+            cache.evict()
+        if latency is not None:
+            latency.save()
 
 
 def process_rss(
-    rss_file, output_dir, limit=3, threads=10, conversion_delay=2.0, evid=False
-):
-    """Process RSS file, detect subsite, and download documents in parallel."""
-    subsite, items = parse_rss_file(rss_file)
-    if not subsite:
-        logging.error("Failed to detect subsite or parse items")
-        return
-    if not items:
-        logging.error("No items to process")
-        return
-    _run_downloads(subsite, items, output_dir, limit, threads, conversion_delay, evid)
+    rss_file,
+    output_dir,
+    limit=3,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    engine="thread",
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    """Process RSS file, detect subsite, and download documents in parallel.
+
+    Downloads start as soon as the first items are parsed, while the rest of
+    the file is still being read.
+    """
+    with open_rss_file(rss_file, limit) as (subsite, items):
+        if not subsite:
+            logging.error("Failed to detect subsite or parse items")
+            return
+        _run_downloads(
+            subsite,
+            items,
+            output_dir,
+            limit,
+            threads,
+            conversion_delay,
+            evid,
+            engine,
+            cache,
+            latency,
+            store,
+            versions,
+        )
 
 
 def process_rss_url(
-    url, output_dir, limit=3, threads=10, conversion_delay=2.0, evid=False
-):
-    """Fetch RSS from URL, detect subsite, and download documents in parallel."""
-    subsite, items = parse_rss_url(url)
-    if not subsite:
-        logging.error("Failed to detect subsite or parse items")
-        return
-    if not items:
-        logging.error("No items to process")
-        return
-    _run_downloads(subsite, items, output_dir, limit, threads, conversion_delay, evid)
+    url,
+    output_dir,
+    limit=3,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    engine="thread",
+    cache=None,
+    latency=None,
+    store=None,
+    versions=None,
+):
+    """Fetch RSS from URL, detect subsite, and download documents in parallel.
+
+    The feed is parsed from the response stream and each item is submitted
+    for download as soon as it is read.
+    """
+    with open_rss_url(url, limit) as (subsite, items):
+        if not subsite:
+            logging.error("Failed to detect subsite or parse items")
+            return
+        _run_downloads(
+            subsite,
+            items,
+            output_dir,
+            limit,
+            threads,
+            conversion_delay,
+            evid,
+            engine,
+            cache,
+            latency,
+            store,
+            versions,
+        )
+
+
+def process_harvest(
+    subsite,
+    output_dir,
+    limit=0,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    engine="thread",
+    cache=None,
+    latency=None,
+    until_id="",
+    since="",
+    stop_at_saved=False,
+    page_workers=DEFAULT_PAGE_WORKERS,
+    store=None,
+    versions=None,
+):
+    """Walk the paginated feed of a subsite and download its documents.
+
+    Items are streamed from the feed pages into the downloads, stopping at
+    the boundary given by ``until_id``, ``since`` or ``stop_at_saved``. A
+    feed page that cannot be fetched raises ``HarvestError``.
+    """
+    stop = harvest_boundary(
+        subsite, output_dir, evid, until_id, since, stop_at_saved, store
+    )
+    with open_harvest(subsite, stop, page_workers) as (subsite, items):
+        _run_downloads(
+            subsite,
+            items,
+            output_dir,
+            limit,
+            threads,
+            conversion_delay,
+            evid,
+            engine,
+            cache,
+            latency,
+            store,
+            versions,
+        )
+
+
+def _feed_subsite(
+    subsite,
+    open_feed,
+    executor,
+    delays,
+    per_host,
+    output_dir,
+    limit,
+    conversion_delay,
+    evid,
+    cache,
+    latency,
+    store=None,
+    versions=None,
+):
+    """Read one subsite's feed and download its documents in the shared pool.
+
+    Returns once every submitted document has finished.
+    """
+    with open_feed(subsite) as (detected, items):
+        if not detected:
+            logging.error(f"Failed to detect subsite or parse items for {subsite}")
+            return
+        logging.info(f"Processing {limit or 'all'} items for subsite {subsite}")
+        pending = _pending_items(
+            subsite, items, output_dir, limit, evid, store, versions
+        )
+        jobs = (
+            (
+                item,
+                download_steps(
+                    item,
+                    subsite,
+                    output_dir,
+                    conversion_delay,
+                    evid=evid,
+                    cache=cache,
+                    latency=latency,
+                    store=store,
+                    versions=versions,
+                ),
+            )
+            for item in pending
+        )
+        for item, future in run_window(executor, delays, jobs, per_host):
+            if future.exception() is not None:
+                record_failure(item, subsite, future.exception())
+
+
+def _run_subsites(
+    subsites,
+    open_feed,
+    output_dir,
+    limit,
+    threads,
+    conversion_delay,
+    evid,
+    cache=None,
+    latency=None,
+    per_host=0,
+    store=None,
+    versions=None,
+):
+    """Download from several subsites at once under one budget of ``threads`` workers.
+
+    Every subsite has a feeder thread that reads its feed and submits
+    documents to the shared pool while fewer than ``per_host`` of them are
+    in flight, so the pool queue interleaves the subsites and no single host
+    can take all workers. ``per_host`` defaults to twice the fair share.
+    Returns the subsites whose feed failed.
+    """
+    per_host = per_host or min(threads, math.ceil(2 * threads / len(subsites)))
+    logging.info(
+        f"Processing {len(subsites)} subsites with {threads} workers, "
+        f"at most {per_host} documents in flight per subsite"
+    )
+    configure_pool(threads)
+    failed = []
+    try:
+        with (
+            ThreadPoolExecutor(max_workers=threads) as executor,
+            DelayQueue(executor) as delays,
+            ThreadPoolExecutor(max_workers=len(subsites)) as feeders,
+        ):
+            feeds = {
+                feeders.submit(
+                    _feed_subsite,
+                    subsite,
+                    open_feed,
+                    executor,
+                    delays,
+                    per_host,
+                    output_dir,
+                    limit,
+                    conversion_delay,
+                    evid,
+                    cache,
+                    latency,
+                    store,
+                    versions,
+                ): subsite
+                for subsite in subsites
+            }
+            for feed in as_completed(feeds):
+                if feed.exception() is not None:
+                    failed.append(feeds[feed])
+                    logging.error(
+                        f"Failed to download from {feeds[feed]}: {str(feed.exception())}"
+                    )
+    finally:
+        close_cpu_pool()
+        if cache is not None and not cache.offline:
+            cache.evict()
+        if latency is not None:
+            latency.save()
+    return failed
+
+
+def process_subsites_latest(
+    subsites,
+    output_dir,
+    limit=3,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    cache=None,
+    latency=None,
+    per_host=0,
+    store=None,
+    versions=None,
+):
+    """Fetch the latest feeds of several subsites concurrently and download them."""
+
+    def open_feed(subsite):
+        return open_rss_url(SUBSITE_CONFIG[subsite]["rss_url"], limit)
+
+    _run_subsites(
+        subsites,
+        open_feed,
+        output_dir,
+        limit,
+        threads,
+        conversion_delay,
+        evid,
+        cache,
+        latency,
+        per_host,
+        store,
+        versions,
+    )
+
+
+def process_subsites_harvest(
+    subsites,
+    output_dir,
+    limit=0,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    cache=None,
+    latency=None,
+    per_host=0,
+    until_id="",
+    since="",
+    stop_at_saved=False,
+    page_workers=DEFAULT_PAGE_WORKERS,
+    store=None,
+    versions=None,
+):
+    """Harvest the paginated feeds of several subsites concurrently.
+
+    Raises ``HarvestError`` once the downloads are done if a feed could not
+    be read to the end.
+    """
+
+    def open_feed(subsite):
+        stop = harvest_boundary(
+            subsite, output_dir, evid, until_id, since, stop_at_saved, store
+        )
+        return open_harvest(subsite, stop, page_workers)
+
+    failed = _run_subsites(
+        subsites,
+        open_feed,
+        output_dir,
+        limit,
+        threads,
+        conversion_delay,
+        evid,
+        cache,
+        latency,
+        per_host,
+        store,
+        versions,
+    )
+    if failed:
+        raise HarvestError(f"Harvest of {', '.join(failed)} is incomplete")
+
+
+def process_sync(
+    subsites,
+    output_dir,
+    state,
+    threads=10,
+    conversion_delay=2.0,
+    evid=False,
+    cache=None,
+    latency=None,
+    per_host=0,
+    since="",
+    page_workers=DEFAULT_PAGE_WORKERS,
+    store=None,
+    versions=None,
+):
+    """Download the documents published since the last sync of each subsite.
+
+    Each feed is read only down to the subsite's mark in ``state`` (see
+    ``SyncState``). Once the downloads are done, the marks move over the
+    saved documents and ``state`` is saved; then ``HarvestError`` is raised
+    if a feed could not be read to the end.
+    """
+    failed = _run_subsites(
+        subsites,
+        lambda subsite: state.open_feed(subsite, since, page_workers),
+        output_dir,
+        0,
+        threads,
+        conversion_delay,
+        evid,
+        cache,
+        latency,
+        per_host,
+        store,
+        versions,
+    )
+    if store is not None:
+        store.flush()
+    entries = saved_entries(output_dir)
+    for subsite in subsites:
+
+        def saved(doc_id):
+            if store is not None:
+                return store.contains(doc_id, subsite)
+            return is_saved(doc_id, subsite, output_dir, entries, evid)
+
+        state.advance(subsite, saved)
+    state.save()
+    if failed:
+        raise HarvestError(f"Sync of {', '.join(failed)} is incomplete")
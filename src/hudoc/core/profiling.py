@@ -0,0 +1,112 @@
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds between stack samples of all threads
+SAMPLE_INTERVAL = 0.01
+# A new tracemalloc snapshot is taken when traced memory grows this much
+# beyond the last snapshot
+PEAK_GROWTH = 1.1
+
+
+def _where(frame):
+    code = frame.f_code
+    return f"{code.co_filename}:{frame.f_lineno}({code.co_name})"
+
+
+class _Sampler(threading.Thread):
+    """Samples every thread's stack to attribute run time to threads.
+
+    cProfile sees the calls of all threads but cannot tell them apart, so
+    the sampler counts, per thread, how often each function was running.
+    It also keeps the tracemalloc snapshot closest to the peak of traced
+    memory.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="hudoc-profiler", daemon=True)
+        self.interval = interval
+        self.samples = Counter()  # thread name -> samples
+        self.functions = {}  # thread name -> Counter of innermost frames
+        self.snapshot = None
+        self.snapshot_size = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                name = names.get(ident, str(ident))
+                self.samples[name] += 1
+                self.functions.setdefault(name, Counter())[_where(frame)] += 1
+            current, _ = tracemalloc.get_traced_memory()
+            if current > self.snapshot_size * PEAK_GROWTH:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_size = current
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _report(profiler, sampler, peak, top):
+    out = io.StringIO()
+    out.write(f"Top {top} functions by cumulative time (all threads)\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(top)
+
+    total = sum(sampler.samples.values()) or 1
+    out.write("Samples per thread (share of sampled time)\n\n")
+    for name, count in sampler.samples.most_common():
+        out.write(f"{count / total:7.1%}  {name}\n")
+        for where, hits in sampler.functions[name].most_common(5):
+            out.write(f"         {hits / count:7.1%}  {where}\n")
+
+    out.write(f"\nPeak traced memory: {peak / 2**20:.1f} MiB\n")
+    if sampler.snapshot is not None:
+        out.write(
+            f"Top {top} allocation sites at "
+            f"{sampler.snapshot_size / 2**20:.1f} MiB traced\n\n"
+        )
+        for stat in sampler.snapshot.statistics("lineno")[:top]:
+            out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+@contextmanager
+def profile_run(path, top=30):
+    """Profile the enclosed run with cProfile, a thread sampler and tracemalloc.
+
+    Writes the cProfile stats to ``path`` (for ``pstats`` or snakeviz) and a
+    text report to ``path.txt``: the ``top`` functions by cumulative time,
+    sampled time per thread with its busiest functions, and the largest
+    allocation sites near peak memory.
+    """
+    tracemalloc.start()
+    sampler = _Sampler()
+    sampler.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report_path = f"{path}.txt"
+        try:
+            profiler.dump_stats(path)
+            with open(report_path, "w", encoding="utf-8") as f:
+                f.write(_report(profiler, sampler, peak, top))
+            logging.info(f"Profile written to {path} and {report_path}")
+        except OSError as e:
+            logging.error(f"Failed to write profile to {path}: {str(e)}")
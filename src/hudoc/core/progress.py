@@ -0,0 +1,173 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import metrics
+
+# auto: a bar on a terminal, log lines otherwise
+PROGRESS_MODES = ["auto", "bar", "log", "json", "off"]
+# Seconds between redraws of the progress bar
+BAR_INTERVAL = 0.5
+BAR_WIDTH = 20
+# Counters a snapshot reports, relative to the start of the run
+_COUNTERS = ("documents", "unchanged", "failures", "skipped", "bytes_downloaded")
+
+
+def progress_snapshot(elapsed, total=0, start=None):
+    """Progress of the current run, from the shared metrics registry.
+
+    ``total`` is the number of documents the run was asked for, if known,
+    and ``start`` the counter totals when the run began. The documents still
+    to do are known once every feed has been read, or from ``total``; the
+    ETA assumes the average rate so far.
+    """
+    start = start or {}
+    counts = {name: metrics.total(name) - start.get(name, 0) for name in _COUNTERS}
+    saved = counts["documents"]
+    unchanged = counts["unchanged"]
+    failed = counts["failures"]
+    skipped = counts["skipped"]
+    in_flight = metrics.total("in_flight")
+    done = saved + unchanged + failed
+    remaining = None
+    if not metrics.total("feeds_reading"):
+        remaining = in_flight
+    elif total:
+        remaining = max(total - done - skipped, in_flight)
+    docs_per_second = done / elapsed if elapsed > 0 else 0.0
+    eta = None
+    if remaining is not None and docs_per_second:
+        eta = remaining / docs_per_second
+    return {
+        "elapsed_seconds": round(elapsed, 1),
+        "done": done,
+        "saved": saved,
+        "unchanged": unchanged,
+        "failed": failed,
+        "skipped": skipped,
+        "in_flight": in_flight,
+        "waiting_conversion": metrics.total("waiting_conversion"),
+        "remaining": remaining,
+        "docs_per_second": round(docs_per_second, 2),
+        "bytes_per_second": round(
+            counts["bytes_downloaded"] / elapsed if elapsed > 0 else 0.0
+        ),
+        "eta_seconds": None if eta is None else round(eta),
+    }
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def _size(count):
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+def format_progress(snapshot, bar=False):
+    """One line describing a progress snapshot."""
+    done, remaining = snapshot["done"], snapshot["remaining"]
+    parts = [f"{done} docs"]
+    if remaining is not None and done + remaining:
+        fraction = done / (done + remaining)
+        parts[0] = f"{done}/{done + remaining} docs ({fraction:.0%})"
+        if bar:
+            filled = round(fraction * BAR_WIDTH)
+            parts[0] = f"[{'#' * filled}{'-' * (BAR_WIDTH - filled)}] {parts[0]}"
+    parts.append(
+        f"{snapshot['docs_per_second']:.1f} docs/s, "
+        f"{_size(snapshot['bytes_per_second'])}/s"
+    )
+    parts.append(
+        f"{snapshot['in_flight']} in flight, "
+        f"{snapshot['waiting_conversion']} waiting for conversion, "
+        f"{snapshot['failed']} failed"
+    )
+    eta = snapshot["eta_seconds"]
+    parts.append(f"ETA {_duration(eta)}" if eta is not None else "ETA ?")
+    return " | ".join(parts)
+
+
+class _ClearBar(logging.Filter):
+    """Clears the bar line before a log record is written over it."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def filter(self, record):
+        self.stream.write("\r\x1b[K")
+        return True
+
+
+@contextmanager
+def report_progress(mode="auto", interval=10.0, total=0):
+    """Report the progress of the run inside the block until it ends.
+
+    ``bar`` redraws a line on stderr, ``log`` logs a line every ``interval``
+    seconds and ``json`` prints one JSON object per ``interval`` on stdout,
+    for other programs to follow. A last report is made at the end; an
+    interval of 0 reports only then.
+    """
+    if mode == "auto":
+        mode = "bar" if sys.stderr.isatty() else "log"
+    if mode == "off":
+        yield
+        return
+    started = time.monotonic()
+    start = {name: metrics.total(name) for name in _COUNTERS}
+    stop = threading.Event()
+
+    def report(final=False):
+        snapshot = progress_snapshot(time.monotonic() - started, total, start)
+        if mode == "json":
+            print(json.dumps(snapshot), flush=True)
+        elif mode == "log":
+            logging.info(f"Progress: {format_progress(snapshot)}")
+        else:
+            end = "\n" if final else ""
+            sys.stderr.write(f"\r\x1b[K{format_progress(snapshot, bar=True)}{end}")
+            sys.stderr.flush()
+
+    wait = BAR_INTERVAL if mode == "bar" else interval
+
+    def report_periodically():
+        while not stop.wait(wait):
+            report()
+
+    handlers = []
+    if mode == "bar":
+        handlers = [
+            h
+            for h in logging.getLogger().handlers
+            if getattr(h, "stream", None) is sys.stderr
+        ]
+        clear = _ClearBar(sys.stderr)
+        for handler in handlers:
+            handler.addFilter(clear)
+    reporter = None
+    if wait > 0:
+        reporter = threading.Thread(
+            target=report_periodically, name="hudoc-progress", daemon=True
+        )
+        reporter.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if reporter is not None:
+            reporter.join()
+        report(final=True)
+        for handler in handlers:
+            handler.removeFilter(clear)
@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Documents in flight per worker thread, counting those parked while they
+# wait for a conversion
+IN_FLIGHT_PER_WORKER = 4
+
+
+def advance(steps):
+    """Run a step generator to its next wait.
+
+    Returns ``(False, delay)`` when it asks to wait ``delay`` seconds, or
+    ``(True, value)`` when it has finished with ``value``.
+    """
+    try:
+        return False, next(steps)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def run_steps(steps):
+    """Drive a step generator in the calling thread, sleeping for each wait."""
+    while True:
+        done, value = advance(steps)
+        if done:
+            return value
+        time.sleep(value)
+
+
+class DelayQueue:
+    """Hands parked jobs back to an executor once their delay has elapsed.
+
+    A single timer thread holds the waiting jobs, so a document waiting for
+    conversion does not occupy a worker thread.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="hudoc-delay-queue", daemon=True
+        )
+        self._thread.start()
+
+    def call_later(self, delay, fn, *args):
+        due = time.monotonic() + delay
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._counter), fn, args))
+            self._condition.notify()
+
+    def _run(self):
+        with self._condition:
+            while True:
+                if self._closed and not self._heap:
+                    return
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due, _, fn, args = self._heap[0]
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+                self._executor.submit(fn, *args)
+
+    def close(self):
+        """Release the remaining jobs and stop the timer thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def submit_steps(executor, delays, steps):
+    """Run a step generator on ``executor``, parking it in ``delays`` while it waits.
+
+    Returns a Future that resolves to the generator's return value.
+    """
+    result = Future()
+
+    def step():
+        try:
+            done, value = advance(steps)
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        if done:
+            result.set_result(value)
+        else:
+            delays.call_later(value, step)
+
+    executor.submit(step)
+    return result
+
+
+def run_window(executor, delays, jobs, window):
+    """Run ``(key, steps)`` jobs with at most ``window`` of them in flight.
+
+    A job is taken from ``jobs``, which may be a lazy feed stream, only once
+    a slot is free, so memory grows with the window rather than the feed.
+    Yields ``(key, future)`` for every finished job in completion order.
+    """
+    finished = queue.SimpleQueue()
+    jobs = iter(jobs)
+    in_flight = 0
+    while True:
+        if in_flight >= window:
+            yield finished.get()
+            in_flight -= 1
+        job = next(jobs, None)
+        if job is None:
+            break
+        key, steps = job
+        future = submit_steps(executor, delays, steps)
+        future.add_done_callback(lambda future, key=key: finished.put((key, future)))
+        in_flight += 1
+    for _ in range(in_flight):
+        yield finished.get()
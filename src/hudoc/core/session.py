@@ -0,0 +1,112 @@
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .throttle import DEFAULT_BURST, DEFAULT_RATE, HostLimiter, parse_retry_after
+
+# One keep-alive session per HUDOC host, shared by all worker threads
+_sessions = {}
+_lock = threading.Lock()
+_pool_size = 10
+# One limiter per host; kept across pool changes so what was learned about
+# the host survives
+_limiters = {}
+_rate = DEFAULT_RATE
+_burst = DEFAULT_BURST
+
+
+class ThrottledSession(requests.Session):
+    """Session whose requests pass through the limiter of its host."""
+
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            self.limiter.release(time.monotonic() - started, error=True)
+            raise
+        except BaseException:
+            self.limiter.release()
+            raise
+        self.limiter.release(
+            time.monotonic() - started,
+            status=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+        return response
+
+
+def configure_pool(size):
+    """Set the per-host connection pool size used for new sessions.
+
+    Existing sessions are closed so the next request picks up the new size.
+    """
+    global _pool_size
+    size = max(1, int(size))
+    with _lock:
+        if size == _pool_size:
+            return
+        _pool_size = size
+        for limiter in _limiters.values():
+            limiter.configure(size)
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def configure_rate_limit(rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    """Set the request rate per host (requests per second, 0 for no limit)."""
+    global _rate, _burst
+    with _lock:
+        _rate, _burst = rate, burst
+        for limiter in _limiters.values():
+            limiter.rate, limiter.burst = rate, max(1, burst)
+
+
+def get_limiter(host):
+    """Return the limiter shared by all requests to ``host``."""
+    with _lock:
+        return _get_limiter(host)
+
+
+def _get_limiter(host):
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = HostLimiter(_rate, _burst, max_concurrency=_pool_size)
+        _limiters[host] = limiter
+    return limiter
+
+
+def _new_session(pool_size, limiter):
+    session = ThrottledSession(limiter)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url):
+    """Return the shared session for the host of ``url``."""
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _new_session(_pool_size, _get_limiter(host))
+            _sessions[host] = session
+        return session
+
+
+def close_sessions():
+    """Close all pooled sessions and their connections."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
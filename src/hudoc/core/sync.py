@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .constants import DEFAULT_PAGE_WORKERS
+from .harvest import open_harvest
+
+
+class SyncState:
+    """Per-subsite high-water marks of ``hudoc sync``.
+
+    A mark is the newest verdict date a sync has fully handled and the IDs
+    of the documents at that date it has seen, since a later run may find
+    more documents published on the same day. A sync reads the feed back to
+    the first document dated before the mark and skips the known documents
+    at the mark.
+
+    The mark only moves past documents that were saved: if a download
+    fails, the mark stays at the oldest failed document's date so the next
+    run retries it, and newer documents are then skipped as already saved.
+    It does not move when a walk ends before reaching the mark, or when a
+    feed page could not be fetched, since the documents in between were not
+    read. The first sync of a subsite has no mark and reads the feed back to
+    ``since``, or to its end.
+    """
+
+    def __init__(self, path=None, marks=None):
+        self.path = Path(path) if path else None
+        self._marks = dict(marks or {})
+        self._read = {}  # subsite -> [(verdict_date, doc_id)] read by this run
+        self._reached = set()  # subsites whose walk reached their mark
+        self._failed = set()  # subsites whose feed could not be read to the end
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Load persisted marks, starting empty if the file is unusable."""
+        try:
+            marks = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            marks = {}
+        if not isinstance(marks, dict):
+            marks = {}
+        return cls(path, marks)
+
+    def mark(self, subsite):
+        """The mark of a subsite as (verdict_date, doc_ids), or None."""
+        mark = self._marks.get(subsite)
+        if not mark:
+            return None
+        return mark["verdict_date"], set(mark["doc_ids"])
+
+    def _stop(self, subsite, since):
+        mark = self.mark(subsite)
+        floor = max(mark[0] if mark else "", since)
+
+        def reached(item):
+            verdict_date = item.get("verdict_date")
+            if floor and verdict_date and verdict_date < floor:
+                with self._lock:
+                    self._reached.add(subsite)
+                return True
+            return False
+
+        return reached
+
+    def _track(self, subsite, items):
+        """Record the items read and drop those already seen at the mark."""
+        mark = self.mark(subsite)
+        read = self._read.setdefault(subsite, [])
+        try:
+            for item in items:
+                verdict_date = item.get("verdict_date")
+                if mark and verdict_date == mark[0] and item["doc_id"] in mark[1]:
+                    continue
+                read.append((verdict_date, item["doc_id"]))
+                yield item
+        except Exception:
+            with self._lock:
+                self._failed.add(subsite)
+            raise
+
+    @contextmanager
+    def open_feed(self, subsite, since="", workers=DEFAULT_PAGE_WORKERS):
+        """Open the feed of a subsite down to its mark, like ``open_harvest``."""
+        stop = self._stop(subsite, since)
+        with open_harvest(subsite, stop, workers) as (detected, items):
+            yield detected, self._track(subsite, items)
+
+    def advance(self, subsite, saved):
+        """Move the mark of a subsite over the documents read by this run.
+
+        ``saved(doc_id)`` tells whether a document was saved.
+        """
+        read = [(d, doc_id) for d, doc_id in self._read.pop(subsite, []) if d]
+        with self._lock:
+            reached = subsite in self._reached
+            self._reached.discard(subsite)
+            failed_feed = subsite in self._failed
+            self._failed.discard(subsite)
+        mark = self.mark(subsite)
+        if failed_feed:
+            logging.warning(
+                f"The {subsite} feed could not be read to the end; "
+                "keeping its mark for the next sync"
+            )
+            return
+        if mark and not reached:
+            logging.warning(
+                f"Sync of {subsite} ended before its mark at {mark[0]}; keeping it"
+            )
+            return
+        if not read:
+            return
+        failed = [d for d, doc_id in read if not saved(doc_id)]
+        verdict_date = min(failed) if failed else max(d for d, _ in read)
+        doc_ids = {doc_id for d, doc_id in read if d == verdict_date and saved(doc_id)}
+        if mark and mark[0] == verdict_date:
+            doc_ids |= mark[1]
+        self._marks[subsite] = {
+            "verdict_date": verdict_date,
+            "doc_ids": sorted(doc_ids),
+        }
+        if failed:
+            logging.warning(
+                f"{len(failed)} {subsite} documents were not saved; "
+                f"the next sync retries from {verdict_date}"
+            )
+        logging.info(f"Synced {subsite} up to {verdict_date}")
+
+    def save(self):
+        if self.path is None:
+            return
+        content = json.dumps(self._marks, indent=2, sort_keys=True)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial = f"{self.path}.part"
+            with open(partial, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(partial, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to save sync state: {str(e)}")
@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Default request rate per host (requests per second) and burst size
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 10
+# Concurrency starts low and grows while the host keeps up
+INITIAL_CONCURRENCY = 2
+# Multiplicative decrease applied when the host signals overload
+DECREASE_FACTOR = 0.5
+# A response slower than this multiple of the fastest recent one does not
+# count as healthy for increasing concurrency
+LATENCY_TOLERANCE = 3.0
+# Longest pause honored from a Retry-After header, in seconds
+MAX_RETRY_AFTER = 300.0
+
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - (now or datetime.now(timezone.utc))).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class HostLimiter:
+    """Token bucket plus AIMD concurrency limit for requests to one host.
+
+    ``acquire`` blocks until a token is available, fewer than ``limit``
+    requests are in flight and any Retry-After pause has passed. ``release``
+    reports the outcome: healthy responses raise the limit by about one per
+    round of requests, while 429/5xx responses and timeouts halve it.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_concurrency=10,
+        initial_concurrency=INITIAL_CONCURRENCY,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(min(initial_concurrency, self.max_concurrency))
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._fastest = None
+        self._condition = threading.Condition()
+
+    def configure(self, max_concurrency):
+        with self._condition:
+            self.max_concurrency = max(1, max_concurrency)
+            self.limit = min(self.limit, self.max_concurrency)
+            self._condition.notify_all()
+
+    def _refill(self, now):
+        if self.rate <= 0:
+            self._tokens = float(self.burst)
+            return
+        elapsed = now - self._refilled_at
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._refilled_at = now
+
+    def _wait_time(self, now):
+        """Seconds until a request may start, or 0 if it can start now."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= int(self.limit):
+            return None  # until a request completes
+        self._refill(now)
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                wait = self._wait_time(time.monotonic())
+                if wait == 0:
+                    break
+                self._condition.wait(wait)
+            self._tokens -= 1
+            self.in_flight += 1
+
+    def release(self, latency=None, status=None, error=False, retry_after=None):
+        """Record the outcome of a request started with ``acquire``."""
+        now = time.monotonic()
+        with self._condition:
+            self.in_flight -= 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if error or status in OVERLOAD_STATUSES:
+                self._decrease(now, latency)
+            elif latency is not None:
+                self._increase(latency)
+            self._condition.notify_all()
+
+    def _decrease(self, now, latency):
+        # Requests in flight when the host became overloaded fail together;
+        # only those started after the last decrease may decrease again
+        if now - (latency or 0) < self._decreased_at:
+            return
+        self._decreased_at = now
+        self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+
+    def _increase(self, latency):
+        if self._fastest is None or latency < self._fastest:
+            self._fastest = latency
+        else:
+            # Let the reference drift up so one lucky response does not
+            # block increases forever
+            self._fastest *= 1.05
+        if latency <= self._fastest * LATENCY_TOLERANCE:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+
+def content_digest(text):
+    """SHA-256 of a document's extracted text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Revision:
+    """What the content index knows about a downloaded document's text.
+
+    ``status`` is "new" for a document seen for the first time, "unchanged"
+    when its text is the one last recorded and "changed" when it differs;
+    ``version`` counts the distinct texts recorded for the document.
+    ``duplicate_of`` is the (subsite, doc_id) of another document first
+    recorded with the same text, if any.
+    """
+
+    status: str
+    digest: str
+    version: int
+    duplicate_of: tuple[str, str] | None = None
+
+
+class ContentIndex:
+    """Index of document text hashes across subsites and runs.
+
+    Every distinct text recorded for a document is a new version, appended
+    as one JSON line to the index file, so identical bodies under other
+    document IDs and revised documents can be recognized in later runs.
+    With ``recheck``, documents already saved are downloaded again to look
+    for revisions.
+    """
+
+    def __init__(self, path=None, recheck=False):
+        self.path = Path(path) if path else None
+        self.recheck = recheck
+        self._latest = {}  # (subsite, doc_id) -> (digest, version)
+        self._holders = {}  # digest -> first (subsite, doc_id) with that text
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partial line of an interrupted run
+                    key = (entry["subsite"], entry["doc_id"])
+                    self._latest[key] = (entry["sha256"], entry["version"])
+                    self._holders.setdefault(entry["sha256"], key)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Failed to read content index {self.path}: {str(e)}")
+
+    def record(self, subsite, doc_id, text):
+        """Record a downloaded text and return its ``Revision``."""
+        digest = content_digest(text)
+        key = (subsite, doc_id)
+        with self._lock:
+            latest = self._latest.get(key)
+            holder = self._holders.setdefault(digest, key)
+            duplicate_of = holder if holder != key else None
+            if latest is not None and latest[0] == digest:
+                return Revision("unchanged", digest, latest[1], duplicate_of)
+            version = latest[1] + 1 if latest else 1
+            self._latest[key] = (digest, version)
+            self._append(
+                {
+                    "subsite": subsite,
+                    "doc_id": doc_id,
+                    "sha256": digest,
+                    "version": version,
+                    "recorded_at": time.time(),
+                }
+            )
+        status = "changed" if latest else "new"
+        return Revision(status, digest, version, duplicate_of)
+
+    def _append(self, entry):
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logging.warning(f"Failed to update content index {self.path}: {str(e)}")
+
+
+def duplicate_note(duplicate_of):
+    """Text saved in place of a body identical to another document's."""
+    subsite, doc_id = duplicate_of
+    return f"Same text as {subsite} document {doc_id}.\n"
@@ -1,3 +1,4 @@
+import codecs
 import logging
 import os
 import textwrap
@@ -10,30 +11,45 @@ from string import Template
 
 import requests
 import yaml
-from bs4 import BeautifulSoup
 import re
 
-from .core.constants import SUBSITE_CONFIG
+from .core.constants import DEFAULT_MAX_DOCUMENT_MB, DOCUMENT_ENCODING, SUBSITE_CONFIG
+from .core.cpu import run_cpu
+from .core.extract import TextExtractor, extract_text
+from .core.metrics import metrics, subsite_label
+from .core.scheduler import run_steps
+from .core.session import get_session
 from .models import EvidMetadata
 
 
+# Same matches as r"(\n\s*\n)+" (a newline through the last newline of a
+# whitespace run), without backtracking over the whitespace after it
+_BLANK_LINES = re.compile(r"\n(?:[^\S\n]*\n)+")
+# Backslash first, so the escapes added for the other characters stay intact
+_TYPST_SPECIAL = '\\#*_~^`"$<>'
+# Joins documents for batch escaping; not whitespace, so blank-line
+# collapsing never spans two documents, and not escaped
+_BATCH_SEPARATOR = "\x00"
+# Bytes of a document body read at a time while streaming it
+_CHUNK_SIZE = 64 * 1024
+_max_document_bytes = DEFAULT_MAX_DOCUMENT_MB * 1024**2
+
+
 def clean_text_for_typst(text: str) -> str:
     """Clean text for Typst by escaping special characters and normalizing newlines."""
-    text = re.sub(r"(\n\s*\n)+", r"\n\n", text)
-    escapes = {
-        "\\": "\\\\",
-        "#": "\\#",
-        "*": "\\*",
-        "_": "\\_",
-        "~": "\\~",
-        "^": "\\^",
-        "`": "\\`",
-        '"': '\\"',
-        "$": "\\$",
-        "<": "\\<",
-        ">": "\\>",
-    }
-    return "".join(escapes.get(c, c) for c in text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    for char in _TYPST_SPECIAL:
+        if char in text:
+            text = text.replace(char, "\\" + char)
+    return text
+
+
+def clean_texts_for_typst(texts: list[str]) -> list[str]:
+    """Clean many texts for Typst in one pass, e.g. for bulk re-rendering."""
+    if any(_BATCH_SEPARATOR in text for text in texts):
+        return [clean_text_for_typst(text) for text in texts]
+    joined = clean_text_for_typst(_BATCH_SEPARATOR.join(texts))
+    return joined.split(_BATCH_SEPARATOR) if texts else []
 
 
 def typst_dict(d: dict) -> str:
@@ -59,7 +75,8 @@ def trigger_document_conversion(rss_link, doc_id):
 
     logging.info(f"Triggering document conversion for {doc_id} via {rss_link}")
     try:
-        response = requests.get(rss_link, timeout=10)
+        metrics.inc("conversion_triggers", subsite_label(rss_link))
+        response = get_session(rss_link).get(rss_link, timeout=10)
         response.raise_for_status()
         logging.debug(f"Conversion trigger successful for {doc_id}")
         return True
@@ -68,42 +85,187 @@ def trigger_document_conversion(rss_link, doc_id):
         return False
 
 
-def get_document_text(doc_id, base_url, library, rss_link=None, conversion_delay=2.0):
-    """Fetch document text, triggering conversion if direct download fails."""
-    url = f"{base_url}?library={library}&id={urllib.parse.quote(doc_id)}"
+def document_url(doc_id, base_url, library):
+    """Build the conversion endpoint URL for a document."""
+    return f"{base_url}?library={library}&id={urllib.parse.quote(doc_id)}"
+
+
+class DocumentTooLarge(requests.RequestException):
+    """A document body is larger than the configured maximum."""
+
+
+def set_max_document_size(megabytes):
+    """Set the largest document body downloaded, in MB (0 for no limit)."""
+    global _max_document_bytes
+    _max_document_bytes = int(max(0, megabytes) * 1024**2)
+
+
+def response_encoding(response):
+    """Charset declared by a response, or the encoding of HUDOC documents.
+
+    Unlike ``response.text``, this never guesses the charset from the body.
+    """
+    content_type = response.headers.get("Content-Type", "")
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip("\"'")).name
+            except LookupError:
+                break
+    return DOCUMENT_ENCODING
+
+
+def _check_size(size, url):
+    if _max_document_bytes and size > _max_document_bytes:
+        raise DocumentTooLarge(f"Body of {url} exceeds {_max_document_bytes} bytes")
+
+
+def _stream_body(response, extractor, keep=False):
+    """Decode a streamed response body into ``extractor`` chunk by chunk.
+
+    Returns the number of bytes read and, with ``keep``, the decoded body.
+    """
+    _check_size(int(response.headers.get("Content-Length") or 0), response.url)
+    decoder = codecs.getincrementaldecoder(response_encoding(response))("replace")
+    size = 0
+    parts = []
+    for chunk in response.iter_content(_CHUNK_SIZE):
+        size += len(chunk)
+        _check_size(size, response.url)
+        html = decoder.decode(chunk)
+        extractor.feed(html)
+        if keep:
+            parts.append(html)
+    html = decoder.decode(b"", final=True)
+    extractor.feed(html)
+    if keep:
+        parts.append(html)
+    return size, "".join(parts) if keep else None
+
+
+def fetch_document_text(url, cache=None):
+    """Fetch converted document HTML and extract its text.
+
+    The body is streamed into the extractor as it arrives, so it is never
+    held in memory whole unless it goes into the cache, and bodies larger
+    than the configured maximum are abandoned with ``DocumentTooLarge``.
+    The cache, if given, is revalidated with a conditional request. Only
+    bodies with text are cached: the empty page served before a conversion
+    must not be served again once the conversion is triggered.
+    """
+    subsite = subsite_label(url)
+    headers = {}
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None:
+        body, meta = cached
+        if cache.is_fresh(meta):
+            text = _finish_extraction(TextExtractor(), subsite, body)
+            if text.strip():
+                logging.debug(f"Serving {url} from cache")
+                return text
+            cached = None  # an empty page cached by an earlier version
+        else:
+            headers = cache.conditional_headers(meta)
+
+    extractor = TextExtractor()
+    started = time.perf_counter()
+    session = get_session(url)
+    with session.get(url, timeout=10, headers=headers, stream=True) as response:
+        if response.status_code == 304 and cached is not None:
+            metrics.observe("fetch_seconds", subsite, time.perf_counter() - started)
+            cache.touch(url)
+            return _finish_extraction(extractor, subsite, cached[0])
+        response.raise_for_status()
+        try:
+            size, body = _stream_body(response, extractor, keep=cache is not None)
+        finally:
+            metrics.observe("fetch_seconds", subsite, time.perf_counter() - started)
+        metrics.inc("bytes_downloaded", subsite, size)
+        text = _finish_extraction(extractor, subsite)
+        if body is not None and text.strip():
+            cache.put(
+                url,
+                body,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+    return text
+
+
+def _finish_extraction(extractor, subsite, html=None):
+    if html is not None:
+        extractor.feed(html)
+    text = extractor.close()
+    metrics.observe("extract_cpu_seconds", subsite, extractor.cpu_seconds)
+    return text
+
+
+def get_cached_text(doc_id, url, cache):
+    """Extract document text from the cache only, without network access."""
+    cached = cache.get(url)
+    if cached is None:
+        logging.warning(f"No cached content for {doc_id} (offline)")
+        return None
+    return extract_text(cached[0]) or None
+
+
+def document_text_steps(
+    doc_id,
+    base_url,
+    library,
+    rss_link=None,
+    conversion_delay=2.0,
+    cache=None,
+    latency=None,
+):
+    """Generator form of ``get_document_text``.
+
+    Yields the seconds to wait for a triggered conversion before the next
+    attempt and returns the text (or None), leaving the caller to decide how
+    to wait. With a ``ConversionLatency``, waits follow the observed
+    conversion time of the library instead of ``conversion_delay``.
+    """
+    url = document_url(doc_id, base_url, library)
+    if cache is not None and cache.offline:
+        return get_cached_text(doc_id, url, cache)
     logging.info(f"Fetching document content for {doc_id} from {url}")
 
+    subsite = subsite_label(url)
+    triggered_at = None
+    polls = 0
     for attempt in range(3):
+        if attempt:
+            metrics.inc("retries", subsite)
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            for script in soup(["script", "style"]):
-                script.extract()
-
-            # Extract text from top-level text containers, avoiding nested duplicates
-            text_elements = soup.find_all(["p", "li", "h1", "h2", "h3"])
-            seen_texts = set()
-            text_lines = []
-            for element in text_elements:
-                text = element.get_text(separator=" ", strip=True)
-                if text and text not in seen_texts:
-                    seen_texts.add(text)
-                    text_lines.append(text)
-
-            # Join paragraphs with double newlines for readability
-            text = "\n\n".join(text_lines)
+            text = fetch_document_text(url, cache)
             if text.strip():
+                if latency is not None and triggered_at is not None:
+                    latency.observe(library, time.monotonic() - triggered_at)
                 return text
             logging.warning(f"Empty content for {doc_id} on attempt {attempt + 1}")
+        except DocumentTooLarge as e:
+            logging.error(f"Skipping {doc_id}: {str(e)}")
+            return None
         except requests.RequestException as e:
             logging.warning(f"Attempt {attempt + 1} failed for {doc_id}: {str(e)}")
 
         # If direct download failed or content is empty, try triggering conversion
         if rss_link and attempt < 2:
             if trigger_document_conversion(rss_link, doc_id):
-                logging.info(f"Waiting {conversion_delay}s for conversion of {doc_id}")
-                time.sleep(conversion_delay)
+                if triggered_at is None:
+                    triggered_at = time.monotonic()
+                delay = conversion_delay
+                if latency is not None:
+                    delay = latency.delay(library, polls, conversion_delay)
+                polls += 1
+                logging.info(f"Waiting {delay:g}s for conversion of {doc_id}")
+                metrics.observe("conversion_wait_seconds", subsite, delay)
+                metrics.add("waiting_conversion", subsite, 1)
+                try:
+                    yield delay
+                finally:
+                    metrics.add("waiting_conversion", subsite, -1)
             else:
                 logging.warning(
                     f"Conversion trigger failed for {doc_id}; retrying direct download"
@@ -115,6 +277,161 @@ def get_document_text(doc_id, base_url, library, rss_link=None, conversion_delay
     return None
 
 
+def get_document_text(
+    doc_id,
+    base_url,
+    library,
+    rss_link=None,
+    conversion_delay=2.0,
+    cache=None,
+    latency=None,
+):
+    """Fetch document text, triggering conversion if direct download fails."""
+    return run_steps(
+        document_text_steps(
+            doc_id, base_url, library, rss_link, conversion_delay, cache, latency
+        )
+    )
+
+
+def safe_doc_id(doc_id):
+    """Make a document ID safe for use in file names."""
+    return doc_id.replace("/", "_").replace(":", "_").replace(" ", "_")
+
+
+def document_link(doc_id, hudoc_type):
+    """Link to a document on the HUDOC website."""
+    id_key = SUBSITE_CONFIG[hudoc_type]["id_key"]
+    return f'https://hudoc.{hudoc_type}.coe.int/eng#{{"{id_key}":["{doc_id}"]}}'
+
+
+def plain_filename(doc_id, hudoc_type):
+    """File name of a document saved in plain format."""
+    return f"{hudoc_type}_doc_{safe_doc_id(doc_id)}.txt"
+
+
+def evid_subdir(doc_id, hudoc_type):
+    """Directory name of a document saved in evid format."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{hudoc_type}_{doc_id}"))
+
+
+def saved_entries(output_dir):
+    """List the output directory once, for repeated ``is_saved`` checks."""
+    try:
+        return set(os.listdir(output_dir))
+    except OSError:
+        return set()
+
+
+def is_saved(doc_id, hudoc_type, output_dir, entries, evid=False):
+    """Check whether a document is already saved completely in ``output_dir``.
+
+    ``entries`` is the directory listing from ``saved_entries``, or None to
+    check the files directly.
+    """
+    if not evid:
+        filename = plain_filename(doc_id, hudoc_type)
+        if entries is None:
+            return os.path.isfile(os.path.join(output_dir, filename))
+        return filename in entries
+    subdir = evid_subdir(doc_id, hudoc_type)
+    return (entries is None or subdir in entries) and all(
+        os.path.isfile(os.path.join(output_dir, subdir, name))
+        for name in ("label.typ", "info.yml")
+    )
+
+
+def render_plain(text, title, description):
+    """Content of a document in plain format: a title header, then the text."""
+    header = f"Title: {title}\n"
+    if description:
+        header += f"Description: {description}\n\n"
+    return header + text
+
+
+def render_evid(
+    text, doc_id, title, description, hudoc_type, filename, verdict_date=None
+):
+    """Contents of the Typst and YAML files of a document in evid format."""
+    subdir = evid_subdir(doc_id, hudoc_type)
+    safe_id = safe_doc_id(doc_id)
+
+    # Clean text for Typst
+    cleaned_text = clean_text_for_typst(text)
+
+    # Create YAML metadata
+    date = verdict_date or datetime.now().strftime("%Y-%m-%d")
+
+    metadata = EvidMetadata(
+        authors=hudoc_type,
+        dates=date,
+        label=description or "No description",
+        original_name=filename,
+        tags=["hudoc"] + [hudoc_type],
+        time_added=datetime.now().strftime("%Y-%m-%d"),
+        title=title or "Untitled",
+        url=document_link(doc_id, hudoc_type),
+        uuid=subdir,
+    )
+    yaml_content = metadata.model_dump()
+
+    # Create dict for Typst mset with overrides
+    mset_dict = yaml_content.copy()
+    mset_dict["date"] = date
+    mset_dict["title"] = description
+    mset_str = typst_dict(mset_dict)
+
+    template = r"""#import "@local/labtyp:0.1.0": lablist, lab, mset
+
+#mset(values: $mset_str)
+
+#outline()
+
+= $safe_id
+
+$cleaned_text
+
+= List of Labels
+#lablist()
+"""
+
+    typst_content = Template(textwrap.dedent(template)).substitute(
+        mset_str=mset_str, safe_id=safe_id, cleaned_text=cleaned_text
+    )
+
+    yaml_text = yaml.dump(yaml_content, allow_unicode=True, default_style="'")
+    return typst_content, yaml_text
+
+
+def document_files(
+    text, doc_id, title, description, hudoc_type, verdict_date=None, evid=False
+):
+    """Files of a document as (relative path, content) pairs.
+
+    The paths and contents are those ``save_text`` writes into the output
+    directory, for output backends that store documents elsewhere.
+    """
+    filename = plain_filename(doc_id, hudoc_type)
+    if not evid:
+        return [(filename, render_plain(text, title, description))]
+    subdir = evid_subdir(doc_id, hudoc_type)
+    # Rendering is CPU-bound, so it runs in the CPU process pool if there is one
+    typst_content, yaml_content = run_cpu(
+        render_evid,
+        text,
+        doc_id,
+        title,
+        description,
+        hudoc_type,
+        filename,
+        verdict_date,
+    )
+    return [
+        (f"{subdir}/label.typ", typst_content),
+        (f"{subdir}/info.yml", yaml_content),
+    ]
+
+
 def save_text(
     text,
     doc_id,
@@ -124,11 +441,14 @@ def save_text(
     hudoc_type,
     verdict_date=None,
     evid=False,
+    previous_version=0,
 ):
-    """Save document text in plain text or evid format."""
-    prefix = f"{hudoc_type}_doc"
-    safe_id = doc_id.replace("/", "_").replace(":", "_").replace(" ", "_")
-    filename = f"{prefix}_{safe_id}.txt"
+    """Save document text in plain text or evid format.
+
+    With ``previous_version``, the saved files of the document are kept as
+    that version instead of being skipped or overwritten.
+    """
+    filename = plain_filename(doc_id, hudoc_type)
 
     if evid:
         save_evid(
@@ -140,21 +460,39 @@ def save_text(
             hudoc_type,
             filename,
             verdict_date,
+            previous_version,
         )
     else:
         filepath = os.path.join(output_dir, filename)
         try:
             Path(output_dir).mkdir(parents=True, exist_ok=True)
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(f"Title: {title}\n")
-                if description:
-                    f.write(f"Description: {description}\n\n")
-                f.write(text)
+            if previous_version and os.path.exists(filepath):
+                stem, ext = os.path.splitext(filepath)
+                os.replace(filepath, f"{stem}.v{previous_version}{ext}")
+            # Write to a temporary file first so an interrupted run never
+            # leaves a truncated file that would be mistaken for a finished one
+            partial = f"{filepath}.part"
+            with open(partial, "w", encoding="utf-8") as f:
+                f.write(render_plain(text, title, description))
+            os.replace(partial, filepath)
             logging.info(f"Saved content for {doc_id} to {filepath}")
         except OSError as e:
             logging.error(f"Failed to save file for {doc_id}: {str(e)}")
 
 
+def _keep_version(subdir_path, names, version):
+    """Move a document's files into ``subdir_path/v<version>``."""
+    version_path = os.path.join(subdir_path, f"v{version}")
+    try:
+        for name in names:
+            path = os.path.join(subdir_path, name)
+            if os.path.exists(path):
+                Path(version_path).mkdir(parents=True, exist_ok=True)
+                os.replace(path, os.path.join(version_path, name))
+    except OSError as e:
+        logging.error(f"Failed to keep version {version} in {subdir_path}: {str(e)}")
+
+
 def save_evid(
     text,
     doc_id,
@@ -164,17 +502,22 @@ def save_evid(
     hudoc_type,
     filename,
     verdict_date=None,
+    previous_version=0,
 ):
-    """Save document in evid format with Typst and YAML files."""
-    unique_name = f"{hudoc_type}_{doc_id}"
-    subdir = str(uuid.uuid5(uuid.NAMESPACE_URL, unique_name))
+    """Save document in evid format with Typst and YAML files.
+
+    With ``previous_version``, existing files are moved into a ``v<N>``
+    subdirectory of the document's directory first.
+    """
+    subdir = evid_subdir(doc_id, hudoc_type)
     subdir_path = os.path.join(output_dir, subdir)
     typst_file = os.path.join(subdir_path, "label.typ")
     yaml_file = os.path.join(subdir_path, "info.yml")
-    safe_id = doc_id.replace("/", "_").replace(":", "_").replace(" ", "_")
 
+    if previous_version:
+        _keep_version(subdir_path, ("label.typ", "info.yml"), previous_version)
     # Check if complete files already exist
-    if Path(subdir_path).exists():
+    elif Path(subdir_path).exists():
         typst_path = Path(typst_file)
         yaml_path = Path(yaml_file)
         if typst_path.exists() and yaml_path.exists():
@@ -187,48 +530,16 @@ def save_evid(
                 f"Partial evid files found for {doc_id} at {subdir_path}, overwriting"
             )
 
-    # Clean text for Typst
-    cleaned_text = clean_text_for_typst(text)
-
-    # Create YAML metadata
-    id_key = SUBSITE_CONFIG[hudoc_type]["id_key"]
-    date = verdict_date or datetime.now().strftime("%Y-%m-%d")
-
-    metadata = EvidMetadata(
-        authors=hudoc_type,
-        dates=date,
-        label=description or "No description",
-        original_name=filename,
-        tags=["hudoc"] + [hudoc_type],
-        time_added=datetime.now().strftime("%Y-%m-%d"),
-        title=title or "Untitled",
-        url=f'https://hudoc.{hudoc_type}.coe.int/eng#{{"{id_key}":["{doc_id}"]}}',
-        uuid=subdir,
-    )
-    yaml_content = metadata.model_dump()
-
-    # Create dict for Typst mset with overrides
-    mset_dict = yaml_content.copy()
-    mset_dict["date"] = date
-    mset_dict["title"] = description
-    mset_str = typst_dict(mset_dict)
-
-    template = r"""#import "@local/labtyp:0.1.0": lablist, lab, mset
-
-#mset(values: $mset_str)
-
-#outline()
-
-= $safe_id
-
-$cleaned_text
-
-= List of Labels
-#lablist()
-"""
-
-    typst_content = Template(textwrap.dedent(template)).substitute(
-        mset_str=mset_str, safe_id=safe_id, cleaned_text=cleaned_text
+    # Rendering is CPU-bound, so it runs in the CPU process pool if there is one
+    typst_content, yaml_content = run_cpu(
+        render_evid,
+        text,
+        doc_id,
+        title,
+        description,
+        hudoc_type,
+        filename,
+        verdict_date,
     )
 
     try:
@@ -236,7 +547,7 @@ $cleaned_text
         with open(typst_file, "w", encoding="utf-8") as f:
             f.write(typst_content)
         with open(yaml_file, "w", encoding="utf-8") as f:
-            yaml.dump(yaml_content, f, allow_unicode=True, default_style="'")
+            f.write(yaml_content)
         logging.info(f"Saved evid format for {doc_id} to {subdir_path}")
     except OSError as e:
         logging.error(f"Failed to save evid files for {doc_id}: {str(e)}")
@@ -21,7 +21,7 @@ def test_download_callback_exception():
     """Test download_callback when an exception occurs in process_rss."""
     with (
         patch("hudoc.cli.Path.is_file", return_value=True),
-        patch("hudoc.cli.process_rss", side_effect=Exception("Test error")),
+        patch("hudoc.core.processor.process_rss", side_effect=Exception("Test error")),
         patch("sys.exit") as mock_exit,
         patch("hudoc.cli.logging") as mock_logging,
     ):
@@ -86,7 +86,7 @@ def test_list_callback_with_items(capsys):
 
 def test_latest_callback():
     """Test latest_callback downloads from the correct subsite URL."""
-    with patch("hudoc.cli.process_rss_url") as mock_process:
+    with patch("hudoc.core.processor.process_rss_url") as mock_process:
         latest_callback(
             subsite="echr",
             output_dir="data",
@@ -104,7 +104,10 @@ def test_latest_callback():
 def test_latest_callback_exception():
     """Test latest_callback exits on error."""
     with (
-        patch("hudoc.cli.process_rss_url", side_effect=Exception("Network error")),
+        patch(
+            "hudoc.core.processor.process_rss_url",
+            side_effect=Exception("Network error"),
+        ),
         patch("sys.exit") as mock_exit,
         patch("hudoc.cli.logging") as mock_logging,
     ):
@@ -124,3 +127,162 @@ def test_main():
     result = runner.invoke(["--help"])
     assert result.exit_code == 0
     assert "hudoc" in result.output
+
+
+def test_parse_subsites():
+    """Test --subsite accepts one subsite, a list or 'all'."""
+    from hudoc.cli import _parse_subsites
+    from hudoc.core.constants import VALID_SUBSITES
+
+    assert _parse_subsites("echr") == ["echr"]
+    assert _parse_subsites("echr, cpt,echr") == ["echr", "cpt"]
+    assert _parse_subsites("all") == VALID_SUBSITES
+    with patch("sys.exit", side_effect=SystemExit) as mock_exit:
+        with pytest.raises(SystemExit):
+            _parse_subsites("echr,nope")
+        mock_exit.assert_called_with(1)
+
+
+def test_command_options_have_unique_sort_keys():
+    """Test every option of a command has its own place in the help output."""
+    from hudoc.cli import app
+
+    for cmd in app.commands:
+        keys = [opt.sort_key for opt in cmd.options]
+        assert len(set(keys)) == len(keys), cmd.name
+        flags = [opt.flags[0] for opt in cmd.options]
+        assert len(set(flags)) == len(flags), cmd.name
+
+
+def test_with_profile_writes_stats_and_thread_report(tmp_path):
+    """Test --profile wraps a command and attributes time to pool threads."""
+    import inspect
+    import pstats
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from hudoc.cli import _with_profile
+
+    def busy():
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end:
+            pass
+
+    def callback(rss_file, limit=3):
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pool") as pool:
+            list(pool.map(lambda _: busy(), range(2)))
+        return rss_file, limit
+
+    wrapped = _with_profile(callback)
+    assert list(inspect.signature(wrapped).parameters) == [
+        "rss_file",
+        "limit",
+        "profile",
+        "profile_top",
+    ]
+    assert wrapped("feed.xml", limit=5) == ("feed.xml", 5)
+
+    path = tmp_path / "run.prof"
+    assert wrapped("feed.xml", profile=str(path), profile_top=5) == ("feed.xml", 3)
+    assert pstats.Stats(str(path)).total_calls > 0
+    report = (tmp_path / "run.prof.txt").read_text()
+    assert "pool_0" in report
+    assert "busy" in report
+    assert "Peak traced memory" in report
+
+
+# Heavy modules only the download pipeline needs
+PIPELINE_MODULES = ("requests", "bs4", "numpy", "hudoc.utils", "hudoc.models")
+# Import time allowed for hudoc itself, excluding treeparse and its deps
+IMPORT_BUDGET_US = 150_000
+
+
+def _import_times(*args):
+    """Run the CLI under -X importtime; map module -> cumulative microseconds."""
+    import subprocess
+    import sys
+
+    code = (
+        f"import sys; sys.argv = {['hudoc', *args]!r}; "
+        "from hudoc.cli import main; main()"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "args", [("--help",), ("list", "tests/data/echr_rss.xml")], ids=["help", "list"]
+)
+def test_cli_startup_import_budget(args):
+    """Test `hudoc --help` and `hudoc list` skip the pipeline and import quickly."""
+    times = _import_times(*args)
+    assert "hudoc.cli" in times
+    assert not [m for m in PIPELINE_MODULES if m in times]
+    own = times["hudoc.cli"] - times.get("treeparse", 0)
+    assert own < IMPORT_BUDGET_US
+
+
+def test_extract_callback(tmp_path, capsys):
+    """Test extract writes one archived document into the output directory."""
+    from hudoc.cli import extract_callback
+    from hudoc.core.archive import Archive
+
+    with Archive(tmp_path, "zip", "lzma") as archive:
+        archive.add("001-1", "echr", [("a/label.typ", "One")])
+    extract_callback(str(archive.path), "001-1", str(tmp_path / "out"))
+    assert (tmp_path / "out" / "a" / "label.typ").read_text() == "One"
+    assert "label.typ" in capsys.readouterr().out
+    with patch("sys.exit", side_effect=SystemExit) as mock_exit:
+        with pytest.raises(SystemExit):
+            extract_callback(str(archive.path), "001-2", str(tmp_path / "out"))
+        mock_exit.assert_called_with(1)
+
+
+def test_extract_callback_index_mismatch(tmp_path):
+    """Test extract fails cleanly when the index lists a missing member."""
+    import zipfile
+
+    from hudoc.cli import extract_callback
+    from hudoc.core.archive import Archive
+
+    with Archive(tmp_path, "zip", "none") as archive:
+        archive.add("001-1", "echr", [("a/label.typ", "One")])
+    with zipfile.ZipFile(archive.path, "w") as replaced:
+        replaced.writestr("b/label.typ", "Two")
+    with (
+        patch("sys.exit", side_effect=SystemExit) as mock_exit,
+        patch("hudoc.cli.logging") as mock_logging,
+    ):
+        with pytest.raises(SystemExit):
+            extract_callback(str(archive.path), "001-1", str(tmp_path / "out"))
+        mock_exit.assert_called_with(1)
+    assert mock_logging.error.call_args[0][0].startswith("Failed to extract 001-1")
+
+
+def test_search_callback(tmp_path, capsys):
+    """Test search prints ranked matches from the document database."""
+    from hudoc.cli import search_callback
+    from hudoc.core.database import DocumentDatabase
+
+    with DocumentDatabase(tmp_path) as db:
+        db.save(
+            "Text",
+            {"doc_id": "001-1", "title": "CASE OF A", "description": ""},
+            "echr",
+        )
+    search_callback("text", str(tmp_path))
+    assert "1. [echr] 001-1 CASE OF A" in capsys.readouterr().out
+    with patch("sys.exit", side_effect=SystemExit) as mock_exit:
+        with pytest.raises(SystemExit):
+            search_callback('"unbalanced', str(tmp_path))
+        mock_exit.assert_called_with(1)
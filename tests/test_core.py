@@ -1,6 +1,8 @@
+from contextlib import nullcontext
 from pathlib import Path
-from unittest.mock import patch, MagicMock
-import xml.etree.ElementTree as ET
+from unittest.mock import patch
+
+import pytest
 
 from hudoc.core.parser import parse_rss_file, parse_rss_url
 from hudoc.core.processor import process_rss, process_rss_url
@@ -29,37 +31,72 @@ def test_parse_rss_file_grevio():
     assert items[0]["description"] == "Test Description"
 
 
-def test_parse_rss_file_no_items():
-    """Test parsing RSS with no items."""
-    mock_root = MagicMock()
-    mock_root.findall.return_value = []
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
+def _write_rss(tmp_path, items_xml):
+    rss_file = tmp_path / "feed.xml"
+    rss_file.write_text(
+        f'<rss version="2.0"><channel>{items_xml}</channel></rss>',
+        encoding="utf-8",
+    )
+    return rss_file
+
+
+def test_parse_rss_file_compact_items(tmp_path):
+    """Items are frozen records sharing their link prefix, decoded lazily."""
+    link = "http://hudoc.echr.coe.int/eng#%7B%22itemid%22%3A%5B%22001-{}%22%5D%7D"
+    rss_file = _write_rss(
+        tmp_path,
+        "".join(
+            f"<item><title>T{n}</title><description>D{n}</description>"
+            f"<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>"
+            f"<link>{link.format(n)}</link></item>"
+            for n in range(2)
         ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    )
+    subsite, items = parse_rss_file(rss_file)
+    assert subsite == "echr"
+    first, second = items
+    assert first["rss_link"] == link.format(0)
+    assert first.link_data() == {"itemid": ["001-0"]}
+    assert first.link_prefix is second.link_prefix
+    assert first.verdict_date is second.verdict_date
+    assert first.get("missing", "default") == "default"
+    assert first.to_dict()["doc_id"] == "001-0"
+    with pytest.raises(AttributeError):
+        first.doc_id = "001-9"
+
+
+def test_parse_rss_file_does_not_decode_links(tmp_path):
+    """Test the document id is read from the link without a JSON decode."""
+    link = (
+        "http://hudoc.echr.coe.int/eng#%7B%22itemid%22%3A%5B%22001-%5C%22"
+        "1%22%5D%2C%22doctype%22%3A%5B%22JUD%22%5D%7D"
+    )
+    rss_file = _write_rss(tmp_path, f"<item><link>{link}</link></item>")
+    with patch("hudoc.core.parser.json") as mock_json:
+        subsite, items = parse_rss_file(rss_file)
+    mock_json.loads.assert_not_called()
+    assert subsite == "echr"
+    assert items[0]["doc_id"] == '001-"1'
+    assert items[0].link_data() == {"itemid": ['001-"1'], "doctype": ["JUD"]}
+
+
+def test_parse_rss_file_no_items(tmp_path):
+    """Test parsing RSS with no items."""
+    rss_file = _write_rss(tmp_path, "")
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite is None
         assert items == []
         mock_logging.warning.assert_called_with("No items found in RSS file")
 
 
-def test_parse_rss_file_invalid_subsite():
+def test_parse_rss_file_invalid_subsite(tmp_path):
     """Test parsing RSS with invalid subsite."""
-    mock_item = MagicMock()
-    mock_item.find.return_value.text = "https://hudoc.invalid.coe.int/eng#test"
-    mock_root = MagicMock()
-    mock_root.findall.return_value = [mock_item]
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
-        ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    rss_file = _write_rss(
+        tmp_path, "<item><link>https://hudoc.invalid.coe.int/eng#test</link></item>"
+    )
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite is None
         assert items == []
         mock_logging.error.assert_called_with(
@@ -67,20 +104,11 @@ def test_parse_rss_file_invalid_subsite():
         )
 
 
-def test_parse_rss_file_no_link():
+def test_parse_rss_file_no_link(tmp_path):
     """Test parsing RSS with no link in first item."""
-    mock_item = MagicMock()
-    mock_item.find.return_value = None
-    mock_root = MagicMock()
-    mock_root.findall.return_value = [mock_item]
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
-        ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    rss_file = _write_rss(tmp_path, "<item><title>test</title></item>")
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite is None
         assert items == []
         mock_logging.error.assert_called_with(
@@ -88,64 +116,29 @@ def test_parse_rss_file_no_link():
         )
 
 
-def test_parse_rss_file_item_no_link():
+def test_parse_rss_file_item_no_link(tmp_path):
     """Test parsing RSS item with no link."""
-    mock_item = MagicMock()
-    mock_item.find.side_effect = lambda tag: (
-        None if tag == "link" else MagicMock(text="test")
+    rss_file = _write_rss(
+        tmp_path,
+        '<item><title>test</title><link>https://hudoc.echr.coe.int/eng#{"itemid":["test"]}</link></item>'
+        "<item><title>test</title><description>test</description></item>",
     )
-    mock_root = MagicMock()
-    mock_root.findall.return_value = [
-        MagicMock(
-            find=lambda tag: (
-                MagicMock(text='https://hudoc.echr.coe.int/eng#{"itemid":["test"]}')
-                if tag == "link"
-                else MagicMock(text="test")
-            )
-        ),
-        mock_item,
-    ]
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
-        ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite == "echr"
         assert len(items) == 1
         mock_logging.warning.assert_called_with("Item has no link; skipping")
 
 
-def test_parse_rss_file_invalid_pubdate():
+def test_parse_rss_file_invalid_pubdate(tmp_path):
     """Test parsing RSS with invalid pubDate."""
-
-    def find_side_effect(tag):
-        if tag == "link":
-            elem = MagicMock()
-            elem.text = 'https://hudoc.echr.coe.int/eng#{"itemid":["test"]}'
-            return elem
-        if tag == "pubDate":
-            elem = MagicMock()
-            elem.text = "invalid date"
-            return elem
-        elem = MagicMock()
-        elem.text = "test"
-        return elem
-
-    mock_item = MagicMock()
-    mock_item.find.side_effect = find_side_effect
-    mock_root = MagicMock()
-    mock_root.findall.return_value = [mock_item]
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
-        ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    rss_file = _write_rss(
+        tmp_path,
+        '<item><title>test</title><link>https://hudoc.echr.coe.int/eng#{"itemid":["test"]}</link>'
+        "<pubDate>invalid date</pubDate></item>",
+    )
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite == "echr"
         assert len(items) == 1
         mock_logging.warning.assert_called_with(
@@ -153,20 +146,13 @@ def test_parse_rss_file_invalid_pubdate():
         )
 
 
-def test_parse_rss_file_invalid_fragment():
+def test_parse_rss_file_invalid_fragment(tmp_path):
     """Test parsing RSS with invalid link fragment."""
-    mock_item = MagicMock()
-    mock_item.find.return_value.text = "https://hudoc.echr.coe.int/eng#invalid"
-    mock_root = MagicMock()
-    mock_root.findall.return_value = [mock_item]
-    with (
-        patch(
-            "xml.etree.ElementTree.parse",
-            return_value=MagicMock(getroot=lambda: mock_root),
-        ),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("dummy.xml")
+    rss_file = _write_rss(
+        tmp_path, "<item><link>https://hudoc.echr.coe.int/eng#invalid</link></item>"
+    )
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite == "echr"
         assert items == []
         mock_logging.warning.assert_called_with(
@@ -174,16 +160,35 @@ def test_parse_rss_file_invalid_fragment():
         )
 
 
-def test_parse_rss_file_parse_error():
+def test_parse_rss_file_parse_error(tmp_path):
     """Test parsing invalid RSS file."""
-    with (
-        patch("xml.etree.ElementTree.parse", side_effect=ET.ParseError("Parse error")),
-        patch("hudoc.core.parser.logging") as mock_logging,
-    ):
-        subsite, items = parse_rss_file("invalid.xml")
+    rss_file = tmp_path / "invalid.xml"
+    rss_file.write_text("<rss><channel><item>", encoding="utf-8")
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        subsite, items = parse_rss_file(rss_file)
         assert subsite is None
         assert items == []
-        mock_logging.error.assert_called_with("Failed to parse RSS file: Parse error")
+        assert mock_logging.error.call_args[0][0].startswith(
+            "Failed to parse RSS file: "
+        )
+
+
+def test_stream_rss_items_stops_at_limit():
+    """Test streaming parse stops reading the source once the limit is reached."""
+    import io
+
+    from hudoc.core.parser import stream_rss_items
+
+    item = (
+        '<item><link>https://hudoc.echr.coe.int/eng#{{"itemid":["{}"]}}</link></item>'
+    )
+    data = ("<rss><channel>" + "".join(item.format(i) for i in range(20000))).encode()
+    source = io.BytesIO(data + b"</channel></rss>")
+
+    subsite, items = stream_rss_items(source, limit=2)
+    assert subsite == "echr"
+    assert [i["doc_id"] for i in items] == ["0", "1"]
+    assert source.tell() < len(data) // 10
 
 
 def test_parse_rss_file_file_not_found():
@@ -198,7 +203,10 @@ def test_parse_rss_file_file_not_found():
 def test_process_rss_no_subsite():
     """Test process_rss with no subsite detected."""
     with (
-        patch("hudoc.core.processor.parse_rss_file", return_value=(None, [])),
+        patch(
+            "hudoc.core.processor.open_rss_file",
+            return_value=nullcontext((None, iter([]))),
+        ),
         patch("hudoc.core.processor.logging") as mock_logging,
     ):
         process_rss("rss.xml", "output")
@@ -208,7 +216,10 @@ def test_process_rss_no_subsite():
 def test_process_rss_no_items():
     """Test process_rss with no items."""
     with (
-        patch("hudoc.core.processor.parse_rss_file", return_value=("echr", [])),
+        patch(
+            "hudoc.core.processor.open_rss_file",
+            return_value=nullcontext(("echr", iter([]))),
+        ),
         patch("hudoc.core.processor.logging") as mock_logging,
     ):
         process_rss("rss.xml", "output")
@@ -219,11 +230,15 @@ def test_process_rss_limit_zero():
     """Test process_rss with limit=0 (all items)."""
     items = [{"doc_id": "1"}, {"doc_id": "2"}]
     with (
-        patch("hudoc.core.processor.parse_rss_file", return_value=("echr", items)),
-        patch("hudoc.core.processor.ThreadPoolExecutor") as mock_executor,
+        patch(
+            "hudoc.core.processor.open_rss_file",
+            return_value=nullcontext(("echr", iter(items))),
+        ),
+        patch("hudoc.core.processor.download_steps") as mock_steps,
     ):
+        mock_steps.side_effect = lambda *args, **kwargs: iter(())
         process_rss("rss.xml", "output", limit=0)
-        assert mock_executor().__enter__().submit.call_count == 2
+        assert mock_steps.call_count == 2
 
 
 def test_process_rss_echr(tmp_path, requests_mock):
@@ -254,6 +269,37 @@ def test_process_rss_echr(tmp_path, requests_mock):
     assert "ECHR Test Paragraph" in content
 
 
+def test_process_rss_cpu_pool_matches_threads(tmp_path, requests_mock):
+    """Test extraction and rendering in worker processes give the same files."""
+    from hudoc.core import cpu
+
+    with open("tests/data/echr_doc.html") as f:
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            "?library=ECHR&id=001-123456",
+            text=f.read(),
+        )
+    rss_file = Path("tests/data/echr_rss.xml")
+    process_rss(rss_file, tmp_path / "threads", evid=True)
+    try:
+        cpu.configure_cpu_workers(2)
+        process_rss(rss_file, tmp_path / "processes", evid=True)
+        assert cpu._pool is None  # shut down at the end of the run
+    finally:
+        cpu.configure_cpu_workers(0)
+
+    def files(root):
+        return {
+            p.relative_to(root): p.read_text(encoding="utf-8")
+            for p in root.rglob("*")
+            if p.is_file()
+        }
+
+    expected = files(tmp_path / "threads")
+    assert len(expected) == 2
+    assert files(tmp_path / "processes") == expected
+
+
 def test_parse_rss_url_success(requests_mock):
     """Test parse_rss_url with a valid RSS response."""
     url = "https://hudoc.echr.coe.int/app/rss/?library=ECHR"
@@ -297,10 +343,128 @@ def test_parse_rss_url_no_items(requests_mock):
     mock_logging.warning.assert_called_with("No items found in RSS feed")
 
 
+class _FeedBody:
+    """Response body serving ``chunks``, then blocking until ``release`` is set."""
+
+    closed = False
+    finished = False
+
+    def __init__(self, chunks, rest=b""):
+        import threading
+
+        self.chunks = list(chunks)
+        self.rest = rest
+        self.release = threading.Event()
+
+    def read(self, *args, **kwargs):
+        if self.chunks:
+            chunk = self.chunks.pop(0)
+            if isinstance(chunk, Exception):
+                raise chunk
+            return chunk
+        self.release.wait(5)
+        self.finished = True
+        rest, self.rest = self.rest, b""
+        return rest
+
+    def close(self):
+        self.closed = True
+
+
+def _feed_items(ids):
+    item = (
+        '<item><link>https://hudoc.echr.coe.int/eng#{{"itemid":["{}"]}}</link></item>'
+    )
+    return "".join(item.format(i) for i in ids).encode()
+
+
+def test_open_rss_url_streams_up_to_limit(requests_mock):
+    """Test items are parsed while the body arrives and the limit stops reading."""
+    from hudoc.core.parser import open_rss_url
+
+    url = "https://hudoc.echr.coe.int/app/rss/?library=ECHR"
+    # The first chunk is larger than a read of the spool, the rest blocks
+    body = _FeedBody(
+        [b"<rss><channel>" + _feed_items(range(2000))],
+        _feed_items(range(2000, 2010)) + b"</channel></rss>",
+    )
+    requests_mock.get(url, body=body)
+    with open_rss_url(url, limit=2) as (subsite, items):
+        assert subsite == "echr"
+        assert [item["doc_id"] for item in items] == ["0", "1"]
+        assert not body.finished
+        body.release.set()
+
+
+def test_open_rss_url_reads_ahead_of_consumer(requests_mock):
+    """Test the body keeps being read off the socket while the consumer waits."""
+    import io
+    import time
+
+    from hudoc.core.parser import open_rss_url
+
+    url = "https://hudoc.echr.coe.int/app/rss/?library=ECHR"
+    body = io.BytesIO(
+        b"<rss><channel>" + _feed_items(range(3000)) + b"</channel></rss>"
+    )
+    requests_mock.get(url, body=body)
+    with open_rss_url(url) as (subsite, items):
+        assert next(items)["doc_id"] == "0"
+        deadline = time.monotonic() + 5
+        while not body.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert body.closed
+        assert len(list(items)) == 2999
+
+
+def test_open_rss_url_fails_on_broken_stream(requests_mock):
+    """Test a feed cut off by the server fails instead of ending early."""
+    import requests
+    from urllib3.exceptions import ProtocolError
+
+    from hudoc.core.parser import open_rss_url
+
+    url = "https://hudoc.echr.coe.int/app/rss/?library=ECHR"
+    requests_mock.get(
+        url,
+        body=_FeedBody(
+            [
+                b"<rss><channel><item><link>https://hudoc.echr.coe.int/eng#",
+                ProtocolError("Connection broken"),
+            ]
+        ),
+    )
+    with patch("hudoc.core.parser.logging") as mock_logging:
+        with open_rss_url(url) as (subsite, items):
+            assert subsite is None
+            assert list(items) == []
+    assert mock_logging.error.call_args[0][0].startswith(
+        f"Failed to fetch RSS from {url}: "
+    )
+
+    # Once items are flowing, a broken transfer raises instead of ending them
+    requests_mock.get(
+        url,
+        body=_FeedBody(
+            [
+                b"<rss><channel>" + _feed_items(range(2000)),
+                ProtocolError("Connection broken"),
+            ]
+        ),
+    )
+    with open_rss_url(url) as (subsite, items):
+        assert subsite == "echr"
+        with pytest.raises(requests.RequestException):
+            list(items)
+
+
 def test_process_rss_url_no_subsite():
     """Test process_rss_url when no subsite detected."""
     with (
-        patch("hudoc.core.processor.parse_rss_url", return_value=(None, [])),
+        patch(
+            "hudoc.core.processor.open_rss_url",
+            return_value=nullcontext((None, iter([]))),
+        ),
         patch("hudoc.core.processor.logging") as mock_logging,
     ):
         process_rss_url("https://example.com/rss", "output")
@@ -310,7 +474,10 @@ def test_process_rss_url_no_subsite():
 def test_process_rss_url_no_items():
     """Test process_rss_url when no items."""
     with (
-        patch("hudoc.core.processor.parse_rss_url", return_value=("echr", [])),
+        patch(
+            "hudoc.core.processor.open_rss_url",
+            return_value=nullcontext(("echr", iter([]))),
+        ),
         patch("hudoc.core.processor.logging") as mock_logging,
     ):
         process_rss_url("https://example.com/rss", "output")
@@ -326,3 +493,939 @@ def test_download_document_no_text():
     ):
         download_document(item, "echr", "output", 2.0, False)
         mock_logging.warning.assert_called_with("No content retrieved for test")
+
+
+def test_get_session_shared_per_host():
+    """Test sessions are pooled per host and reused across calls."""
+    from hudoc.core.session import close_sessions, get_session
+
+    close_sessions()
+    a = get_session("https://hudoc.echr.coe.int/app/conversion/docx/html/body")
+    b = get_session("https://hudoc.echr.coe.int/eng#test")
+    c = get_session("https://hudoc.grevio.coe.int/eng#test")
+    assert a is b
+    assert a is not c
+    close_sessions()
+
+
+def test_configure_pool_resizes_adapter():
+    """Test configure_pool sizes the connection pool for new sessions."""
+    from hudoc.core.session import close_sessions, configure_pool, get_session
+
+    close_sessions()
+    configure_pool(25)
+    session = get_session("https://hudoc.echr.coe.int/")
+    assert session.get_adapter("https://hudoc.echr.coe.int/")._pool_maxsize == 25
+    configure_pool(10)
+    assert get_session("https://hudoc.echr.coe.int/") is not session
+    close_sessions()
+
+
+def test_process_rss_async_engine_matches_thread(tmp_path, requests_mock):
+    """Test the async engine writes the same output as the thread engine."""
+    rss_file = Path("tests/data/echr_rss.xml")
+    doc_id = "001-123456"
+    with open("tests/data/echr_doc.html") as f:
+        html_content = f.read()
+    requests_mock.get(
+        f"https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR&id={doc_id}",
+        text=html_content,
+    )
+
+    for engine in ("thread", "async"):
+        process_rss(
+            rss_file=rss_file,
+            output_dir=tmp_path / engine,
+            limit=3,
+            threads=2,
+            evid=False,
+            engine=engine,
+        )
+    thread_file = tmp_path / "thread" / f"echr_doc_{doc_id}.txt"
+    async_file = tmp_path / "async" / f"echr_doc_{doc_id}.txt"
+    assert async_file.read_text(encoding="utf-8") == thread_file.read_text(
+        encoding="utf-8"
+    )
+
+
+def test_download_document_async_triggers_conversion(tmp_path, requests_mock):
+    """Test the async download triggers conversion and retries without blocking."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from hudoc.core.async_engine import download_document_async
+
+    rss_link = 'https://hudoc.echr.coe.int/eng#{"itemid":"test"}'
+    requests_mock.get(rss_link, text="Conversion triggered")
+    requests_mock.get(
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR&id=test",
+        [
+            {"text": "<html><body></body></html>"},
+            {"text": "<html><body><p>Converted</p></body></html>"},
+        ],
+    )
+    item = {
+        "doc_id": "test",
+        "title": "Test",
+        "description": "Test",
+        "rss_link": rss_link,
+    }
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        asyncio.run(download_document_async(pool, item, "echr", tmp_path, 0.01))
+    content = (tmp_path / "echr_doc_test.txt").read_text(encoding="utf-8")
+    assert content.endswith("Converted")
+    assert requests_mock.request_history[1].path == "/eng"
+
+
+def test_process_rss_skips_saved_documents(tmp_path, requests_mock):
+    """Test documents already in the output directory are not fetched again."""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    (output_dir / "echr_doc_001-123456.txt").write_text("done", encoding="utf-8")
+
+    process_rss(Path("tests/data/echr_rss.xml"), output_dir, evid=False)
+    assert requests_mock.call_count == 0
+    assert (output_dir / "echr_doc_001-123456.txt").read_text() == "done"
+
+
+def test_document_cache_evicts_by_age_and_size(tmp_path):
+    """Test cache eviction drops expired entries and then the oldest ones."""
+    import json
+
+    from hudoc.core.cache import DocumentCache
+
+    cache = DocumentCache(tmp_path, max_age=100, max_bytes=10)
+    for url in ("a", "b", "c"):
+        cache.put(url, "x" * 6)
+    expired = cache._paths("a")[1]
+    meta = json.loads(expired.read_text())
+    meta["stored_at"] -= 1000
+    expired.write_text(json.dumps(meta))
+
+    cache.evict()
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_run_downloads_starts_before_feed_is_read(tmp_path):
+    """Test the first download runs while the feed is still being produced."""
+    import threading
+
+    from hudoc.core.processor import _run_downloads
+
+    first_downloaded = threading.Event()
+    overlapped = []
+
+    def feed():
+        yield {"doc_id": "1"}
+        overlapped.append(first_downloaded.wait(timeout=5))
+        yield {"doc_id": "2"}
+
+    def fake_download(item, *args, **kwargs):
+        if item["doc_id"] == "1":
+            first_downloaded.set()
+
+    def fake_steps(item, *args, **kwargs):
+        fake_download(item)
+        yield from ()
+
+    async def fake_download_async(pool, item, *args, **kwargs):
+        fake_download(item)
+
+    with (
+        patch("hudoc.core.processor.download_steps", fake_steps),
+        patch("hudoc.core.async_engine.download_document_async", fake_download_async),
+    ):
+        for engine in ("thread", "async"):
+            first_downloaded.clear()
+            _run_downloads("echr", feed(), tmp_path, 0, 2, 0.0, False, engine)
+    assert overlapped == [True, True]
+
+
+def test_run_downloads_bounds_in_flight_and_survives_failures(tmp_path):
+    """Test the feed is read only as slots free up and a failure stops nothing."""
+    import threading
+
+    from hudoc.core.metrics import metrics
+    from hudoc.core.processor import _run_downloads
+    from hudoc.core.scheduler import IN_FLIGHT_PER_WORKER
+
+    lock = threading.Lock()
+    finished = []
+    backlog = []
+
+    def feed():
+        for n in range(60):
+            with lock:
+                backlog.append(n - len(finished))
+            yield {"doc_id": str(n)}
+
+    def fake_download(item):
+        with lock:
+            finished.append(item["doc_id"])
+        if item["doc_id"] == "3":
+            raise RuntimeError("broken document")
+
+    def fake_steps(item, *args, **kwargs):
+        if int(item["doc_id"]) % 5 == 0:
+            yield 0.01  # waiting for conversion
+        fake_download(item)
+
+    async def fake_download_async(pool, item, *args, **kwargs):
+        fake_download(item)
+
+    with (
+        patch("hudoc.core.processor.download_steps", fake_steps),
+        patch("hudoc.core.async_engine.download_document_async", fake_download_async),
+    ):
+        for engine in ("thread", "async"):
+            metrics.reset()
+            finished.clear()
+            backlog.clear()
+            _run_downloads("echr", feed(), tmp_path, 0, 2, 0.0, False, engine)
+            assert len(finished) == 60
+            assert max(backlog) <= 2 * IN_FLIGHT_PER_WORKER
+            assert metrics.value("failures", "echr") == 1
+
+
+def test_process_rss_url_pipelined(tmp_path, requests_mock):
+    """Test process_rss_url starts downloads before the feed is fully read."""
+    url = "https://hudoc.echr.coe.int/app/transform/rss"
+    # The rest of the feed is held back until the first document is requested
+    padding = b"<!--" + b" " * 128 * 1024 + b"-->"
+    body = _FeedBody(
+        [b"<rss><channel>" + _feed_items(["001-999"]) + padding],
+        _feed_items(["001-998"]) + b"</channel></rss>",
+    )
+    requests_mock.get(url, body=body)
+    feed_read_first = []
+
+    def first_document(request, context):
+        feed_read_first.append(body.finished)
+        body.release.set()
+        return "<p>Streamed</p>"
+
+    base = "https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR"
+    requests_mock.get(f"{base}&id=001-999", text=first_document)
+    requests_mock.get(f"{base}&id=001-998", text="<p>Later</p>")
+    process_rss_url(url, tmp_path, limit=0, threads=2)
+    assert feed_read_first == [False]
+    content = (tmp_path / "echr_doc_001-999.txt").read_text(encoding="utf-8")
+    assert content.endswith("Streamed")
+    assert (tmp_path / "echr_doc_001-998.txt").exists()
+
+
+def test_extract_text_stream_matches_bs4():
+    """Test the streaming extractor reproduces the BeautifulSoup output."""
+    from hudoc.core.extract import (
+        TextExtractor,
+        extract_text_bs4,
+        extract_text_stream,
+    )
+
+    documents = [
+        Path("tests/data/echr_doc.html").read_text(),
+        Path("tests/data/grevio_doc.html").read_text(),
+        "<p>a<p>b</p>c</p><li><p>b</p></li>",
+        "<p>a<template>t</template>b<rt>r</rt></p><h3>a b c</h3>",
+        "<p>a &foo; &amp b &#128; &#x; &nbsp;x</p><p>a<br>b</br>c</p>",
+        "<p>x<!-- note -->y<![CDATA[cd]]>z<script>var p;</script></p>",
+        "<!DOCTYPE html><h1>Title</h1><p/><p>  </p><div><li>open",
+        "<style>p{}</style><ul><li>One<li>Two</ul></span><h2>One</h2>",
+    ]
+    for html in documents:
+        assert extract_text_stream(html) == extract_text_bs4(html)
+        # Fed in pieces, as while a body is downloaded
+        for size in (1, 7):
+            extractor = TextExtractor()
+            for start in range(0, len(html), size):
+                extractor.feed(html[start : start + size])
+            assert extractor.close() == extract_text_bs4(html)
+
+
+def test_set_extractor():
+    """Test selecting the extractor used by extract_text."""
+    import pytest
+
+    from hudoc.core import extract
+
+    try:
+        extract.set_extractor("bs4")
+        assert extract.extract_text("<p>One</p><p>One</p>") == "One"
+        with pytest.raises(ValueError):
+            extract.set_extractor("missing")
+    finally:
+        extract.set_extractor(extract.DEFAULT_EXTRACTOR)
+
+
+def test_waiting_document_releases_worker(tmp_path):
+    """Test a document waiting for conversion does not hold the only worker."""
+    from hudoc.core.processor import _run_downloads
+
+    finished = []
+
+    def fake_steps(item, *args, **kwargs):
+        if item["doc_id"] == "slow":
+            yield 0.5  # waiting for conversion
+        finished.append(item["doc_id"])
+
+    with patch("hudoc.core.processor.download_steps", fake_steps):
+        _run_downloads(
+            "echr",
+            iter([{"doc_id": "slow"}, {"doc_id": "fast"}]),
+            tmp_path,
+            0,
+            1,
+            0.0,
+            False,
+        )
+    assert finished == ["fast", "slow"]
+
+
+def test_conversion_latency_adapts_and_persists(tmp_path):
+    """Test conversion waits follow observed latency and survive a restart."""
+    from hudoc.core.conversion import ConversionLatency
+
+    path = tmp_path / "state" / "latency.json"
+    latency = ConversionLatency.load(path)
+    assert latency.delay("ECHR", 0, 2.0) == pytest.approx(1.6)
+    latency.observe("ECHR", 10.0)
+    assert latency.delay("ECHR", 0, 2.0) == pytest.approx(8.0)
+    assert latency.delay("ECHR", 1, 2.0) == pytest.approx(16.0)
+    latency.observe("ECHR", 5.0)
+    latency.save()
+
+    restored = ConversionLatency.load(path)
+    assert restored.estimate("ECHR", 2.0) == pytest.approx(9.0)
+    assert restored.estimate("CPT", 2.0) == 2.0
+
+
+def test_get_document_text_records_conversion_latency(requests_mock):
+    """Test a successful conversion wait is recorded for the library."""
+    from hudoc.core.conversion import ConversionLatency
+    from hudoc.utils import get_document_text
+
+    rss_link = 'https://hudoc.echr.coe.int/eng#{"itemid":"test"}'
+    requests_mock.get(rss_link, text="Conversion triggered")
+    requests_mock.get(
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR&id=test",
+        [
+            {"text": "<html><body></body></html>"},
+            {"text": "<html><body><p>Converted</p></body></html>"},
+        ],
+    )
+    latency = ConversionLatency()
+    with patch("time.sleep") as mock_sleep:
+        text = get_document_text(
+            "test",
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body",
+            "ECHR",
+            rss_link=rss_link,
+            conversion_delay=2.0,
+            latency=latency,
+        )
+    assert text == "Converted"
+    mock_sleep.assert_called_once_with(pytest.approx(1.6))
+    assert latency.estimate("ECHR", None) is not None
+
+
+def test_host_limiter_aimd():
+    """Test concurrency grows on healthy responses and halves on overload."""
+    from hudoc.core.throttle import HostLimiter
+
+    limiter = HostLimiter(rate=0, max_concurrency=8, initial_concurrency=2)
+    for _ in range(60):
+        limiter.acquire()
+        limiter.release(0.1, status=200)
+    assert limiter.limit == 8
+
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release(0.1, status=503)
+    # A second failure from the same round does not decrease again
+    limiter.release(0.1, status=503)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_host_limiter_honors_retry_after():
+    """Test a Retry-After pause delays the next request."""
+    import time
+
+    from hudoc.core.throttle import HostLimiter, parse_retry_after
+
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+    limiter = HostLimiter(rate=0)
+    limiter.acquire()
+    limiter.release(0.01, status=429, retry_after=0.2)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_host_limiter_token_bucket():
+    """Test requests beyond the burst wait for tokens."""
+    import time
+
+    from hudoc.core.throttle import HostLimiter
+
+    limiter = HostLimiter(rate=20, burst=2, max_concurrency=10)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert time.monotonic() - started >= 0.09
+
+
+def test_session_reports_to_host_limiter(requests_mock):
+    """Test requests through the shared session feed the host limiter."""
+    from hudoc.core.session import close_sessions, get_limiter, get_session
+
+    url = "https://hudoc.throttle.test/doc"
+    requests_mock.get(url, status_code=429, headers={"Retry-After": "0"})
+    limiter = get_limiter("hudoc.throttle.test")
+    before = limiter.limit
+    assert get_session(url).get(url).status_code == 429
+    assert limiter.limit < before or limiter.limit == 1
+    assert limiter.in_flight == 0
+    close_sessions()
+
+
+def _feed_page(doc_ids):
+    items = "".join(
+        f"<item><title>Case {doc_id}</title>"
+        f"<pubDate>Mon, 0{n} Jan 2024 00:00:00 GMT</pubDate>"
+        f'<link>http://hudoc.echr.coe.int/eng#{{"itemid":["{doc_id}"]}}</link></item>'
+        for n, doc_id in doc_ids
+    )
+    return f"<rss><channel>{items}</channel></rss>"
+
+
+def _mock_feed_pages(requests_mock, pages):
+    from hudoc.core.constants import rss_page_url
+
+    start = 1
+    for page in pages:
+        requests_mock.get(rss_page_url("echr", start), text=_feed_page(page))
+        start += 2
+    requests_mock.get(rss_page_url("echr", start), text=_feed_page([]))
+
+
+def test_harvest_items_walks_all_pages(requests_mock):
+    """Test the harvest follows the pages and drops items repeated across them."""
+    from hudoc.core.harvest import harvest_items
+
+    _mock_feed_pages(
+        requests_mock,
+        [[(9, "a"), (8, "b")], [(8, "b"), (7, "c")], [(6, "d"), (5, "e")]],
+    )
+    items = harvest_items("echr", workers=2)
+    assert [item["doc_id"] for item in items] == ["a", "b", "c", "d", "e"]
+
+
+def test_harvest_retries_failed_page(requests_mock):
+    """Test a page that fails once is retried instead of ending the feed."""
+    from hudoc.core.constants import rss_page_url
+    from hudoc.core.harvest import harvest_items
+
+    _mock_feed_pages(requests_mock, [[(9, "a"), (8, "b")], [(7, "c"), (6, "d")]])
+    requests_mock.get(
+        rss_page_url("echr", 3),
+        [{"status_code": 503}, {"text": _feed_page([(7, "c"), (6, "d")])}],
+    )
+    with patch("hudoc.core.harvest.PAGE_RETRY_DELAY", 0):
+        items = list(harvest_items("echr", workers=1))
+    assert [item["doc_id"] for item in items] == ["a", "b", "c", "d"]
+
+
+def test_harvest_counts_malformed_items_in_page_size(requests_mock):
+    """Test a full page with a malformed item is not taken for the last page."""
+    from hudoc.core.constants import rss_page_url
+    from hudoc.core.harvest import harvest_items
+
+    # Pages of three items; the first two each have a malformed one
+    bad = "<item><link>http://hudoc.echr.coe.int/eng#invalid</link></item>"
+    bodies = [
+        _feed_page([(9, "1"), (8, "2")]).replace("</channel>", bad + "</channel>"),
+        _feed_page([(6, "4"), (5, "6")]).replace("</item>", "</item>" + bad, 1),
+        _feed_page([(4, "7"), (3, "8")]),
+    ]
+    for n, body in enumerate(bodies):
+        requests_mock.get(rss_page_url("echr", 1 + 3 * n), text=body)
+    items = harvest_items("echr", workers=2)
+    assert [item["doc_id"] for item in items] == ["1", "2", "4", "6", "7", "8"]
+
+
+def test_harvest_fails_on_missing_page(tmp_path, requests_mock):
+    """Test a page that keeps failing fails the harvest and keeps the sync mark."""
+    from hudoc.core.constants import rss_page_url
+    from hudoc.core.harvest import HarvestError
+    from hudoc.core.processor import process_harvest, process_sync
+    from hudoc.core.sync import SyncState
+
+    _mock_feed_pages(requests_mock, [[(9, "a"), (8, "b")], [(7, "c"), (6, "d")]])
+    requests_mock.get(rss_page_url("echr", 3), status_code=503)
+    for doc_id in "ab":
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            f"?library=ECHR&id={doc_id}",
+            text=f"<p>Document {doc_id}</p>",
+        )
+    state_path = tmp_path / "state.json"
+    with patch("hudoc.core.harvest.PAGE_RETRY_DELAY", 0):
+        with pytest.raises(HarvestError, match="page at item 3 after 3 attempts"):
+            process_harvest("echr", tmp_path / "harvest", threads=2)
+        with pytest.raises(HarvestError, match="Sync of echr is incomplete"):
+            process_sync(["echr"], tmp_path, SyncState.load(state_path))
+    assert (tmp_path / "harvest" / "echr_doc_a.txt").exists()
+    assert SyncState.load(state_path).mark("echr") is None
+
+
+def test_harvest_stops_at_boundary(tmp_path, requests_mock):
+    """Test the harvest stops at a known document and downloads the newer ones."""
+    _mock_feed_pages(requests_mock, [[(5, "a"), (4, "b")], [(3, "c"), (2, "d")]])
+    for doc_id in "abcd":
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            f"?library=ECHR&id={doc_id}",
+            text=f"<p>Document {doc_id}</p>",
+        )
+    (tmp_path / "echr_doc_c.txt").write_text("done", encoding="utf-8")
+
+    from hudoc.core.processor import process_harvest
+
+    process_harvest("echr", tmp_path, threads=2, stop_at_saved=True)
+    assert sorted(p.name for p in tmp_path.glob("*.txt")) == [
+        "echr_doc_a.txt",
+        "echr_doc_b.txt",
+        "echr_doc_c.txt",
+    ]
+
+
+def test_harvest_boundary_by_id_and_date(tmp_path):
+    """Test the boundary predicate for a document ID and a date."""
+    from hudoc.core.harvest import harvest_boundary
+
+    reached = harvest_boundary(
+        "echr", tmp_path, False, until_id="x", since="2024-01-03"
+    )
+    assert reached({"doc_id": "x", "verdict_date": "2024-02-01"})
+    assert reached({"doc_id": "y", "verdict_date": "2024-01-02"})
+    assert not reached({"doc_id": "y", "verdict_date": "2024-01-03"})
+    assert not reached({"doc_id": "y", "verdict_date": None})
+
+
+def test_subsites_share_workers_with_per_host_cap(tmp_path):
+    """Test several subsites download together without exceeding the host cap."""
+    import threading
+    import time
+
+    from hudoc.core.constants import SUBSITE_CONFIG
+    from hudoc.core.processor import process_subsites_latest
+
+    feeds = {
+        SUBSITE_CONFIG[s]["rss_url"]: (
+            s,
+            iter([{"doc_id": f"{s}-{n}"} for n in range(4)]),
+        )
+        for s in ("echr", "grevio")
+    }
+    lock = threading.Lock()
+    running = {"echr": 0, "grevio": 0}
+    peak = {"echr": 0, "grevio": 0}
+    overlap = []
+
+    def fake_steps(item, subsite, *args, **kwargs):
+        with lock:
+            running[subsite] += 1
+            peak[subsite] = max(peak[subsite], running[subsite])
+            overlap.append(all(running.values()))
+        time.sleep(0.02)
+        with lock:
+            running[subsite] -= 1
+        yield from ()
+
+    with (
+        patch(
+            "hudoc.core.processor.open_rss_url",
+            side_effect=lambda url, limit: nullcontext(feeds[url]),
+        ),
+        patch("hudoc.core.processor.download_steps", fake_steps),
+    ):
+        process_subsites_latest(
+            ["echr", "grevio"], tmp_path, limit=0, threads=4, per_host=2
+        )
+    assert max(peak.values()) <= 2
+    assert any(overlap)
+
+
+def test_metrics_export_formats(tmp_path):
+    """Test counters and histograms render as Prometheus text and JSON."""
+    import json
+
+    from hudoc.core.metrics import Metrics
+
+    registry = Metrics()
+    registry.inc("documents", "echr", 2)
+    registry.observe("fetch_seconds", "echr", 0.2)
+    registry.observe("fetch_seconds", "echr", 3.0)
+    text = registry.to_prometheus()
+    assert "# TYPE hudoc_documents_total counter" in text
+    assert 'hudoc_documents_total{subsite="echr"} 2' in text
+    assert 'hudoc_fetch_seconds_bucket{subsite="echr",le="0.25"} 1' in text
+    assert 'hudoc_fetch_seconds_bucket{subsite="echr",le="5.0"} 2' in text
+    assert 'hudoc_fetch_seconds_bucket{subsite="echr",le="+Inf"} 2' in text
+    assert 'hudoc_fetch_seconds_count{subsite="echr"} 2' in text
+
+    path = tmp_path / "metrics.json"
+    registry.write(path, "json")
+    data = json.loads(path.read_text())
+    assert data["counters"]["documents"] == {"echr": 2}
+    assert data["histograms"]["fetch_seconds"]["echr"]["sum"] == pytest.approx(3.2)
+
+
+def test_progress_snapshot_and_line():
+    """Test progress rates, remaining documents and ETA come from the metrics."""
+    from hudoc.core.metrics import metrics
+    from hudoc.core.progress import format_progress, progress_snapshot
+
+    metrics.reset()
+    metrics.inc("documents", "echr", 4)  # before the run started
+    start = {"documents": 4}
+    metrics.add("feeds_reading", "echr", 1)
+    metrics.add("in_flight", "echr", 2)
+    metrics.add("waiting_conversion", "echr", 1)
+    metrics.inc("documents", "echr", 3)
+    metrics.inc("bytes_downloaded", "echr", 4096)
+    try:
+        snapshot = progress_snapshot(2.0, total=10, start=start)
+        assert snapshot["done"] == 3
+        assert snapshot["remaining"] == 7
+        assert snapshot["docs_per_second"] == 1.5
+        assert snapshot["eta_seconds"] == 5
+        assert format_progress(snapshot, bar=True) == (
+            "[######--------------] 3/10 docs (30%) | 1.5 docs/s, 2.0 KB/s | "
+            "2 in flight, 1 waiting for conversion, 0 failed | ETA 5s"
+        )
+        # Without a total, the documents left are unknown until the feed is read
+        assert progress_snapshot(2.0, start=start)["eta_seconds"] is None
+        metrics.add("feeds_reading", "echr", -1)
+        assert progress_snapshot(2.0, start=start)["remaining"] == 2
+    finally:
+        metrics.reset()
+
+
+def test_report_progress_json(tmp_path, requests_mock, capsys):
+    """Test the JSON progress mode prints a final machine-readable line."""
+    import json
+
+    from hudoc.core.progress import report_progress
+
+    with open("tests/data/echr_doc.html") as f:
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            "?library=ECHR&id=001-123456",
+            text=f.read(),
+        )
+    with report_progress("json", 0, total=3):
+        process_rss(Path("tests/data/echr_rss.xml"), tmp_path)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    snapshot = json.loads(lines[0])
+    assert snapshot["saved"] == 1
+    assert snapshot["in_flight"] == snapshot["remaining"] == 0
+    assert snapshot["bytes_per_second"] > 0
+
+
+def test_run_collects_metrics(tmp_path, requests_mock):
+    """Test a run records fetches, bytes, skips and saved documents per subsite."""
+    from hudoc.core.metrics import export_metrics, metrics
+
+    with open("tests/data/echr_doc.html") as f:
+        html_content = f.read()
+    requests_mock.get(
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+        "?library=ECHR&id=001-123456",
+        text=html_content,
+    )
+    metrics.reset()
+    path = tmp_path / "hudoc.prom"
+    with export_metrics(path):
+        process_rss(Path("tests/data/echr_rss.xml"), tmp_path / "out", evid=False)
+        process_rss(Path("tests/data/echr_rss.xml"), tmp_path / "out", evid=False)
+    assert metrics.value("documents", "echr") == 1
+    assert metrics.value("skipped", "echr") == 1
+    assert metrics.value("fetch_seconds", "echr") == 1
+    assert metrics.value("bytes_downloaded", "echr") == len(html_content.encode())
+    assert 'hudoc_rss_items_total{subsite="echr"} 2' in path.read_text()
+
+
+@pytest.mark.parametrize(
+    "fmt,compression",
+    [("tar", "gzip"), ("tar", "none"), ("jsonl", "lzma"), ("zip", "gzip")],
+)
+def test_archive_appends_and_reads_back(tmp_path, fmt, compression):
+    """Test documents from two runs are appended to one archive and read by index."""
+    import tarfile
+
+    from hudoc.core.archive import Archive, archive_format, read_document
+
+    with Archive(tmp_path, fmt, compression) as archive:
+        archive.add("001-1", "echr", [("a/label.typ", "One"), ("a/info.yml", "x: 1")])
+    with Archive(tmp_path, fmt, compression) as archive:
+        assert archive.contains("001-1", "echr")
+        assert not archive.contains("001-1", "cpt")
+        archive.add("001-2", "echr", [("echr_doc_001-2.txt", "Två")])
+
+    path = archive.path
+    assert archive_format(path) == (fmt, "none" if fmt == "zip" else compression)
+    assert read_document(path, "001-1") == [
+        ("a/label.typ", "One"),
+        ("a/info.yml", "x: 1"),
+    ]
+    assert read_document(path, "001-2", "echr") == [("echr_doc_001-2.txt", "Två")]
+    assert read_document(path, "001-3") is None
+    if fmt == "tar":
+        # The per-document members still form one valid tar file
+        with tarfile.open(path) as members:
+            assert members.getnames() == [
+                "a/label.typ",
+                "a/info.yml",
+                "echr_doc_001-2.txt",
+            ]
+
+
+def test_archive_drops_interrupted_write(tmp_path):
+    """Test bytes after the last indexed document are cut off on reopening."""
+    import json
+
+    from hudoc.core.archive import Archive, read_document
+
+    with Archive(tmp_path, "jsonl", "none") as archive:
+        archive.add("001-1", "echr", [("one.txt", "One")])
+    with open(archive.path, "ab") as f:
+        f.write(b'{"doc_id": "001-2", "fi')
+    with open(archive.index_path, "ab") as f:
+        f.write(b'{"doc_id": "001-2"')
+    with Archive(tmp_path, "jsonl", "none") as archive:
+        archive.add("001-3", "echr", [("three.txt", "Three")])
+    lines = archive.path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["doc_id"] for line in lines] == ["001-1", "001-3"]
+    assert read_document(archive.path, "001-3") == [("three.txt", "Three")]
+
+
+@pytest.mark.parametrize("fmt", ["tar", "jsonl", "zip"])
+def test_archive_reads_earlier_versions(tmp_path, fmt):
+    """Test every version of a revised document can be read back."""
+    from hudoc.core.archive import Archive, read_document
+
+    with Archive(tmp_path, fmt, "gzip") as archive:
+        archive.add("001-1", "echr", [("a/label.typ", "First")], version=1)
+        archive.add("001-1", "echr", [("a/label.typ", "Second")], version=2)
+    assert read_document(archive.path, "001-1") == [("a/label.typ", "Second")]
+    assert read_document(archive.path, "001-1", version=1) == [("a/label.typ", "First")]
+    assert read_document(archive.path, "001-1", version=3) is None
+
+
+def test_archive_rejects_interrupted_zip(tmp_path):
+    """Test a zip file without its central directory is not appended to."""
+    from hudoc.core.archive import Archive
+
+    with Archive(tmp_path, "zip", "gzip") as archive:
+        archive.add("001-1", "echr", [("one.txt", "One")])
+    data = archive.path.read_bytes()
+    archive.path.write_bytes(data[: data.rindex(b"PK\x01\x02")])
+    with pytest.raises(ValueError, match="not a complete zip file"):
+        Archive(tmp_path, "zip", "gzip")
+    assert len(archive.path.read_bytes()) < len(data)
+
+
+@pytest.mark.parametrize("fmt", ["tar", "jsonl", "zip"])
+def test_archive_rejects_stale_index(tmp_path, fmt):
+    """Test an index left behind by a moved or cut archive is not reused."""
+    from hudoc.core.archive import Archive
+
+    with Archive(tmp_path, fmt, "gzip") as archive:
+        archive.add("001-1", "echr", [("one.txt", "One")])
+    moved = archive.path.rename(tmp_path / "moved")
+    with pytest.raises(ValueError, match="move both away"):
+        Archive(tmp_path, fmt, "gzip")
+    assert not archive.path.exists()
+    if fmt != "zip":
+        archive.path.write_bytes(moved.read_bytes()[:10])
+    else:
+        with Archive(tmp_path / "other", fmt, "gzip") as other:
+            other.add("001-2", "echr", [("two.txt", "Two")])
+        other.path.rename(archive.path)
+    with pytest.raises(ValueError, match="move both away"):
+        Archive(tmp_path, fmt, "gzip")
+
+
+def test_process_rss_into_archive(tmp_path, requests_mock):
+    """Test a run writes evid documents to the archive and skips them next time."""
+    from hudoc.core.archive import Archive, read_document
+
+    with open("tests/data/echr_doc.html") as f:
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            "?library=ECHR&id=001-123456",
+            text=f.read(),
+        )
+    output_dir = tmp_path / "out"
+    for _ in range(2):
+        with Archive(output_dir, "tar", "gzip") as store:
+            process_rss(
+                Path("tests/data/echr_rss.xml"), output_dir, evid=True, store=store
+            )
+    assert requests_mock.call_count == 1
+    assert sorted(p.name for p in output_dir.iterdir()) == [
+        "hudoc.tar.gz",
+        "hudoc.tar.gz.idx",
+    ]
+    names = [name for name, _ in read_document(store.path, "001-123456")]
+    assert [name.rpartition("/")[2] for name in names] == ["label.typ", "info.yml"]
+
+
+def test_document_database_saves_in_batches_and_searches(tmp_path):
+    """Test documents are upserted by the writer and found by full-text search."""
+    import sqlite3
+
+    from hudoc.core import database
+    from hudoc.core.database import DocumentDatabase, search
+
+    def item(doc_id, title):
+        return {
+            "doc_id": doc_id,
+            "title": title,
+            "description": "Chamber Judgment",
+            "verdict_date": "2024-01-02",
+        }
+
+    with DocumentDatabase(tmp_path) as db:
+        db.save("The journalist was convicted.", item("001-1", "CASE OF A"), "echr")
+        db.save("Freedom of assembly.", item("001-2", "CASE OF B"), "echr")
+    with (
+        patch.object(database, "BATCH_SIZE", 1),
+        DocumentDatabase(tmp_path) as db,
+    ):
+        assert db.contains("001-1", "echr")
+        assert not db.contains("001-1", "cpt")
+        # A re-download replaces the text in the index too
+        db.save("The journalist was acquitted.", item("001-1", "CASE OF A"), "echr")
+
+    results = search(db.path, "journalist")
+    assert [r["doc_id"] for r in results] == ["001-1"]
+    assert results[0]["snippet"] == "The [journalist] was acquitted."
+    assert results[0]["url"] == 'https://hudoc.echr.coe.int/eng#{"itemid":["001-1"]}'
+    assert search(db.path, "convicted") == []
+    assert search(db.path, "freedom", subsite="cpt") == []
+    assert [r["doc_id"] for r in search(db.path, '"freedom of assembly"')] == ["001-2"]
+    with sqlite3.connect(db.path) as connection:
+        versions = connection.execute("SELECT doc_id, text FROM document_versions")
+        assert list(versions) == [("001-1", "The journalist was convicted.")]
+
+
+def test_content_index_records_versions_and_duplicates(tmp_path):
+    """Test the content index tells new, unchanged, changed and duplicate texts."""
+    from hudoc.core.versions import ContentIndex
+
+    path = tmp_path / "content_index.jsonl"
+    index = ContentIndex(path)
+    assert index.record("echr", "001-1", "text A").status == "new"
+    assert index.record("echr", "001-1", "text A").status == "unchanged"
+    revision = index.record("echr", "001-1", "text B")
+    assert (revision.status, revision.version) == ("changed", 2)
+    duplicate = index.record("cpt", "CPT-1", "text B")
+    assert (duplicate.status, duplicate.duplicate_of) == ("new", ("echr", "001-1"))
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+    # A later run knows the recorded texts
+    index = ContentIndex(path)
+    assert index.record("echr", "001-1", "text B").status == "unchanged"
+    assert index.record("echr", "001-2", "text A").duplicate_of == ("echr", "001-1")
+
+
+def test_process_rss_keeps_revised_documents(tmp_path, requests_mock):
+    """Test a recheck saves a revised text as a new version next to the old one."""
+    from hudoc.core.metrics import metrics
+    from hudoc.core.versions import ContentIndex
+
+    url = (
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+        "?library=ECHR&id=001-123456"
+    )
+    output_dir = tmp_path / "out"
+    index_path = output_dir / ".hudoc" / "content_index.jsonl"
+    saved = output_dir / "echr_doc_001-123456.txt"
+
+    def run(body, recheck):
+        requests_mock.get(url, text=f"<html><body><p>{body}</p></body></html>")
+        process_rss(
+            Path("tests/data/echr_rss.xml"),
+            output_dir,
+            versions=ContentIndex(index_path, recheck=recheck),
+        )
+
+    metrics.reset()
+    run("First text", recheck=False)
+    run("First text", recheck=False)
+    assert requests_mock.call_count == 1
+    run("First text", recheck=True)
+    assert metrics.value("unchanged", "echr") == 1
+    run("Revised text", recheck=True)
+    assert metrics.value("revisions", "echr") == 1
+    assert "Revised text" in saved.read_text(encoding="utf-8")
+    old = output_dir / "echr_doc_001-123456.v1.txt"
+    assert "First text" in old.read_text(encoding="utf-8")
+
+
+def test_sync_reads_down_to_the_mark(tmp_path, requests_mock):
+    """Test a second sync only downloads documents newer than the first one's mark."""
+    from hudoc.core.processor import process_sync
+    from hudoc.core.sync import SyncState
+
+    for doc_id in "abcde":
+        requests_mock.get(
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+            f"?library=ECHR&id={doc_id}",
+            text=f"<p>Document {doc_id}</p>",
+        )
+    state_path = tmp_path / "state.json"
+    _mock_feed_pages(requests_mock, [[(5, "a"), (5, "b")], [(4, "c"), (3, "d")]])
+    process_sync(["echr"], tmp_path, SyncState.load(state_path), since="2024-01-04")
+    assert SyncState.load(state_path).mark("echr") == ("2024-01-05", {"a", "b"})
+
+    _mock_feed_pages(requests_mock, [[(6, "e"), (5, "b")], [(5, "a"), (4, "c")]])
+    process_sync(["echr"], tmp_path, SyncState.load(state_path))
+    assert SyncState.load(state_path).mark("echr") == ("2024-01-06", {"e"})
+    fetched = [
+        r.qs["id"][0] for r in requests_mock.request_history if "conversion" in r.path
+    ]
+    assert sorted(fetched) == ["a", "b", "c", "e"]
+
+
+def test_sync_mark_stays_before_unsaved_documents():
+    """Test the mark holds at a failed document and at a walk that fell short."""
+    import itertools
+
+    from hudoc.core.sync import SyncState
+
+    def item(doc_id, day):
+        return {"doc_id": doc_id, "verdict_date": f"2024-01-0{day}"}
+
+    feed = [item("n", 5), item("f", 4), item("x", 3), item("y", 3), item("o", 2)]
+    state = SyncState(marks={"echr": {"verdict_date": "2024-01-03", "doc_ids": ["x"]}})
+    stop = state._stop("echr", "")
+    read = state._track("echr", itertools.takewhile(lambda i: not stop(i), feed))
+    assert [i["doc_id"] for i in read] == ["n", "f", "y"]
+    state.advance("echr", lambda doc_id: doc_id != "f")
+    assert state.mark("echr") == ("2024-01-04", set())
+
+    # A walk that ends before reaching the mark keeps it
+    list(state._track("echr", iter(feed[:1])))
+    state.advance("echr", lambda doc_id: True)
+    assert state.mark("echr") == ("2024-01-04", set())
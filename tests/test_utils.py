@@ -8,8 +8,11 @@ from hudoc.utils import (
     save_text,
     trigger_document_conversion,
     clean_text_for_typst,
+    clean_texts_for_typst,
     typst_dict,
     save_evid,
+    is_saved,
+    saved_entries,
 )
 
 
@@ -163,6 +166,43 @@ def test_get_document_text_all_attempts_fail(requests_mock):
         )
 
 
+def test_get_document_text_decodes_declared_charset(requests_mock):
+    """Test bodies are decoded with the declared charset, else as UTF-8."""
+    base_url = "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+    url = f"{base_url}?library=ECHR&id=test"
+    html = "<html><body><p>Arrêt définitif</p></body></html>"
+    requests_mock.get(
+        url,
+        content=html.encode("latin-1"),
+        headers={"Content-Type": "text/html; charset=ISO-8859-1"},
+    )
+    assert get_document_text("test", base_url, "ECHR") == "Arrêt définitif"
+    requests_mock.get(
+        url, content=html.encode("utf-8"), headers={"Content-Type": "text/html"}
+    )
+    assert get_document_text("test", base_url, "ECHR") == "Arrêt définitif"
+
+
+def test_get_document_text_size_limit(requests_mock, monkeypatch):
+    """Test a body over the size limit is abandoned without retries."""
+    monkeypatch.setattr("hudoc.utils._max_document_bytes", 1024)
+    rss_link = 'https://hudoc.echr.coe.int/eng#{"itemid":"test"}'
+    requests_mock.get(rss_link, status_code=200)
+    requests_mock.get(
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR&id=test",
+        content=b"<p>" + b"x" * 100_000 + b"</p>",
+    )
+    with patch("time.sleep"):
+        text = get_document_text(
+            "test",
+            "https://hudoc.echr.coe.int/app/conversion/docx/html/body",
+            "ECHR",
+            rss_link=rss_link,
+        )
+    assert text is None
+    assert requests_mock.call_count == 1
+
+
 def test_get_document_text_empty_attempt(requests_mock):
     """Test empty content on attempt."""
     doc_id = "test"
@@ -219,6 +259,40 @@ def test_clean_text_for_typst():
     assert cleaned == 'Test \\# \\* \\_ \\~ \\^ \\` \\" \\$ \\< \\> \n\n'
 
 
+def _reference_clean_text_for_typst(text):
+    """Character-by-character escaper that clean_text_for_typst must match."""
+    import re
+
+    text = re.sub(r"(\n\s*\n)+", r"\n\n", text)
+    escapes = {c: "\\" + c for c in '\\#*_~^`"$<>'}
+    return "".join(escapes.get(c, c) for c in text)
+
+
+def _random_texts(count, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    alphabet = 'ab #*_~^`"$<>\\\n\n\t \r\x0b\x1c\u00a0\u2028é€'
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        for _ in range(count)
+    ]
+
+
+def test_clean_text_for_typst_matches_reference():
+    """Property test: clean_text_for_typst matches the per-character reference."""
+    for text in _random_texts(2000):
+        assert clean_text_for_typst(text) == _reference_clean_text_for_typst(text)
+
+
+def test_clean_texts_for_typst_batch():
+    """Test batch escaping gives the same result as escaping one by one."""
+    texts = _random_texts(500, seed=1)
+    assert clean_texts_for_typst(texts) == [clean_text_for_typst(t) for t in texts]
+    assert clean_texts_for_typst([]) == []
+    assert clean_texts_for_typst(["a\x00#", "\n\n\n"]) == ["a\x00\\#", "\n\n"]
+
+
 def test_typst_dict():
     """Test typst_dict conversion."""
     d = {"key": 'value "escaped"', "list": ["item1", "item2"], "num": 42}
@@ -309,6 +383,28 @@ def test_save_evid_existing_complete(tmp_path, monkeypatch):
         )
 
 
+def test_save_evid_keeps_previous_version(tmp_path, monkeypatch):
+    """Test save_evid moves the files of a revised document into v<N>."""
+    output_dir = tmp_path / "output"
+    fixed_uuid = "123e4567-e89b-12d3-a456-426614174000"
+    monkeypatch.setattr(uuid, "uuid5", lambda ns, name: uuid.UUID(fixed_uuid))
+    save_evid("old text", "001-1", "title", None, output_dir, "echr", "f.txt")
+    save_evid(
+        "new text",
+        "001-1",
+        "title",
+        None,
+        output_dir,
+        "echr",
+        "f.txt",
+        previous_version=1,
+    )
+    subdir_path = output_dir / fixed_uuid
+    assert "new text" in (subdir_path / "label.typ").read_text(encoding="utf-8")
+    assert "old text" in (subdir_path / "v1" / "label.typ").read_text(encoding="utf-8")
+    assert (subdir_path / "v1" / "info.yml").exists()
+
+
 def test_save_evid_partial_overwrite(tmp_path, monkeypatch):
     """Test save_evid overwrites partial files."""
     output_dir = tmp_path / "output"
@@ -355,3 +451,93 @@ def test_save_text_oserror(tmp_path):
         mock_logging.error.assert_called_with(
             "Failed to save file for doc_id: Test error"
         )
+
+
+def test_is_saved_plain(tmp_path):
+    """Test is_saved finds plain files already written."""
+    save_text("text", "001-1", "title", None, tmp_path, "echr")
+    entries = saved_entries(tmp_path)
+    for listing in (entries, None):
+        assert is_saved("001-1", "echr", tmp_path, listing)
+        assert not is_saved("001-2", "echr", tmp_path, listing)
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_is_saved_evid_requires_both_files(tmp_path):
+    """Test is_saved ignores partial evid directories."""
+    save_text("text", "001-1", "title", None, tmp_path, "echr", evid=True)
+    partial = tmp_path / str(uuid.uuid5(uuid.NAMESPACE_URL, "echr_001-2"))
+    partial.mkdir()
+    (partial / "label.typ").touch()
+    entries = saved_entries(tmp_path)
+    for listing in (entries, None):
+        assert is_saved("001-1", "echr", tmp_path, listing, evid=True)
+        assert not is_saved("001-2", "echr", tmp_path, listing, evid=True)
+
+
+def test_saved_entries_missing_dir(tmp_path):
+    """Test saved_entries with an output directory that does not exist."""
+    entries = saved_entries(tmp_path / "missing")
+    assert entries == set()
+    assert not is_saved("001-1", "echr", tmp_path / "missing", entries)
+
+
+def test_get_document_text_cache_revalidates(tmp_path, requests_mock):
+    """Test cached bodies are revalidated with conditional requests."""
+    from hudoc.core.cache import DocumentCache
+
+    url = (
+        "https://hudoc.echr.coe.int/app/conversion/docx/html/body?library=ECHR&id=test"
+    )
+    requests_mock.get(
+        url,
+        [
+            {"text": "<p>Cached</p>", "headers": {"ETag": '"v1"'}},
+            {"status_code": 304},
+        ],
+    )
+    cache = DocumentCache(tmp_path, ttl=0)
+    base_url = "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+
+    assert get_document_text("test", base_url, "ECHR", cache=cache) == "Cached"
+    assert get_document_text("test", base_url, "ECHR", cache=cache) == "Cached"
+    assert requests_mock.request_history[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_get_document_text_cache_skips_unconverted_page(tmp_path, requests_mock):
+    """Test the empty page before a conversion is not served from the cache."""
+    from hudoc.core.cache import DocumentCache
+
+    base_url = "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+    rss_link = 'https://hudoc.echr.coe.int/eng#{"itemid":"test"}'
+    requests_mock.get(rss_link, status_code=200)
+    requests_mock.get(
+        f"{base_url}?library=ECHR&id=test",
+        [
+            {"text": "<html><body></body></html>"},
+            {"text": "<p>Converted</p>"},
+        ],
+    )
+    cache = DocumentCache(tmp_path)
+    with patch("time.sleep"):
+        text = get_document_text(
+            "test", base_url, "ECHR", rss_link=rss_link, cache=cache
+        )
+    assert text == "Converted"
+    assert get_document_text("test", base_url, "ECHR", cache=cache) == "Converted"
+    assert requests_mock.call_count == 3  # two bodies and the trigger
+
+
+def test_get_document_text_cache_fresh_and_offline(tmp_path, requests_mock):
+    """Test fresh and offline cache lookups make no requests."""
+    from hudoc.core.cache import DocumentCache
+
+    base_url = "https://hudoc.echr.coe.int/app/conversion/docx/html/body"
+    cache = DocumentCache(tmp_path)
+    cache.put(f"{base_url}?library=ECHR&id=test", "<p>Stored</p>")
+
+    assert get_document_text("test", base_url, "ECHR", cache=cache) == "Stored"
+    offline = DocumentCache(tmp_path, offline=True)
+    assert get_document_text("test", base_url, "ECHR", cache=offline) == "Stored"
+    assert get_document_text("other", base_url, "ECHR", cache=offline) is None
+    assert requests_mock.call_count == 0